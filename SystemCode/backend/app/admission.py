@@ -0,0 +1,177 @@
+# app/admission.py
+# Admission control for the expensive endpoints: a fixed number of requests run at once,
+# a bounded priority queue waits (with a deadline) for a slot, and everything else is shed
+# with 503 + Retry-After, so a burst is rejected quickly instead of slowing every request.
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from app import metrics
+from app.timing import stage
+
+
+# lower runs first
+PRIORITY_CHEAP = 0   # answered from caches / templates, no LLM call expected
+PRIORITY_NORMAL = 1
+
+
+class AdmissionController:
+    def __init__(self, name: str, *, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self.shed = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        # smoothed time a request holds its slot, for Retry-After
+        self._service_time = 1.0
+
+    def _shed(self, reason: str) -> HTTPException:
+        self.shed += 1
+        metrics.record_admission_shed(self.name, reason)
+        # time for the queue ahead to drain through the available slots
+        retry_after = max(1, math.ceil(self._service_time * (self.queued + 1) / self.max_concurrent))
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Server busy ({reason}), please retry.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def _evict_lowest(self, priority: int) -> bool:
+        '''Make room for a higher-priority arrival by shedding the newest lowest-priority waiter'''
+        pending = [w for w in self._waiters if not w[2].done()]
+        if not pending:
+            return False
+        worst = max(pending, key=lambda w: (w[0], w[1]))
+        if worst[0] <= priority:
+            return False
+        worst[2].set_exception(self._shed("evicted"))
+        self.queued -= 1
+        return True
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL) -> None:
+        if self.active < self.max_concurrent and self.queued == 0:
+            self.active += 1
+            return
+
+        if self.queued >= self.max_queue and not self._evict_lowest(priority):
+            raise self._shed("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # resolved just as the deadline passed: either got the slot or was evicted
+                waiter.result()
+                return
+            waiter.cancel()
+            self.queued -= 1
+            raise self._shed("timeout")
+        except asyncio.CancelledError:
+            # client went away while queued
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                self.release()
+            elif not waiter.done():
+                waiter.cancel()
+                self.queued -= 1
+            raise
+
+    def release(self, held: Optional[float] = None) -> None:
+        if held is not None:
+            self._service_time += 0.2 * (held - self._service_time)
+        # hand the slot straight to the next live waiter (active count unchanged)
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self.queued -= 1
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def admit(self, priority: int = PRIORITY_NORMAL) -> AsyncIterator[None]:
+        start_time = time.perf_counter()
+        try:
+            with stage("admission"):
+                await self.acquire(priority)
+        except HTTPException:
+            metrics.observe_admission_wait(self.name, "shed", time.perf_counter() - start_time)
+            raise
+        metrics.observe_admission_wait(self.name, "admitted", time.perf_counter() - start_time)
+
+        admitted_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - admitted_at)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "shed": self.shed,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "service_time_seconds": round(self._service_time, 3),
+        }
+
+
+def build_admission_controllers(settings) -> Dict[str, AdmissionController]:
+    '''Per-endpoint controllers from Settings; empty when admission control is disabled'''
+    if not settings.ADMISSION_ENABLED:
+        return {}
+    return {
+        name: AdmissionController(
+            name,
+            max_concurrent=max_concurrent,
+            max_queue=settings.ADMISSION_MAX_QUEUE,
+            queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        )
+        for name, max_concurrent in (
+            ("submit-form", settings.ADMISSION_FORM_CONCURRENCY),
+            ("submit-form-batch", settings.ADMISSION_BATCH_CONCURRENCY),
+            ("submit-description", settings.ADMISSION_DESCRIPTION_CONCURRENCY),
+        )
+    }
+
+
+@asynccontextmanager
+async def admit(request: Request, endpoint: str, *, cheap: bool = False) -> AsyncIterator[None]:
+    '''`async with admit(request, "submit-form"): ...`; a no-op when no controller is configured'''
+    controller = getattr(request.app.state, "admission", {}).get(endpoint)
+    if controller is None:
+        yield
+        return
+    async with controller.admit(PRIORITY_CHEAP if cheap else PRIORITY_NORMAL):
+        yield
+
+
+async def admitted_stream(request: Request, endpoint: str, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    '''
+    Admission for a streamed response whose work happens while it streams: the slot is taken
+    now (so a shed request gets its 503 before the response starts) and held until the stream ends
+    '''
+    slot = AsyncExitStack()
+    await slot.enter_async_context(admit(request, endpoint))
+
+    async def guarded() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await slot.aclose()
+
+    return guarded()
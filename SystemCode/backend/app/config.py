@@ -6,6 +6,30 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     # openai
     OPENAI_API_KEY: Optional[str] = None
+    OPENAI_BASE_URL: Optional[str] = None  # e.g. a local fake OpenAI server for load tests
+
+    # llm gateway (deadlines in seconds)
+    LLM_CONNECT_TIMEOUT: float = 3.0
+    LLM_READ_TIMEOUT: float = 15.0
+    LLM_MAX_RETRIES: int = 0
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 30.0
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
+    LLM_HEDGING_ENABLED: bool = True
+    LLM_HEDGE_QUANTILE: float = 0.95
+
+    # add a Server-Timing header with per-stage durations (load tests / debugging)
+    SERVER_TIMING_ENABLED: bool = False
+
+    # admission control for /submit-form, /submit-form/batch and /submit-description (queue timeout in seconds)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_FORM_CONCURRENCY: int = 16
+    ADMISSION_BATCH_CONCURRENCY: int = 2
+    ADMISSION_DESCRIPTION_CONCURRENCY: int = 8
+    ADMISSION_MAX_QUEUE: int = 32
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0
 
     # cloud database（Cloud Run 走 Unix 套接字，端口默认 5432）
     CLOUD_DB_HOST: str
@@ -1,9 +1,10 @@
 # app/database/cache.py
 import os
-import logging
 import redis.asyncio as redis
 
-log = logging.getLogger("uvicorn.error")
+from app.log import get_logger
+
+logger = get_logger("database.cache")
 
 CACHE_TTL_SECONDS = 60 * 60 * 24  # 24h
 
@@ -20,7 +21,7 @@ try:
     if REDIS_URL:
         # 注意：只有在 REDIS_URL 是非空字符串时才会进入这里
         redis_client = redis.from_url(REDIS_URL, decode_responses=True)
-        log.info("✅ Redis connected via REDIS_URL")
+        logger.info("✅ Redis connected via REDIS_URL")
     elif REDIS_HOST:
         pool = redis.ConnectionPool(
             host=REDIS_HOST,
@@ -30,10 +31,10 @@ try:
             decode_responses=True,
         )
         redis_client = redis.Redis(connection_pool=pool)
-        log.info(f"✅ Redis connected at {REDIS_HOST}:{REDIS_PORT}")
+        logger.info(f"✅ Redis connected at {REDIS_HOST}:{REDIS_PORT}")
     else:
-        log.warning("⚠️ Redis disabled (no REDIS_URL/REDIS_HOST).")
+        logger.warning("⚠️ Redis disabled (no REDIS_URL/REDIS_HOST).")
 except Exception as e:
     # 连接失败也不要阻止应用启动
     redis_client = None
-    log.exception(f"❌ Redis init failed (disabled): {e}")
+    logger.exception(f"❌ Redis init failed (disabled): {e}")
@@ -1,11 +1,22 @@
-from typing import List, Optional
+import json
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import select
+from sqlalchemy.orm import selectinload
 from sqlmodel.ext.asyncio.session import AsyncSession
 from redis import RedisError
 
-from app.models import EnquiryForm, EnquiryEntity, Property, Recommendation
+from app.models import EnquiryForm, EnquiryEntity, Property, Recommendation, PrecomputedExplanation
 from app.database.cache import redis_client, CACHE_TTL_SECONDS
+from app import metrics
+from app.log import get_logger
+
+
+logger = get_logger("database.crud")
 
 
 async def save_enquiry(
@@ -23,7 +34,7 @@ async def save_enquiry(
         await db.commit()
         await db.refresh(enquiry_entity)
         saved_entity = enquiry_entity
-        print(f"Successfully saved enquiry {enquiry_entity.eid} to database.")
+        logger.debug("saved enquiry", extra={"eid": enquiry_entity.eid})
 
         # cache
         if saved_entity and saved_entity.eid:
@@ -31,36 +42,53 @@ async def save_enquiry(
                 cache_key = f"enquiry:{enquiry_entity.eid}"
                 enquiry_json = enquiry_entity.model_dump_json()
                 await redis_client.set(cache_key, enquiry_json, ex=CACHE_TTL_SECONDS)
-                print(f"Successfully cached enquiry {enquiry_entity.eid} to Redis.")
+                metrics.record_redis_write("enquiry", ok=True)
+                logger.debug("cached enquiry", extra={"eid": enquiry_entity.eid})
 
             except RedisError as e:
-                print(f"Failed to cache enquiry {enquiry_entity.eid} to Redis. Error: {e}")
+                metrics.record_redis_write("enquiry", ok=False)
+                logger.warning("failed to cache enquiry: %s", e, extra={"eid": enquiry_entity.eid})
         
         else:
-            print("Eid is missing. Cannot cache.")
+            logger.warning("eid is missing, enquiry not cached")
     
     except SQLAlchemyError as e:
         await db.rollback()
-        print(f"Failed to save enquiry to database. Error: {e}")
+        logger.error("failed to save enquiry: %s", e)
     
     return saved_entity
 
 
+def compact_ranking(properties: List[Property]) -> List[list]:
+    '''Full ranking as [property_id, costScore, commuteScore, neighborhoodScore] rows'''
+    return [
+        [prop.property_id, prop.costScore, prop.commuteScore, prop.neighborhoodScore]
+        for prop in properties
+    ]
+
+
 async def save_recommendation(
     *,
     eid: int,
     db: AsyncSession,
-    properties: List[Property]
+    properties: List[Property],
+    ranked_properties: Optional[List[Property]] = None
 )-> Optional[Recommendation]:
+    '''
+    properties: the explained top-k, stored as the recommendation result
+    ranked_properties: the full ranking, kept compactly in ext_info and in full in
+    Redis (ranking:{eid}) so later pages are served without recomputing
+    '''
     
     if not eid:
-        print('Failed to save recommendation. Error: eid is None.')
+        logger.error("failed to save recommendation: eid is None")
         return None
     
     properties_data = [prop.model_dump(mode='json') for prop in properties]
     recommendation = Recommendation(
         eid=eid,
-        recommandation_result=properties_data
+        recommandation_result=properties_data,
+        ext_info={"ranked": compact_ranking(ranked_properties)} if ranked_properties else None
     )
     saved_recommendation: Optional[Recommendation] = None
 
@@ -70,7 +98,7 @@ async def save_recommendation(
         await db.commit()
         await db.refresh(recommendation)
         saved_recommendation = recommendation
-        print(f"Successfully saved recommendation {recommendation.rid} for enquiry {eid} to database.")
+        logger.debug("saved recommendation", extra={"eid": eid, "rid": recommendation.rid})
 
         # cache
         if saved_recommendation and saved_recommendation.rid:
@@ -78,16 +106,290 @@ async def save_recommendation(
                 cache_key = f"recommendation:{eid}"
                 recommendation_json = saved_recommendation.model_dump_json()
                 await redis_client.set(cache_key, recommendation_json, ex=CACHE_TTL_SECONDS)
-                print(f"Successfully saved recommendation {saved_recommendation.rid} for enquiry {eid} to Redis.")
+                metrics.record_redis_write("recommendation", ok=True)
+                logger.debug("cached recommendation", extra={"eid": eid, "rid": saved_recommendation.rid})
 
             except (RedisError, TypeError) as e:
-                print(f"Failed to cache recommendation object for enquiry {eid}. Error: {e}")
+                metrics.record_redis_write("recommendation", ok=False)
+                logger.warning("failed to cache recommendation: %s", e, extra={"eid": eid})
 
         else:
-            print("Rid missing. Cannot cache.")
+            logger.warning("rid is missing, recommendation not cached", extra={"eid": eid})
+
+        if saved_recommendation and ranked_properties:
+            await _cache_ranking(eid, ranked_properties)
     
     except SQLAlchemyError as e:
         await db.rollback()
-        print(f"Failed to save recommendation for enquiry {eid}. Error: {e}")
+        logger.error("failed to save recommendation: %s", e, extra={"eid": eid})
     
     return saved_recommendation
+
+
+async def update_recommendation_reasons(
+    *,
+    eid: int,
+    db: AsyncSession,
+    reasons: Dict[int, str]
+) -> Optional[Recommendation]:
+
+    if not eid or not reasons:
+        return None
+
+    try:
+        result = await db.exec(select(Recommendation).where(Recommendation.eid == eid))
+        recommendation = result.first()
+        if recommendation is None:
+            logger.warning("failed to update reasons: no recommendation", extra={"eid": eid})
+            return None
+
+        # reassign the list so the JSON column is flagged as modified
+        recommendation.recommandation_result = [
+            {**item, "recommand_reason": reasons.get(item.get("property_id"), item.get("recommand_reason"))}
+            for item in (recommendation.recommandation_result or [])
+        ]
+        db.add(recommendation)
+        await db.commit()
+        await db.refresh(recommendation)
+        logger.debug("refined recommendation reasons", extra={"eid": eid, "rid": recommendation.rid})
+
+        # cache
+        try:
+            cache_key = f"recommendation:{eid}"
+            await redis_client.set(cache_key, recommendation.model_dump_json(), ex=CACHE_TTL_SECONDS)
+            metrics.record_redis_write("recommendation", ok=True)
+
+        except (RedisError, TypeError, AttributeError) as e:
+            metrics.record_redis_write("recommendation", ok=False)
+            logger.warning("failed to cache refined recommendation: %s", e, extra={"eid": eid})
+
+        await _patch_cached_ranking_reasons(eid, reasons)
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("failed to update reasons: %s", e, extra={"eid": eid})
+        return None
+
+    return recommendation
+
+
+async def _cache_ranking(eid: int, ranked_properties: List[Property]) -> None:
+    if redis_client is None:
+        return
+    try:
+        ranking_json = json.dumps([prop.model_dump(mode='json') for prop in ranked_properties])
+        await redis_client.set(f"ranking:{eid}", ranking_json, ex=CACHE_TTL_SECONDS)
+        metrics.record_redis_write("ranking", ok=True)
+
+    except (RedisError, TypeError) as e:
+        metrics.record_redis_write("ranking", ok=False)
+        logger.warning("failed to cache ranking: %s", e, extra={"eid": eid})
+
+
+async def _patch_cached_ranking_reasons(eid: int, reasons: Dict[int, str]) -> None:
+    '''Carry refined reasons into ranking:{eid}; on failure drop it so reads fall back to the db'''
+    if redis_client is None:
+        return
+    cache_key = f"ranking:{eid}"
+    try:
+        cached = await redis_client.get(cache_key)
+        if cached is None:
+            return
+        ranking = json.loads(cached)
+        for item in ranking:
+            if item.get("property_id") in reasons:
+                item["recommand_reason"] = reasons[item["property_id"]]
+        await redis_client.set(cache_key, json.dumps(ranking), keepttl=True)
+        metrics.record_redis_write("ranking", ok=True)
+
+    except (RedisError, ValueError) as e:
+        metrics.record_redis_write("ranking", ok=False)
+        logger.warning("failed to patch cached ranking, dropping it: %s", e, extra={"eid": eid})
+        try:
+            await redis_client.delete(cache_key)
+        except RedisError:
+            pass
+
+
+async def get_cached_ranking(*, eid: int) -> Optional[List[dict]]:
+    '''Full ranked property list from Redis, or None on a miss'''
+    if redis_client is None:
+        return None
+    try:
+        cached = await redis_client.get(f"ranking:{eid}")
+    except RedisError as e:
+        logger.warning("failed to read cached ranking: %s", e, extra={"eid": eid})
+        cached = None
+    metrics.record_cache("ranking", "miss" if cached is None else "hit")
+    return None if cached is None else json.loads(cached)
+
+
+async def get_recommendation(*, db: AsyncSession, eid: int) -> Optional[Recommendation]:
+    try:
+        result = await db.exec(select(Recommendation).where(Recommendation.eid == eid))
+        return result.first()
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("failed to load recommendation: %s", e, extra={"eid": eid})
+        return None
+
+
+async def get_cached_recommendation(*, eid: int) -> Optional[Recommendation]:
+    if redis_client is None:
+        return None
+    try:
+        cached = await redis_client.get(f"recommendation:{eid}")
+    except RedisError as e:
+        logger.warning("failed to read cached recommendation: %s", e, extra={"eid": eid})
+        return None
+    return None if cached is None else Recommendation.model_validate(json.loads(cached))
+
+
+async def get_recent_enquiries(*, db: AsyncSession, device_id: str, since: datetime) -> List[EnquiryEntity]:
+    '''A device's enquiries since `since`, newest first, with their recommendations loaded'''
+    try:
+        result = await db.exec(
+            select(EnquiryEntity)
+            .where(EnquiryEntity.device_id == device_id, EnquiryEntity.create_time >= since)
+            .options(selectinload(EnquiryEntity.recommendation))
+            .order_by(EnquiryEntity.eid.desc())
+        )
+        return list(result.all())
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("failed to load recent enquiries: %s", e)
+        return []
+
+
+async def get_submission_eid(*, fingerprint: str) -> Optional[int]:
+    if redis_client is None:
+        return None
+    try:
+        eid = await redis_client.get(f"submission:{fingerprint}")
+    except RedisError as e:
+        logger.warning("failed to read submission fingerprint: %s", e)
+        return None
+    return None if eid is None else int(eid)
+
+
+async def save_submission_eid(*, fingerprint: str, eid: int, ttl_seconds: int) -> None:
+    if redis_client is None:
+        return
+    try:
+        await redis_client.set(f"submission:{fingerprint}", eid, ex=ttl_seconds)
+        metrics.record_redis_write("submission", ok=True)
+
+    except RedisError as e:
+        metrics.record_redis_write("submission", ok=False)
+        logger.warning("failed to save submission fingerprint: %s", e, extra={"eid": eid})
+
+
+async def get_enquiry(*, db: AsyncSession, eid: int) -> Optional[EnquiryEntity]:
+    try:
+        return await db.get(EnquiryEntity, eid)
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("failed to load enquiry: %s", e, extra={"eid": eid})
+        return None
+
+
+# profiles that have precomputed rows, refreshed at most every PRECOMPUTED_PROFILES_TTL_SECONDS,
+# so requests for any other profile (or with an empty table) skip the lookup query
+PRECOMPUTED_PROFILES_TTL_SECONDS = 60
+_precomputed_profiles: Tuple[float, frozenset] = (0.0, frozenset())
+
+
+async def _known_precomputed_profiles(db: AsyncSession) -> frozenset:
+    global _precomputed_profiles
+    expires_at, profiles = _precomputed_profiles
+    if expires_at > time.monotonic():
+        return profiles
+
+    try:
+        result = await db.exec(
+            select(
+                PrecomputedExplanation.school_id,
+                PrecomputedExplanation.weight_profile,
+                PrecomputedExplanation.budget_band,
+            ).distinct()
+        )
+        profiles = frozenset(tuple(row) for row in result.all())
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("failed to list precomputed explanation profiles: %s", e)
+        profiles = frozenset()
+
+    _precomputed_profiles = (time.monotonic() + PRECOMPUTED_PROFILES_TTL_SECONDS, profiles)
+    return profiles
+
+
+async def get_precomputed_explanations(
+    *,
+    db: AsyncSession,
+    profile: Tuple[int, str, str],
+    property_ids: List[int]
+) -> Dict[int, str]:
+
+    if not property_ids:
+        return {}
+    if profile not in await _known_precomputed_profiles(db):
+        return {}
+
+    school_id, weight_profile, budget_band = profile
+    try:
+        result = await db.exec(
+            select(PrecomputedExplanation.property_id, PrecomputedExplanation.recommand_reason)
+            .where(
+                PrecomputedExplanation.school_id == school_id,
+                PrecomputedExplanation.weight_profile == weight_profile,
+                PrecomputedExplanation.budget_band == budget_band,
+                PrecomputedExplanation.property_id.in_(property_ids),
+            )
+        )
+        return {property_id: reason for property_id, reason in result.all()}
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("failed to look up precomputed explanations: %s", e)
+        return {}
+
+
+async def save_precomputed_explanations(
+    *,
+    db: AsyncSession,
+    profile: Tuple[int, str, str],
+    reasons: Dict[int, str]
+) -> int:
+
+    if not reasons:
+        return 0
+
+    school_id, weight_profile, budget_band = profile
+    rows = [
+        {
+            "school_id": school_id,
+            "weight_profile": weight_profile,
+            "budget_band": budget_band,
+            "property_id": property_id,
+            "recommand_reason": reason,
+        }
+        for property_id, reason in reasons.items()
+    ]
+    stmt = pg_insert(PrecomputedExplanation).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        constraint="_explanation_profile_uc",
+        set_={"recommand_reason": stmt.excluded.recommand_reason, "create_time": stmt.excluded.create_time},
+    )
+
+    try:
+        await db.execute(stmt)
+        await db.commit()
+        return len(rows)
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("failed to save precomputed explanations: %s", e, extra={"profile": profile})
+        return 0
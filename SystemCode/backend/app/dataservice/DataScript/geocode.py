@@ -374,7 +374,162 @@ async def compute_nearest_facilities(session: AsyncSession, facility_type: str,
 
     print(f"✅ {facility_type} 计算完成，用时 {time.time() - start_time:.2f}s")
 
-async def run_precompute():
+FACILITY_RADIUS_M = 2000  # 与请求阶段一致：只统计 2km 内的设施
+
+def _listing_features_sql() -> str:
+    per_type = ",\n".join(
+        f"""            COUNT(*) FILTER (WHERE f.facility_type = '{ftype}' AND f.distance_m <= {FACILITY_RADIUS_M}) AS {ftype}_count,
+            MIN(f.distance_m) FILTER (WHERE f.facility_type = '{ftype}') AS nearest_{ftype}_m"""
+        for ftype in FACILITY_MODELS
+    )
+    columns = ["district_name", "safety_score", "facility_count", "facility_score", "public_facilities", "updated_at"]
+    columns += [c for ftype in FACILITY_MODELS for c in (f"{ftype}_count", f"nearest_{ftype}_m")]
+    return f"""
+        INSERT INTO listing_features (housing_id, {", ".join(columns)})
+        SELECT
+            h.id AS housing_id,
+            d.district_name,
+            d.safety_score,
+            COUNT(DISTINCT f.facility_type) FILTER (WHERE f.distance_m <= {FACILITY_RADIUS_M}) AS facility_count,
+            COALESCE(SUM(1 - f.distance_m / {FACILITY_RADIUS_M}) FILTER (WHERE f.distance_m <= {FACILITY_RADIUS_M}), 0) AS facility_score,
+            COALESCE(n.public_facilities, '[]'::jsonb) AS public_facilities,
+            now() AS updated_at,
+{per_type}
+        FROM housing_data h
+        LEFT JOIN districts d ON d.id = h.district_id
+        LEFT JOIN housing_facility_distances f ON f.housing_id = h.id
+        LEFT JOIN (
+            -- 与请求阶段展示的设施列表相同：每类 2km 内最近的一个，{{名称: "距离(米，取整)"}}
+            SELECT housing_id,
+                jsonb_agg(jsonb_build_object(COALESCE(facility_name, ''), trunc(distance_m)::int::text)
+                          ORDER BY facility_type) AS public_facilities
+            FROM (
+                SELECT DISTINCT ON (housing_id, facility_type) housing_id, facility_type, facility_name, distance_m
+                FROM housing_facility_distances
+                WHERE distance_m <= {FACILITY_RADIUS_M}
+                ORDER BY housing_id, facility_type, distance_m
+            ) nearest
+            GROUP BY housing_id
+        ) n ON n.housing_id = h.id
+        GROUP BY h.id, d.district_name, d.safety_score, n.public_facilities
+        ON CONFLICT (housing_id)
+        DO UPDATE SET
+            {", ".join(f"{c} = EXCLUDED.{c}" for c in columns)};
+    """
+
+async def compute_listing_features(session: AsyncSession):
+    '''
+    汇总每个房源的邻里特征（设施统计、最近距离、距离加权设施分、区域安全分、展示用设施列表），
+    upsert 到 listing_features 表；需在设施距离预计算之后执行
+    '''
+    print("开始汇总房源特征...")
+    start_time = time.time()
+
+    await session.execute(text(_listing_features_sql()))
+    await session.commit()
+
+    print(f"✅ 房源特征汇总完成，用时 {time.time() - start_time:.2f}s")
+
+# 与请求阶段评分相同的原始值：价格、通勤（缺失按 9999）、2km 内设施类型数、区域安全分（取自 listing_features）
+_SCORE_RAW_SQL = """
+    SELECT
+        c.housing_id,
+        c.university_id,
+        COALESCE(h.price, 0)::float AS price,
+        COALESCE(c.commute_time_minutes, 9999)::float AS commute,
+        COALESCE(lf.facility_count, 0)::float AS facility,
+        COALESCE(lf.safety_score, 0)::float AS safety
+    FROM commute_times c
+    JOIN housing_data h ON h.id = c.housing_id
+    LEFT JOIN listing_features lf ON lf.housing_id = h.id
+"""
+
+def _clamp_ratio(num: str, den: str) -> str:
+    # 区间为 0 时记 1，与请求阶段 normalize 一致
+    return f"LEAST(GREATEST(COALESCE(({num}) / NULLIF({den}, 0), 1), 0), 1)"
+
+def _robust_bounds(column: str) -> str:
+    return (f"percentile_cont(0.05) WITHIN GROUP (ORDER BY {column}) AS {column}_lo, "
+            f"percentile_cont(0.95) WITHIN GROUP (ORDER BY {column}) AS {column}_hi")
+
+# 存储评分的下限：排序阶段只接受 (0, 1] 内的评分，且读取时保留两位小数，最差的房源也不能落到 0
+SCORE_FLOOR = 0.01
+
+def _floored(expr: str) -> str:
+    return f"GREATEST({expr}, {SCORE_FLOOR})"
+
+# percentile：按学校的累积分布 cume_dist（即 (排名 + 1) / n，落在 (0, 1]）；
+# robust：按学校 5%-95% 分位数缩放并截断到 [0, 1]；两者最终都不低于 SCORE_FLOOR
+# 邻里评分与请求阶段相同：设施 * 2 + 安全，再整体缩放一次
+SCORE_METHODS = {
+    "percentile": f"""
+        WITH raw AS ({_SCORE_RAW_SQL}),
+        scaled AS (
+            SELECT housing_id, university_id,
+                cume_dist() OVER (PARTITION BY university_id ORDER BY price DESC) AS cost_score,
+                cume_dist() OVER (PARTITION BY university_id ORDER BY commute DESC) AS commute_score,
+                2 * cume_dist() OVER (PARTITION BY university_id ORDER BY facility)
+                    + cume_dist() OVER (PARTITION BY university_id ORDER BY safety) AS neighbourhood
+            FROM raw
+        )
+        SELECT housing_id, university_id,
+            {_floored("cost_score")} AS cost_score,
+            {_floored("commute_score")} AS commute_score,
+            {_floored("cume_dist() OVER (PARTITION BY university_id ORDER BY neighbourhood)")} AS neighborhood_score
+        FROM scaled
+    """,
+    "robust": f"""
+        WITH raw AS ({_SCORE_RAW_SQL}),
+        bounds AS (
+            SELECT university_id,
+                {_robust_bounds("price")}, {_robust_bounds("commute")},
+                {_robust_bounds("facility")}, {_robust_bounds("safety")}
+            FROM raw GROUP BY university_id
+        ),
+        scaled AS (
+            SELECT r.housing_id, r.university_id,
+                {_clamp_ratio("b.price_hi - r.price", "b.price_hi - b.price_lo")} AS cost_score,
+                {_clamp_ratio("b.commute_hi - r.commute", "b.commute_hi - b.commute_lo")} AS commute_score,
+                2 * {_clamp_ratio("r.facility - b.facility_lo", "b.facility_hi - b.facility_lo")}
+                    + {_clamp_ratio("r.safety - b.safety_lo", "b.safety_hi - b.safety_lo")} AS neighbourhood
+            FROM raw r JOIN bounds b USING (university_id)
+        ),
+        neighbourhood_bounds AS (
+            SELECT university_id, {_robust_bounds("neighbourhood")}
+            FROM scaled GROUP BY university_id
+        )
+        SELECT s.housing_id, s.university_id,
+            {_floored("s.cost_score")} AS cost_score,
+            {_floored("s.commute_score")} AS commute_score,
+            {_floored(_clamp_ratio("s.neighbourhood - b.neighbourhood_lo", "b.neighbourhood_hi - b.neighbourhood_lo"))} AS neighborhood_score
+        FROM scaled s JOIN neighbourhood_bounds b USING (university_id)
+    """,
+}
+
+async def compute_housing_scores(session: AsyncSession, method: str = "percentile"):
+    '''
+    按学校计算所有房源的全局评分（cost / commute / neighborhood），upsert 到 housing_scores 表
+    需在通勤时间和设施距离预计算之后执行；房源或设施数据更新后重新执行即可刷新
+    '''
+    print(f"开始计算全局评分（{method}）...")
+    start_time = time.time()
+
+    sql = text(f"""
+        INSERT INTO housing_scores (housing_id, university_id, cost_score, commute_score, neighborhood_score)
+        {SCORE_METHODS[method]}
+        ON CONFLICT (university_id, housing_id)
+        DO UPDATE SET
+            cost_score = EXCLUDED.cost_score,
+            commute_score = EXCLUDED.commute_score,
+            neighborhood_score = EXCLUDED.neighborhood_score;
+    """)
+
+    await session.execute(sql)
+    await session.commit()
+
+    print(f"✅ 全局评分计算完成，用时 {time.time() - start_time:.2f}s")
+
+async def run_precompute(score_method: str = "percentile"):
     '''执行预计算'''
     async with AsyncSessionLocal() as session:
         # 确保目标表存在
@@ -390,6 +545,11 @@ async def run_precompute():
                 UNIQUE (housing_id, facility_type, rank)
             );
         """))
+        # 早于该索引建的 commute_times 表补建（见 CommuteTime.__table_args__）
+        await session.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_commute_university_minutes
+            ON commute_times (university_id, commute_time_minutes);
+        """))
         await session.commit()
 
     # 并发执行 4 个设施类型计算任务（每个任务单独 session）
@@ -406,6 +566,45 @@ async def run_precompute():
 
     print("所有设施距离预计算完成。")
 
+    # 房源特征依赖设施距离
+    async with AsyncSessionLocal() as session:
+        await session.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS listing_features (
+                housing_id INTEGER PRIMARY KEY REFERENCES housing_data(id),
+                district_name VARCHAR(255),
+                safety_score FLOAT,
+                facility_count INTEGER,
+                {"".join(f"{ftype}_count INTEGER, nearest_{ftype}_m FLOAT, " for ftype in FACILITY_MODELS)}
+                facility_score FLOAT,
+                public_facilities JSONB,
+                updated_at TIMESTAMPTZ
+            );
+        """))
+        await session.commit()
+        await compute_listing_features(session)
+
+    # 全局评分依赖房源特征，最后计算
+    async with AsyncSessionLocal() as session:
+        await session.execute(text("""
+            CREATE TABLE IF NOT EXISTS housing_scores (
+                id SERIAL PRIMARY KEY,
+                housing_id INTEGER NOT NULL REFERENCES housing_data(id),
+                university_id INTEGER NOT NULL REFERENCES universities(id),
+                cost_score FLOAT,
+                commute_score FLOAT,
+                neighborhood_score FLOAT
+            );
+        """))
+        # 覆盖索引：请求阶段按 (学校, 房源) 取评分只需读索引；同时是 upsert 的唯一约束
+        # （名字与旧版模型里的 _score_university_housing_uc 不同，已有的普通唯一索引不会让它被跳过）
+        await session.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS _score_university_housing_covering
+            ON housing_scores (university_id, housing_id)
+            INCLUDE (cost_score, commute_score, neighborhood_score);
+        """))
+        await session.commit()
+        await compute_housing_scores(session, score_method)
+
 if __name__ == "__main__":
     # long, lat = get_longitude_latitude("Singapore University of Social Sciences (SUSS)")
     # print(f"Longitude: {long}, Latitude: {lat}")
@@ -1,22 +1,67 @@
 from .api_model import RequestInfo, ResultInfo
-from .func import query_housing_data_async, filter_housing_async
+from .func import query_housing_data_async, query_housing_by_ids_async, filter_housing_async
+from .batch import fetch_group_async
 import asyncio
 import time
+from collections import defaultdict
+from typing import AsyncIterator
+from app.timing import stage
+from app.log import get_logger
 
-async def fetchRecommendProperties_async(params: RequestInfo) -> list[ResultInfo]:
-    '''异步算法接口，根据请求参数返回初步过滤结果及信息'''
-    housings = await query_housing_data_async(params)
-    print(f'第一步得到{len(housings)}条符合条件的房源，开始处理...')
+logger = get_logger("dataservice.api")
+
+async def fetchRecommendProperties_async(params: RequestInfo, result_factory=ResultInfo) -> list[ResultInfo]:
+    '''
+    异步算法接口，根据请求参数返回初步过滤结果及信息
+    params 只按属性读取，任何字段相同的对象（如 EnquiryForm）都可以直接传入
+    '''
+    with stage("query"):
+        housings, relaxation_levels = await query_housing_data_async(params)
+    logger.debug("candidate housings fetched", extra={"count": len(housings)})
 
     start_time = time.time()
 
-    results = await filter_housing_async(housings, params)
+    with stage("enrichment"):
+        results = await filter_housing_async(housings, params, result_factory, relaxation_levels)
 
     execution_time = time.time() - start_time
-    print(f'第二步 filter_housing_async 执行时间: {execution_time:.2f} 秒')
+    logger.debug("filter_housing_async done", extra={"seconds": round(execution_time, 3)})
     
     return results
 
+async def fetchPropertiesByIds_async(housing_ids: list[int], params: RequestInfo, result_factory=ResultInfo) -> list[ResultInfo]:
+    '''
+    跳过检索，只对给定 id 的房源补全信息（通勤、设施、图片），按 housing_ids 顺序返回
+    评分只在这批房源内归一化，需要原排序分数时由调用方覆盖
+    '''
+    housings = await query_housing_by_ids_async(housing_ids)
+    with stage("enrichment"):
+        results = await filter_housing_async(housings, params, result_factory)
+    order = {housing_id: i for i, housing_id in enumerate(housing_ids)}
+    return sorted(results, key=lambda r: order[r.property_id])
+
+async def fetchRecommendPropertiesBatch_async(
+    params_list: list[RequestInfo], result_factory=ResultInfo
+) -> AsyncIterator[tuple[list[int], list]]:
+    '''
+    批量接口：按 school_id 分组，每组一次检索、一次补全、一次向量化评分，各组并发执行
+    每完成一组产出 (该组请求在 params_list 中的下标, 各请求的结果列表 或 异常)
+    '''
+    groups: dict[int, list[int]] = defaultdict(list)
+    for i, params in enumerate(params_list):
+        groups[params.school_id].append(i)
+
+    async def run_group(indices: list[int]):
+        try:
+            with stage("batch_group"):
+                return indices, await fetch_group_async([params_list[i] for i in indices], result_factory)
+        except Exception as e:
+            logger.exception("batch group failed", extra={"school_id": params_list[indices[0]].school_id})
+            return indices, e
+
+    for finished in asyncio.as_completed([run_group(indices) for indices in groups.values()]):
+        yield await finished
+
 def fetchRecommendProperties(params: RequestInfo) -> list[ResultInfo]:
     '''
     同步包装版本，自动检测当前是否存在事件循环；
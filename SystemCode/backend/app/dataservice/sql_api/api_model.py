@@ -15,6 +15,13 @@ class RequestInfo(BaseModel):
     importance_location: Optional[conint(ge=1, le=5)] = Field(None, description="位置重要程度(1-5)")
     importance_facility: Optional[conint(ge=1, le=5)] = Field(None, description="便利重要程度（1-5）")
 
+class RelaxationStep(BaseModel):
+    '''放宽阶梯中的一级；未给出的字段沿用上一级，逐级累积'''
+    mrt_distance_factor: Optional[confloat(ge=1)] = Field(None, description="max_mrt_distance 放宽倍数")
+    school_limit_factor: Optional[confloat(ge=1)] = Field(None, description="max_school_limit 放宽倍数")
+    rent_band_ratio: Optional[confloat(ge=0)] = Field(None, description="租金区间两端各放宽的比例")
+    drop_district: Optional[bool] = Field(None, description="不再限制 target_district_id")
+
 class ResultInfo(BaseModel):
     property_id: int = Field(..., description="房源编号")
     img_src: str = Field(..., description="房源图片地址")
@@ -34,4 +41,5 @@ class ResultInfo(BaseModel):
     facility_type: str = Field(..., description="房源类型 hdb/condo等")
     costScore: confloat(ge=0, le=1) = Field(..., description="成本评分 range(0, 1]")
     commuteScore: confloat(ge=0, le=1) = Field(..., description="通勤评分 range(0, 1]")
-    neighborhoodScore: confloat(ge=0, le=1) = Field(..., description="设施及安全的综合评分 range(0, 1]")
\ No newline at end of file
+    neighborhoodScore: confloat(ge=0, le=1) = Field(..., description="设施及安全的综合评分 range(0, 1]")
+    relaxation_level: Optional[int] = Field(None, description="被第几级放宽条件选中（0：完全符合条件，未知时为空）")
\ No newline at end of file
@@ -0,0 +1,252 @@
+import numpy as np
+from sqlalchemy.future import select
+
+from app.log import get_logger
+from .api_model import RequestInfo, ResultInfo
+from .model import HousingData, CommuteTime
+from .func import AsyncSessionLocal, GLOBAL_SCORES, collect_housing_data_async, build_result
+from .relaxation import TARGET_COUNT, DEDUP_SLACK, HousingFilters, ladder_filters
+
+logger = get_logger("dataservice.batch")
+
+# 超集行数上限（按通勤排序截断）：条件很宽的一组请求也不会把整个学校的房源读进内存；
+# 只有超出上限时，通勤最远的那部分行可能与逐个请求的结果不同
+SUPERSET_LIMIT = 2000
+
+# (房源, 到该学校的通勤时间)
+HousingRow = tuple[HousingData, float]
+
+
+async def query_housing_group_async(requests: list[RequestInfo]) -> tuple[list[HousingRow], list[HousingRow]]:
+    '''
+    同一 school_id 的一组请求共用一次检索：
+    返回 (满足组内任一请求任一放宽级别的房源超集, 通勤最近的房源用于兜底级)，每行带通勤时间
+    每个请求的各级候选都是超集的子集，之后在内存中按各自条件分级筛选
+    '''
+    school_id = requests[0].school_id
+    filters = [f for r in requests for f in ladder_filters(r)]
+    stmt = (
+        select(HousingData, CommuteTime.commute_time_minutes)
+        .join(CommuteTime, HousingData.id == CommuteTime.housing_id)
+        .where(
+            CommuteTime.university_id == school_id,
+            HousingData.price >= min(f.min_rent for f in filters),
+            HousingData.price <= max(f.max_rent for f in filters),
+        )
+    )
+
+    # 只有每个请求的每一级都带某个条件时，超集才能加这个条件（取最宽松值）
+    if all(f.district_id is not None for f in filters):
+        stmt = stmt.where(HousingData.district_id.in_({f.district_id for f in filters}))
+
+    if all(f.max_commute is not None for f in filters):
+        stmt = stmt.where(CommuteTime.commute_time_minutes <= max(f.max_commute for f in filters))
+
+    if all(f.flat_types for f in filters):
+        stmt = stmt.where(HousingData.type.in_({t for f in filters for t in f.flat_types}))
+
+    if all(f.max_mrt is not None for f in filters):
+        stmt = stmt.where(HousingData.distance_to_mrt <= max(f.max_mrt for f in filters))
+
+    stmt = stmt.order_by(CommuteTime.commute_time_minutes.asc(), HousingData.id).limit(SUPERSET_LIMIT)
+
+    # 与 query_housing_data_async 同序（通勤、id），兜底级最多用到这么多行
+    nearest_stmt = (
+        select(HousingData, CommuteTime.commute_time_minutes)
+        .join(CommuteTime, HousingData.id == CommuteTime.housing_id)
+        .where(CommuteTime.university_id == school_id)
+        .order_by(CommuteTime.commute_time_minutes.asc(), HousingData.id)
+        .limit(TARGET_COUNT + DEDUP_SLACK)
+    )
+
+    async with AsyncSessionLocal() as session:
+        superset = [tuple(row) for row in (await session.execute(stmt)).all()]
+        nearest = [tuple(row) for row in (await session.execute(nearest_stmt)).all()]
+
+    if len(superset) >= SUPERSET_LIMIT:
+        logger.warning("group housing superset truncated", extra={
+            "school_id": school_id, "requests": len(requests), "limit": SUPERSET_LIMIT
+        })
+    logger.debug("group housing query matched", extra={
+        "school_id": school_id, "requests": len(requests), "count": len(superset)
+    })
+    return superset, nearest
+
+
+def _column(housings: list[HousingData], getter) -> np.ndarray:
+    # None -> nan，比较结果为 False，与 SQL 中 NULL 的过滤效果一致
+    values = (getter(h) for h in housings)
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+def _codes(values: list) -> np.ndarray:
+    index: dict = {}
+    return np.array([index.setdefault(v, len(index)) for v in values], dtype=np.int64)
+
+
+def select_candidates(
+    housings: list[HousingData], commute: np.ndarray, superset_count: int, nearest_order: np.ndarray,
+    requests: list[RequestInfo]
+) -> tuple[list[np.ndarray], list[np.ndarray]]:
+    '''
+    按各请求的放宽阶梯从超集中选出候选（housings 下标），规则与 query_housing_data_async 一致：
+    每行取第一个满足的级别 -> 按 (级别, 通勤, id) 排序，兜底级按通勤补在最后 -> 取前 100 去重 -> 取前 50
+    只用房源本身的字段和通勤时间，不需要补全信息
+    housings 前 superset_count 条是超集，其后是只用于兜底的房源；nearest_order 为按通勤排序的兜底候选下标
+    返回 (各请求的候选下标, 对应的放宽级别)
+    '''
+    ids = np.array([h.id for h in housings], dtype=np.int64)
+    price = _column(housings, lambda h: h.price)
+    district = _column(housings, lambda h: h.district_id)
+    mrt = _column(housings, lambda h: h.distance_to_mrt)
+    types = [h.type for h in housings]
+    dedup_codes = _codes([
+        (h.name, h.price, h.area_sqft, h.type, h.location, h.distance_to_mrt, h.beds_num, h.baths_num)
+        for h in housings
+    ])
+
+    # 兜底用的房源不属于超集，不参与条件匹配
+    in_superset = np.arange(len(housings)) < superset_count
+
+    def matches(f: HousingFilters) -> np.ndarray:
+        mask = in_superset & (price >= f.min_rent) & (price <= f.max_rent)
+        if f.district_id is not None:
+            mask &= district == f.district_id
+        if f.max_commute is not None:
+            mask &= commute <= f.max_commute
+        if f.flat_types:
+            mask &= np.isin(types, f.flat_types)
+        if f.max_mrt is not None:
+            mask &= mrt <= f.max_mrt
+        return mask
+
+    selected, selected_levels = [], []
+    for r in requests:
+        levels = ladder_filters(r)
+        fallback = len(levels)
+        level = np.full(len(housings), fallback, dtype=np.int64)
+        # 从最宽松的级别往回覆盖，每行留下第一个满足的级别
+        for lv in reversed(range(len(levels))):
+            level[matches(levels[lv])] = lv
+
+        matched = np.flatnonzero(level < fallback)
+        matched = matched[np.lexsort((ids[matched], commute[matched], level[matched]))]
+        padding = nearest_order[level[nearest_order] == fallback]
+        idx = np.concatenate([matched, padding])[:TARGET_COUNT + DEDUP_SLACK]
+
+        # 保序去重
+        _, first = np.unique(dedup_codes[idx], return_index=True)
+        idx = idx[np.sort(first)][:TARGET_COUNT]
+        selected.append(idx)
+        selected_levels.append(level[idx])
+    return selected, selected_levels
+
+
+def _normalize_rows(values: np.ndarray, mask: np.ndarray, reverse: bool = False) -> np.ndarray:
+    '''逐行 min-max 归一化（只看 mask 内的值），等价于对每个请求调用 normalize'''
+    lo = np.where(mask, values, np.inf).min(axis=1, keepdims=True)
+    hi = np.where(mask, values, -np.inf).max(axis=1, keepdims=True)
+    span = hi - lo
+    with np.errstate(divide="ignore", invalid="ignore"):
+        norm = (hi - values) / span if reverse else (values - lo) / span
+    return np.where(span == 0, 1.0, norm)
+
+
+def _pad(selected: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    '''各请求的候选下标补齐成 (请求数, 最大候选数) 的下标矩阵和有效位掩码'''
+    width = max((len(s) for s in selected), default=0)
+    index = np.zeros((len(selected), width), dtype=np.int64)
+    mask = np.zeros((len(selected), width), dtype=bool)
+    for row, idx in enumerate(selected):
+        index[row, :len(idx)] = idx
+        mask[row, :len(idx)] = True
+    return index, mask
+
+
+def _weighted_total(price_norm, commute_norm, neighbour_norm, mask, requests: list[RequestInfo]) -> np.ndarray:
+    weights = np.array([
+        [r.importance_rent, r.importance_location, r.importance_facility] for r in requests
+    ], dtype=float)
+    total = weights[:, :1] * price_norm + weights[:, 1:2] * commute_norm + weights[:, 2:] * neighbour_norm
+    return np.where(mask, total, -np.inf)
+
+
+def score_housing_batch_global(raw_data: list[dict], selected: list[np.ndarray], requests: list[RequestInfo]):
+    '''全局评分模式：读取预计算评分再加权；任一候选缺少预计算评分时返回 None（退回 score_housing_batch）'''
+    used = np.unique(np.concatenate(selected)) if selected else np.array([], dtype=np.int64)
+    if any(raw_data[i]["scores"] is None for i in used):
+        logger.warning("precomputed scores missing, falling back to per-request normalization", extra={
+            "school_id": requests[0].school_id
+        })
+        return None
+
+    index, mask = _pad(selected)
+    scores = np.array([x["scores"] or (0.0, 0.0, 0.0) for x in raw_data], dtype=float).reshape(-1, 3)[index]
+    price_norm, commute_norm, neighbour_norm = scores[..., 0], scores[..., 1], scores[..., 2]
+    return price_norm, commute_norm, neighbour_norm, _weighted_total(price_norm, commute_norm, neighbour_norm, mask, requests)
+
+
+def score_housing_batch(raw_data: list[dict], selected: list[np.ndarray], requests: list[RequestInfo]):
+    '''
+    对一组请求同时评分：每个请求的候选下标补齐成 (请求数, 50) 的矩阵，一次完成归一化和加权
+    返回与 score_housing_data 相同的 (costScore, commuteScore, neighborhoodScore, 总分) 矩阵
+    '''
+    index, mask = _pad(selected)
+
+    price = np.array([x["price"] for x in raw_data], dtype=float)[index]
+    commute = np.array([x["commute"] for x in raw_data], dtype=float)[index]
+    facility = np.array([x["facility"] for x in raw_data], dtype=float)[index]
+    safety = np.array([x["safety"] for x in raw_data], dtype=float)[index]
+
+    price_norm = _normalize_rows(price, mask, reverse=True)
+    commute_norm = _normalize_rows(commute, mask, reverse=True)
+    facility_norm = _normalize_rows(facility, mask)
+    safety_norm = _normalize_rows(safety, mask)
+    neighbour_norm = _normalize_rows(facility_norm * 2 + safety_norm, mask)
+
+    return price_norm, commute_norm, neighbour_norm, _weighted_total(price_norm, commute_norm, neighbour_norm, mask, requests)
+
+
+async def fetch_group_async(requests: list[RequestInfo], result_factory=ResultInfo) -> list[list]:
+    '''
+    同一 school_id 的一组请求：一次检索、先选出各请求的候选、只补全被选中的房源、
+    一次向量化评分（或读取全局评分），按请求顺序返回各自结果（按总分降序）
+    '''
+    superset, nearest = await query_housing_group_async(requests)
+    superset_ids = {h.id for h, _ in superset}
+    rows = superset + [row for row in nearest if row[0].id not in superset_ids]
+    housings = [h for h, _ in rows]
+    # 与 collect_housing_data_async 相同：缺失通勤按 9999
+    commute = np.array([c or 9999 for _, c in rows], dtype=float)
+
+    position = {h.id: i for i, h in enumerate(housings)}
+    nearest_order = np.array([position[h.id] for h, _ in nearest], dtype=np.int64)
+    chosen, selected_levels = select_candidates(housings, commute, len(superset), nearest_order, requests)
+
+    # 只补全被选中的房源（各请求候选的并集），下标换算到 raw_data
+    used = np.unique(np.concatenate(chosen)) if chosen else np.array([], dtype=np.int64)
+    raw_data = await collect_housing_data_async([housings[i] for i in used], requests[0].school_id)
+    remap = np.zeros(len(housings), dtype=np.int64)
+    remap[used] = np.arange(len(used))
+    selected = [remap[idx] for idx in chosen]
+
+    scored = score_housing_batch_global(raw_data, selected, requests) if GLOBAL_SCORES else None
+    if scored is None:
+        scored = score_housing_batch(raw_data, selected, requests)
+    price_norm, commute_norm, neighbour_norm, total = scored
+
+    results = []
+    for row, idx in enumerate(selected):
+        order = np.argsort(-total[row, :len(idx)], kind="stable")
+        results.append([
+            build_result(
+                raw_data[idx[col]],
+                round(float(price_norm[row, col]), 2),
+                round(float(commute_norm[row, col]), 2),
+                round(float(neighbour_norm[row, col]), 2),
+                result_factory,
+                int(selected_levels[row][col]),
+            )
+            for col in order
+        ])
+    return results
@@ -4,9 +4,8 @@ from dotenv import load_dotenv
 
 def get_database_url_async():
     load_dotenv()
-    db_url = os.getenv("CLOUD_DATABASE_URL")
-    print(f"数据库URL: {db_url}")
-    return db_url
+    # 不要打印：URL 中含数据库凭据
+    return os.getenv("CLOUD_DATABASE_URL")
 
 def get_openmap_token():
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -26,6 +25,21 @@ def get_openmap_library_url(): # 查询图书馆信息用
     token = os.getenv('OPEN_MAP_TOKEN')
     return library_url, token
 
+def get_score_normalization():
+    # request：在每个请求的候选集内 min-max 归一化（默认）；global：读取入库时预计算的 housing_scores
+    load_dotenv()
+    return os.getenv("SCORE_NORMALIZATION", "request").lower()
+
+def get_listing_features_enabled():
+    # 需先用 DataScript/geocode.py 的 run_precompute 生成 listing_features 表
+    load_dotenv()
+    return os.getenv("LISTING_FEATURES", "false").lower() in ("1", "true", "yes")
+
+def get_relaxation_ladder():
+    # JSON 数组，每项为一级 RelaxationStep，如 [{"mrt_distance_factor": 2}, {"drop_district": true}]
+    load_dotenv()
+    return os.getenv("HOUSING_RELAXATION_LADDER")
+
 if __name__ == "__main__":
     # print(os.getcwd())
     # get_database_url()
@@ -1,21 +1,41 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.future import select
-from sqlalchemy import func, text
+from sqlalchemy import func, text, union
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import time
+from app import metrics
+from app.log import get_logger
 from .api_model import RequestInfo, ResultInfo
-from .model import HousingData, District, University, CommuteTime, Park, HawkerCenter, Supermarket, Library, ImageRecord
-from .envconfig import get_database_url_async
+from .model import (
+    HousingData, District, University, CommuteTime, Park, HawkerCenter, Supermarket, Library, ImageRecord,
+    HousingScore, ListingFeatures
+)
+from .envconfig import get_database_url_async, get_score_normalization, get_listing_features_enabled
+from .relaxation import TARGET_COUNT, DEDUP_SLACK, ladder_filters, any_level_condition, relaxation_level_expr
+
+logger = get_logger("dataservice.func")
 
 DATABASE_URL_ASYNC = get_database_url_async()
+# 开启指标时记录连接池等待时间
+engine_options = {}
+timed_pool = metrics.timed_pool_class(AsyncAdaptedQueuePool, "dataservice")
+if timed_pool is not None:
+    engine_options["poolclass"] = timed_pool
 async_engine = create_async_engine(
     DATABASE_URL_ASYNC, 
-    echo=False,)
+    echo=False,
+    **engine_options)
 
 AsyncSessionLocal = sessionmaker(
     bind=async_engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# 全局评分模式：评分按学校整体预计算（housing_scores），同一房源在不同请求中评分一致
+GLOBAL_SCORES = get_score_normalization() == "global"
+# 特征表模式：补全信息时读取预计算的 listing_features，不再现查设施距离和区域
+LISTING_FEATURES = get_listing_features_enabled()
+
 def remove_duplicate_housings(housings: list[HousingData]) -> tuple[list[HousingData], int]:
     '''去除少量重复的房源记录，返回去重后的列表和去除的数量'''
     seen = set()
@@ -53,85 +73,157 @@ def get_total_score(price_norm, commute_norm, neighbourhood_norm, request):
 
     return price_score+commute_score+neighbourhood_score
 
-async def query_housing_data_async(request: RequestInfo) -> list[HousingData]:
-    '''根据 RequestInfo 查询符合条件的房源'''
-
-    # 基础查询
-    stmt = (
-        select(HousingData)
-        .join(CommuteTime, HousingData.id == CommuteTime.housing_id)
-        .where(
-            CommuteTime.university_id == request.school_id,
-            HousingData.price >= request.min_monthly_rent,
-            HousingData.price <= request.max_monthly_rent,
+def normalize(values, reverse=False):
+    '''min-max 归一化，reverse=True 时数值越小得分越高'''
+    vals = [v for v in values if v is not None]
+    if not vals:
+        return [0 for _ in values]
+    min_v, max_v = min(vals), max(vals)
+    if max_v == min_v:
+        return [1 for _ in values]
+    return [
+        (max_v - v) / (max_v - min_v) if reverse else (v - min_v) / (max_v - min_v)
+        for v in values
+    ]
+
+def score_housing_data(raw_data: list[dict], request: RequestInfo) -> list[tuple[float, float, float, float]]:
+    '''
+    对 process_housing 得到的原始数据评分（不访问数据库）
+    返回每条房源的 (costScore, commuteScore, neighborhoodScore, 加权总分)
+    '''
+    price_norm = normalize([x["price"] for x in raw_data], reverse=True) # 价格越低越好
+    commute_norm = normalize([x["commute"] for x in raw_data], reverse=True) # 通勤时间越短越好
+    facility_norm = normalize([x["facility"] for x in raw_data])
+    safety_norm = normalize([x["safety"] for x in raw_data])
+    neighbour_norm = normalize([(facility_norm[i] * 2 + safety_norm[i]) for i in range(len(raw_data))]) # 邻里综合评分
+
+    return [
+        (
+            round(price_norm[i], 2),
+            round(commute_norm[i], 2),
+            round(neighbour_norm[i], 2),
+            get_total_score(price_norm[i], commute_norm[i], neighbour_norm[i], request)
+        )
+        for i in range(len(raw_data))
+    ]
+
+def score_housing_global(raw_data: list[dict], request: RequestInfo) -> list[tuple[float, float, float, float]]:
+    '''
+    全局评分模式：直接使用预计算评分，只做加权求和
+    有房源缺少预计算评分（如新入库、尚未刷新）时返回 None，由调用方退回请求内归一化
+    '''
+    if any(x.get("scores") is None for x in raw_data):
+        logger.warning("precomputed scores missing, falling back to per-request normalization", extra={
+            "school_id": request.school_id, "missing": sum(x.get("scores") is None for x in raw_data)
+        })
+        return None
+
+    return [
+        (round(cost, 2), round(commute, 2), round(neighbour, 2), get_total_score(cost, commute, neighbour, request))
+        for cost, commute, neighbour in (x["scores"] for x in raw_data)
+    ]
+
+async def query_housing_data_async(request: RequestInfo) -> tuple[list[HousingData], list[int]]:
+    '''
+    根据 RequestInfo 查询符合条件的房源，一次查询完成逐级放宽（见 relaxation.RELAXATION_LADDER）：
+    每行标记第一个满足的放宽级别，按 (级别, 通勤时间) 排序，去重后取前 50
+    返回 (房源列表, 对应的放宽级别)
+
+    不对学校的全部通勤行计算级别并排序，而是两段各取前 100 行再合并：
+    满足任一级条件的行（WHERE 为各级条件之或，可走索引），以及按通勤最近的行（走 (学校, 通勤) 索引）
+    兜底级的行按通勤排序，最终前 100 行中的兜底行一定在通勤最近的前 100 行里，结果与全量排序相同
+    '''
+    levels = ladder_filters(request)
+    level_expr = relaxation_level_expr(levels).label("relaxation_level")
+    commute = CommuteTime.commute_time_minutes
+    limit = TARGET_COUNT + DEDUP_SLACK
+
+    def candidates(*conditions):
+        return (
+            select(CommuteTime.housing_id, level_expr, commute)
+            .join(HousingData, HousingData.id == CommuteTime.housing_id)
+            .where(CommuteTime.university_id == request.school_id, *conditions)
+            .limit(limit)
         )
-    )
-
-    # 动态条件
-    if request.target_district_id is not None:
-        stmt = stmt.where(HousingData.district_id == request.target_district_id)
-
-    if request.max_school_limit is not None:
-        stmt = stmt.where(CommuteTime.commute_time_minutes <= request.max_school_limit)
 
-    if request.flat_type_preference:
-        stmt = stmt.where(HousingData.type.in_(request.flat_type_preference))
+    # 各级租金区间之并：可走价格索引的范围条件（不改变结果）
+    matched = candidates(
+        HousingData.price >= min(f.min_rent for f in levels),
+        HousingData.price <= max(f.max_rent for f in levels),
+        any_level_condition(levels),
+    ).order_by(level_expr, commute.asc(), CommuteTime.housing_id)
+    nearest = candidates().order_by(commute.asc(), CommuteTime.housing_id)
+    # UNION 去掉两段都取到的行（同一房源的级别和通勤相同）
+    rows = union(matched, nearest).subquery()
 
-    if request.max_mrt_distance is not None:
-        stmt = stmt.where(HousingData.distance_to_mrt <= request.max_mrt_distance)
+    stmt = (
+        select(HousingData, rows.c.relaxation_level)
+        .join(rows, HousingData.id == rows.c.housing_id)
+        .order_by(rows.c.relaxation_level, rows.c.commute_time_minutes.asc(), HousingData.id)
+        .limit(limit)
+    )
 
     # 异步执行查询
     async with AsyncSessionLocal() as session:
-        print(DATABASE_URL_ASYNC)
         result = await session.execute(stmt)
-        housings = result.scalars().all()
-
-        original_count = len(housings)
-        print(f"初步过滤得到{original_count}条房源记录。")
-
-        # 若结果少于50条，补充至通勤时间最短的50条（不重复）
-        target_count = 50
-        if original_count < target_count:
-            existing_ids = [h.id for h in housings]
-
-            fallback_stmt = (
-                select(HousingData)
-                .join(CommuteTime, HousingData.id == CommuteTime.housing_id)
-                .where(
-                    CommuteTime.university_id == request.school_id,
-                    HousingData.id.notin_(existing_ids),
-                )
-                .order_by(CommuteTime.commute_time_minutes.asc())
-                .limit(target_count-original_count)
-            )
-
-            fallback_result = await session.execute(fallback_stmt)
-            fallback_housings = fallback_result.scalars().all()
-            print(f"补充了{len(fallback_housings)}条房源记录以满足最小数量要求。")
-            housings.extend(fallback_housings)
-
-        # 少量去重并返回
-        housings, removed_count = remove_duplicate_housings(housings)
-        return_count = min(len(housings), target_count)
-        return housings[:return_count]
-
-async def filter_housing_async(housings: list[HousingData], request: RequestInfo):
-    '''根据 RequestInfo 对所有房源进行过滤并计算评分'''
-    results = []
-    
+        rows = result.all()
+
+    housings = [housing for housing, _ in rows]
+    row_levels = {housing.id: level for housing, level in rows}
+
+    # 少量去重并返回
+    housings, removed_count = remove_duplicate_housings(housings)
+    housings = housings[:TARGET_COUNT]
+    relaxation_levels = [row_levels[h.id] for h in housings]
+
+    deepest = max(relaxation_levels, default=0)
+    metrics.record_relaxation_level(deepest)
+    logger.debug("housing query matched", extra={
+        "count": len(housings),
+        "exact": relaxation_levels.count(0),
+        "relaxation_level": deepest,
+    })
+    return housings, relaxation_levels
+
+async def query_housing_by_ids_async(housing_ids: list[int]) -> list[HousingData]:
+    '''按 id 取房源（用于已存排序结果的翻页），顺序与 housing_ids 一致'''
+    if not housing_ids:
+        return []
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(HousingData).where(HousingData.id.in_(housing_ids)))
+        housing_map = {h.id: h for h in result.scalars().all()}
+    return [housing_map[i] for i in housing_ids if i in housing_map]
+
+async def collect_housing_data_async(housings: list[HousingData], school_id: int) -> list[dict]:
+    '''批量补全房源信息（区域、图片、到 school_id 的通勤、周边设施），返回 process_housing 的原始数据'''
     async with AsyncSessionLocal() as session:
         raw_data = []
         radius_m = 2000
 
         housing_ids = [h.id for h in housings]
-        district_ids = list({h.district_id for h in housings if h.district_id})
+
+        # 特征表模式：区域名、安全分、设施统计和展示用设施列表每个房源一行（listing_features）
+        feature_map = {}
+        if LISTING_FEATURES:
+            feature_map = {
+                f.housing_id: f for f in (
+                    await session.execute(
+                        select(ListingFeatures.housing_id, ListingFeatures.district_name, ListingFeatures.safety_score,
+                               ListingFeatures.facility_count, ListingFeatures.public_facilities)
+                        .where(ListingFeatures.housing_id.in_(housing_ids))
+                    )
+                ).all()
+            }
+        # 没有特征行的房源（尚未刷新）仍按原方式现查
+        pending = [h for h in housings if h.id not in feature_map]
+        district_ids = list({h.district_id for h in pending if h.district_id})
         
         # 批量取 District
         district_map = {
             d.id: d for d in (
                 await session.execute(select(District).where(District.id.in_(district_ids)))
             ).scalars().all()
-        }
+        } if district_ids else {}
         
         # 批量取 Image
         image_map = {
@@ -147,7 +239,7 @@ async def filter_housing_async(housings: list[HousingData], request: RequestInfo
                 await session.execute(
                     select(CommuteTime.housing_id, CommuteTime.commute_time_minutes)
                     .where(CommuteTime.housing_id.in_(housing_ids),
-                        CommuteTime.university_id == request.school_id)
+                        CommuteTime.university_id == school_id)
                 )
             ).all()
         }
@@ -191,25 +283,47 @@ async def filter_housing_async(housings: list[HousingData], request: RequestInfo
 
             return facility_map
 
+        # 全局评分模式：批量取预计算评分
+        score_map = {}
+        if GLOBAL_SCORES:
+            score_map = {
+                s.housing_id: (s.cost_score, s.commute_score, s.neighborhood_score) for s in (
+                    await session.execute(
+                        select(HousingScore.housing_id, HousingScore.cost_score,
+                               HousingScore.commute_score, HousingScore.neighborhood_score)
+                        .where(HousingScore.university_id == school_id,
+                            HousingScore.housing_id.in_(housing_ids))
+                    )
+                ).all()
+            }
+
         start_time = time.time()
         
-        facility_map = await get_facilities_from_cache(session, housing_ids, radius_m=2000)
+        pending_ids = [h.id for h in pending]
+        facility_map = await get_facilities_from_cache(session, pending_ids, radius_m=2000) if pending_ids else {}
         
-        print(f'设施查询时间: {time.time() - start_time:.2f} 秒')
+        logger.debug("facility lookup done", extra={"seconds": round(time.time() - start_time, 3)})
 
         # 处理每个房源
         def process_housing(housing: HousingData):
-            district = district_map.get(housing.district_id)
-            district_safety_score = district.safety_score if district else 0.0
-            district_name = district.district_name if district else ""
-
             img_url = image_map.get(housing.id)
             commute_time = commute_map.get(housing.id)
 
-            # 从预查询的结果中获取设施信息
-            nearest_facilities = facility_map.get(housing.id, [])
-            
-            facility_score = len(nearest_facilities)
+            feature = feature_map.get(housing.id)
+            if feature is not None:
+                district_safety_score = feature.safety_score
+                district_name = feature.district_name or ""
+                nearest_facilities = feature.public_facilities or []
+                facility_score = feature.facility_count
+            else:
+                district = district_map.get(housing.district_id)
+                district_safety_score = district.safety_score if district else 0.0
+                district_name = district.district_name if district else ""
+
+                # 从预查询的结果中获取设施信息
+                nearest_facilities = facility_map.get(housing.id, [])
+
+                facility_score = len(nearest_facilities)
 
             return {
                 "housing": housing,
@@ -219,59 +333,67 @@ async def filter_housing_async(housings: list[HousingData], request: RequestInfo
                 "facility": facility_score,
                 "safety": district_safety_score or 0,
                 "district": district_name,
-                "public_facilities": nearest_facilities
+                "public_facilities": nearest_facilities,
+                "scores": score_map.get(housing.id)
             }
 
         raw_data = [process_housing(h) for h in housings]
         
         execution_time = time.time() - start_time
-        print(f'总查询时间: {execution_time:.2f} 秒')
-
-        # === 归一化函数 ===
-        def normalize(values, reverse=False):
-            vals = [v for v in values if v is not None]
-            if not vals:
-                return [0 for _ in values]
-            min_v, max_v = min(vals), max(vals)
-            if max_v == min_v:
-                return [1 for _ in values]
-            return [
-                (max_v - v) / (max_v - min_v) if reverse else (v - min_v) / (max_v - min_v)
-                for v in values
-            ]
-
-        price_norm = normalize([x["price"] for x in raw_data], reverse=True) # 价格越低越好
-        commute_norm = normalize([x["commute"] for x in raw_data], reverse=True) # 通勤时间越短越好
-        facility_norm = normalize([x["facility"] for x in raw_data])
-        safety_norm = normalize([x["safety"] for x in raw_data])
-        neighbour_norm = normalize([(facility_norm[i] * 2 + safety_norm[i]) for i in range(len(raw_data))]) # 邻里综合评分
-
-        for i, data in enumerate(raw_data):
-            housing = data["housing"]
-            total_score = get_total_score(price_norm[i],commute_norm[i],neighbour_norm[i],request)
-
-            resultInfo = ResultInfo(
-                property_id=housing.id,
-                img_src=data['img'],
-                name=housing.name,
-                district=data['district'],
-                price=str(housing.price),
-                beds=housing.beds_num,
-                baths=housing.baths_num,
-                area=housing.area_sqft,
-                build_time=str(housing.build_time) if housing.build_time else "",
-                location=housing.location,
-                time_to_school=int(data["commute"]),
-                distance_to_mrt=int(housing.distance_to_mrt) if housing.distance_to_mrt else None,
-                latitude=housing.latitude,
-                longitude=housing.longitude,
-                public_facilities=data["public_facilities"],
-                facility_type=housing.type,
-                costScore=round(price_norm[i], 2),
-                commuteScore=round(commute_norm[i], 2),
-                neighborhoodScore=round(neighbour_norm[i], 2)
-            )
-            results.append((resultInfo, total_score))
+        logger.debug("enrichment query done", extra={"seconds": round(execution_time, 3)})
+
+        return raw_data
+
+def build_result(
+    data: dict, cost_score: float, commute_score: float, neighbour_score: float, result_factory=ResultInfo,
+    relaxation_level: int = None
+):
+    '''由 process_housing 的原始数据、三项评分和放宽级别构造结果对象'''
+    housing = data["housing"]
+    return result_factory(
+        property_id=housing.id,
+        img_src=data['img'],
+        name=housing.name,
+        district=data['district'],
+        price=str(housing.price),
+        beds=housing.beds_num,
+        baths=housing.baths_num,
+        area=housing.area_sqft,
+        build_time=str(housing.build_time) if housing.build_time else "",
+        location=housing.location,
+        time_to_school=int(data["commute"]),
+        distance_to_mrt=int(housing.distance_to_mrt) if housing.distance_to_mrt else None,
+        latitude=housing.latitude,
+        longitude=housing.longitude,
+        public_facilities=data["public_facilities"],
+        facility_type=housing.type,
+        costScore=cost_score,
+        commuteScore=commute_score,
+        neighborhoodScore=neighbour_score,
+        relaxation_level=relaxation_level
+    )
+
+async def filter_housing_async(
+    housings: list[HousingData], request: RequestInfo, result_factory=ResultInfo, relaxation_levels: list[int] = None
+):
+    '''
+    根据 RequestInfo 对所有房源进行过滤并计算评分
+    result_factory: 用字段关键字参数构造结果对象，默认 ResultInfo（会做校验）；
+    后端传入免校验的构造函数，直接得到 Property
+    relaxation_levels: 与 housings 对应的放宽级别（query_housing_data_async 的第二个返回值）
+    '''
+    raw_data = await collect_housing_data_async(housings, request.school_id)
+    scores = score_housing_global(raw_data, request) if GLOBAL_SCORES else None
+    if scores is None:
+        scores = score_housing_data(raw_data, request)
+    if relaxation_levels is None:
+        relaxation_levels = [None] * len(raw_data)
+
+    results = [
+        (build_result(data, cost_score, commute_score, neighbour_score, result_factory, level), total_score)
+        for data, (cost_score, commute_score, neighbour_score, total_score), level
+        in zip(raw_data, scores, relaxation_levels)
+    ]
 
     # 排序取前 50
     results_sorted = sorted(results, key=lambda pair: pair[1], reverse=True)[:50]
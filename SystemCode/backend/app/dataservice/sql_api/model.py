@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, Text, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, Text, DateTime, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from geoalchemy2 import Geometry, Geography
@@ -70,8 +71,11 @@ class CommuteTime(Base):
     university_id = Column(Integer, ForeignKey("universities.id"), nullable=False)
     commute_time_minutes = Column(Float, nullable=True)  # 单位：分钟
 
-    # 防止重复记录
-    __table_args__ = (UniqueConstraint('housing_id', 'university_id', name='_housing_university_uc'),)
+    # 防止重复记录；(学校, 通勤) 索引供按通勤最近取房源（query_housing_data_async 兜底级）
+    __table_args__ = (
+        UniqueConstraint('housing_id', 'university_id', name='_housing_university_uc'),
+        Index('ix_commute_university_minutes', 'university_id', 'commute_time_minutes'),
+    )
 
     # ORM 关系
     housing = relationship("HousingData", backref="commute_records")
@@ -136,6 +140,46 @@ class HousingFacilityDistance(Base):
     rank = Column(Integer)  # 第几个最近的（1, 2, 3）
     distance_m = Column(Float)
 
+class ListingFeatures(Base):
+    '''
+    房源邻里特征（每个房源一行），由 DataScript/geocode.py run_precompute 根据
+    housing_facility_distances 和 districts 刷新，请求阶段补全信息时直接读取
+    '''
+    __tablename__ = 'listing_features'
+
+    housing_id = Column(Integer, ForeignKey('housing_data.id'), primary_key=True)
+    district_name = Column(String(255))
+    safety_score = Column(Float)
+    facility_count = Column(Integer)  # 2km 内有设施的类型数（即请求阶段的设施评分原始值）
+    park_count = Column(Integer)  # 2km 内各类设施数（只统计预计算的最近 3 个）
+    hawkercenter_count = Column(Integer)
+    supermarket_count = Column(Integer)
+    library_count = Column(Integer)
+    nearest_park_m = Column(Float, nullable=True)  # 各类最近设施距离（米）
+    nearest_hawkercenter_m = Column(Float, nullable=True)
+    nearest_supermarket_m = Column(Float, nullable=True)
+    nearest_library_m = Column(Float, nullable=True)
+    facility_score = Column(Float)  # 按距离加权的设施分：2km 内每个设施记 1 - 距离/2000
+    public_facilities = Column(JSONB)  # 展示用：各类型 2km 内最近的设施 [{名称: "距离"}]
+    updated_at = Column(DateTime(timezone=True))
+
+class HousingScore(Base):
+    '''
+    房源 - 大学 全局评分（入库时按学校整体归一化到 (0, 1]，见 DataScript/geocode.py compute_housing_scores）
+    同一房源对同一学校的评分不随请求变化，SCORE_NORMALIZATION=global 时请求阶段直接读取
+    '''
+    __tablename__ = 'housing_scores'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    housing_id = Column(Integer, ForeignKey('housing_data.id'), nullable=False)
+    university_id = Column(Integer, ForeignKey('universities.id'), nullable=False)
+    cost_score = Column(Float)
+    commute_score = Column(Float)
+    neighborhood_score = Column(Float)
+
+    # (学校, 房源) 唯一且带评分的覆盖索引由 DataScript 建（见 geocode.run_precompute），只读索引即可；
+    # 这里不声明 UniqueConstraint，否则 create_all 先建出同列的普通唯一索引，覆盖索引就成了多余的第二份
+
 class ImageRecord(Base):
     '''图片数据'''
     __tablename__ = 'images'
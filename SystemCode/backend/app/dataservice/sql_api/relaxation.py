@@ -0,0 +1,95 @@
+import json
+from typing import NamedTuple, Optional
+
+from sqlalchemy import and_, case, or_, true
+
+from .api_model import RelaxationStep
+from .model import HousingData, CommuteTime
+from .envconfig import get_relaxation_ladder
+
+TARGET_COUNT = 50  # 每个请求最多 50 条候选
+DEDUP_SLACK = 50   # 多取一些行，去重后仍能凑够 TARGET_COUNT
+
+# 候选不足时依次放宽：MRT 距离 -> 通勤上限 -> 租金区间 -> 区域；
+# 全部放宽仍不够时退到最后一级，只按学校取通勤最近的房源
+DEFAULT_RELAXATION_LADDER = [
+    RelaxationStep(mrt_distance_factor=2.0),
+    RelaxationStep(school_limit_factor=1.5),
+    RelaxationStep(rent_band_ratio=0.2),
+    RelaxationStep(drop_district=True),
+]
+
+
+def load_relaxation_ladder() -> list[RelaxationStep]:
+    raw = get_relaxation_ladder()
+    if not raw:
+        return DEFAULT_RELAXATION_LADDER
+    return [RelaxationStep.model_validate(step) for step in json.loads(raw)]
+
+
+RELAXATION_LADDER = load_relaxation_ladder()
+
+
+class HousingFilters(NamedTuple):
+    '''某一级的筛选条件，None / 空列表表示不限制'''
+    min_rent: float
+    max_rent: float
+    district_id: Optional[int]
+    max_commute: Optional[float]
+    flat_types: list
+    max_mrt: Optional[float]
+
+
+def ladder_filters(request, ladder: Optional[list[RelaxationStep]] = None) -> list[HousingFilters]:
+    '''
+    第 0 级为请求原条件，第 i 级为放宽阶梯前 i 步累积后的条件
+    最后的兜底级（只限学校）不在列表中，其级别为 len(返回值)
+    '''
+    ladder = RELAXATION_LADDER if ladder is None else ladder
+    accumulated = RelaxationStep()
+    levels = []
+    for step in [RelaxationStep()] + list(ladder):
+        accumulated = accumulated.model_copy(update=step.model_dump(exclude_none=True))
+        band = accumulated.rent_band_ratio or 0.0
+        levels.append(HousingFilters(
+            min_rent=request.min_monthly_rent * (1 - band),
+            max_rent=request.max_monthly_rent * (1 + band),
+            district_id=None if accumulated.drop_district else request.target_district_id,
+            max_commute=_widen(request.max_school_limit, accumulated.school_limit_factor),
+            flat_types=list(request.flat_type_preference or []),
+            max_mrt=_widen(request.max_mrt_distance, accumulated.mrt_distance_factor),
+        ))
+    return levels
+
+
+def _widen(limit: Optional[float], factor: Optional[float]) -> Optional[float]:
+    if limit is None or not factor:
+        return limit
+    return limit * factor
+
+
+def sql_conditions(filters: HousingFilters) -> list:
+    '''与 query_housing_data_async 原先的动态条件相同（NULL 值不满足任何限制）'''
+    conditions = [HousingData.price >= filters.min_rent, HousingData.price <= filters.max_rent]
+    if filters.district_id is not None:
+        conditions.append(HousingData.district_id == filters.district_id)
+    if filters.max_commute is not None:
+        conditions.append(CommuteTime.commute_time_minutes <= filters.max_commute)
+    if filters.flat_types:
+        conditions.append(HousingData.type.in_(filters.flat_types))
+    if filters.max_mrt is not None:
+        conditions.append(HousingData.distance_to_mrt <= filters.max_mrt)
+    return conditions
+
+
+def any_level_condition(levels: list[HousingFilters]):
+    '''满足任一级条件（即不落到兜底级）的行，可作为 WHERE 让规划器使用索引'''
+    return or_(*[and_(true(), *sql_conditions(filters)) for filters in levels])
+
+
+def relaxation_level_expr(levels: list[HousingFilters]):
+    '''每行被哪一级条件选中：第一个满足的级别，都不满足时为兜底级 len(levels)'''
+    return case(
+        *[(and_(true(), *sql_conditions(filters)), level) for level, filters in enumerate(levels)],
+        else_=len(levels)
+    )
@@ -1,52 +1,172 @@
-from typing import List
+import json
+import base64
+import binascii
+from typing import AsyncIterator, List, Optional
 import openai
-from fastapi import status, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import status, HTTPException, BackgroundTasks
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from pydantic import ValidationError
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.models import EnquiryForm, EnquiryNL, PropertyLocation, Property, RecommendationResponse
+from app.models import (
+    EnquiryForm, EnquiryNL, PropertyLocation, Property, RecommendationResponse, RecommendationPage,
+    BatchRecommendationItem, RankingWeights
+)
 from app.database import crud as db_service
+from app.dependencies import async_session_maker
 from app.services import recommendation_service as rec_service
 from app.services import map_service as map_service
+from app.services import idempotency
+from app.services.ranking_session import ranking_sessions
 from app.llm import service as llm_service
+from app.llm.precompute import explanation_profile, fits_enquiry, PRECOMPUTED_EXPLANATIONS_ENABLED
+from app.timing import stage
+from app import metrics
+from app.log import get_logger, log_payload
+
+
+logger = get_logger("handlers.property")
+
+TOP_K = 3
+MAX_BATCH_SIZE = 1000
 
 
 async def submit_form_handler(
     *,
     db: AsyncSession,
     client: openai.AsyncOpenAI,
-    enquiry: EnquiryForm
+    enquiry: EnquiryForm,
+    background_tasks: Optional[BackgroundTasks] = None,
+    llm_refine: bool = False
 ) -> RecommendationResponse:
 
+    # same form from the same device within the window: return the stored result, no new writes
+    with stage("idempotency"):
+        previous = await idempotency.find_previous_recommendation(db=db, enquiry=enquiry)
+    if previous is not None:
+        return _response_from_stored(previous)
+
     # save enquiry to db and cache
-    enquiry_entity = await db_service.save_enquiry(db=db, enquiry=enquiry)
+    with stage("save_enquiry"):
+        enquiry_entity = await db_service.save_enquiry(db=db, enquiry=enquiry)
 
     # get TopN recommendation
     properties = await rec_service.fetchRecommendProperties(enquiry)
+    metrics.observe_candidates("fetched", len(properties))
 
     # multi-objective optimization ranking
-    ranked_properties: List[Property] = rec_service.multi_objective_optimization_ranking(
-        enquiry=enquiry, 
-        propertyList=properties
-    )
+    # (the full ranking is kept so later pages need no recomputation,
+    # and the weight-independent session so re-weighting needs no re-scoring)
+    with stage("ranking"):
+        ranking_session = rec_service.build_ranking_session(enquiry=enquiry, propertyList=properties)
+        ranked_properties: List[Property] = ranking_session.rank()
 
     # LLM generate natural language reason for recommendation
-    top_k_with_explanations = await llm_service.generate_explanation_for_top_properties(
-        enquiry=enquiry,
-        ranked_properties=ranked_properties,
-        client=client,
-        k = 3
-    )
+    # (llm_refine: answer with template reasons now, upgrade them with the LLM later)
+    refine = llm_refine and background_tasks is not None and client is not None
+    with stage("explain"):
+        precomputed = await db_service.get_precomputed_explanations(
+            db=db,
+            profile=explanation_profile(enquiry),
+            property_ids=[prop.property_id for prop in ranked_properties[:TOP_K] if fits_enquiry(enquiry, prop)]
+        ) if PRECOMPUTED_EXPLANATIONS_ENABLED else {}
+        top_k_with_explanations = await llm_service.generate_explanation_for_top_properties(
+            enquiry=enquiry,
+            ranked_properties=ranked_properties,
+            client=client,
+            k = TOP_K,
+            mode="template" if refine else None,
+            precomputed=precomputed
+        )
 
     # save recommendation result to db and cache
-    await db_service.save_recommendation(
-        eid=enquiry_entity.eid if enquiry_entity else None, 
-        db=db, 
-        properties=top_k_with_explanations
+    eid = enquiry_entity.eid if enquiry_entity else None
+    with stage("save_recommendation"):
+        saved_recommendation = await db_service.save_recommendation(
+            eid=eid, 
+            db=db, 
+            properties=top_k_with_explanations,
+            ranked_properties=ranked_properties
+        )
+        if saved_recommendation is not None:
+            await idempotency.remember_submission(enquiry=enquiry, eid=eid)
+    if eid:
+        ranking_sessions.set(eid, ranking_session)
+
+    if refine and eid:
+        background_tasks.add_task(
+            _refine_recommendation_reasons,
+            eid=eid,
+            client=client,
+            enquiry=enquiry,
+            properties=[prop.model_copy() for prop in top_k_with_explanations]
+        )
+
+    return RecommendationResponse(
+        properties=top_k_with_explanations,
+        eid=eid,
+        next_cursor=_encode_cursor(eid, len(top_k_with_explanations)) if eid and len(ranked_properties) > TOP_K else None
+    )
+
+
+def _response_from_stored(recommendation) -> RecommendationResponse:
+    properties = [Property.model_validate(item) for item in (recommendation.recommandation_result or [])]
+    ranked_count = len((recommendation.ext_info or {}).get("ranked") or properties)
+    eid = recommendation.eid
+    return RecommendationResponse(
+        properties=properties,
+        eid=eid,
+        next_cursor=_encode_cursor(eid, len(properties)) if ranked_count > len(properties) else None
     )
 
-    return RecommendationResponse(properties=top_k_with_explanations)
+
+async def submit_form_batch_handler(
+    *,
+    enquiries: List[EnquiryForm]
+) -> StreamingResponse:
+    '''
+    Bulk enquiries, answered as NDJSON in completion order (one line per enquiry, keyed by
+    its index). Enquiries sharing a school_id share one candidate fetch, one enrichment and
+    one vectorized scoring pass. Reasons are template-based and nothing is persisted.
+    '''
+    if not enquiries:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No enquiries.")
+    if len(enquiries) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_BATCH_SIZE} enquiries per batch."
+        )
+    return StreamingResponse(_stream_batch(enquiries), media_type="application/x-ndjson")
+
+
+async def _stream_batch(enquiries: List[EnquiryForm]) -> AsyncIterator[bytes]:
+    async for indices, results in rec_service.fetchRecommendPropertiesBatch(enquiries):
+        if isinstance(results, Exception):
+            for i in indices:
+                item = BatchRecommendationItem(
+                    index=i, device_id=enquiries[i].device_id, properties=[], error="Failed to fetch properties."
+                )
+                yield item.model_dump_json().encode() + b"\n"
+            continue
+
+        for i, properties in zip(indices, results):
+            enquiry = enquiries[i]
+            metrics.observe_candidates("fetched", len(properties))
+            with stage("ranking"):
+                ranked_properties = rec_service.multi_objective_optimization_ranking(
+                    enquiry=enquiry,
+                    propertyList=properties,
+                    top_k=TOP_K
+                )
+            top_k_with_explanations = await llm_service.generate_explanation_for_top_properties(
+                enquiry=enquiry,
+                ranked_properties=ranked_properties,
+                client=None,
+                k=TOP_K,
+                mode="template"
+            )
+            item = BatchRecommendationItem(index=i, device_id=enquiry.device_id, properties=top_k_with_explanations)
+            yield item.model_dump_json().encode() + b"\n"
 
 
 async def submit_description_handler(
@@ -54,15 +174,18 @@ async def submit_description_handler(
     db: AsyncSession,
     client: openai.AsyncOpenAI,
     enquiry: EnquiryNL,
+    background_tasks: Optional[BackgroundTasks] = None,
+    llm_refine: bool = False
 ) -> RecommendationResponse:
 
     # natural language -> dict
-    extracted_dict = await llm_service.convert_natural_language_to_form(enquiry=enquiry, client=client)
+    with stage("extract"):
+        extracted_dict = await llm_service.convert_natural_language_to_form(enquiry=enquiry, client=client)
 
     # check required fields
     missing_fields = _getMissingField(extracted_dict)
     if missing_fields:
-        print(f'missing_fields: {missing_fields}')
+        logger.info("description is missing fields", extra={"missing_fields": missing_fields})
         return JSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             content={
@@ -81,11 +204,150 @@ async def submit_description_handler(
             detail=f"Error validating extracted preferences from LLM: {e}"
         )
 
-    print(f'LLM success! \
-          \n EnquiryNL: {enquiry.model_dump_json(indent=2)}\
-          \n EnquiryForm: {enquiry_form.model_dump_json(indent=2)}')
+    log_payload(
+        logger, "extracted enquiry form",
+        lambda: {"enquiry_nl": enquiry.model_dump(mode="json"), "enquiry_form": enquiry_form.model_dump(mode="json")},
+    )
     
-    return await submit_form_handler(db=db, client=client, enquiry=enquiry_form)
+    return await submit_form_handler(
+        db=db,
+        client=client,
+        enquiry=enquiry_form,
+        background_tasks=background_tasks,
+        llm_refine=llm_refine
+    )
+
+
+async def _refine_recommendation_reasons(
+    *,
+    eid: int,
+    client: openai.AsyncOpenAI,
+    enquiry: EnquiryForm,
+    properties: List[Property]
+) -> None:
+
+    reasons = await llm_service.refine_explanations(enquiry=enquiry, properties=properties, client=client)
+
+    # request-scoped session is already closed, open a new one
+    async with async_session_maker() as db:
+        await db_service.update_recommendation_reasons(eid=eid, db=db, reasons=reasons)
+
+
+async def rerank_handler(
+    *,
+    eid: int,
+    weights: RankingWeights,
+    top_k: int = TOP_K
+) -> RecommendationResponse:
+    '''
+    New ordering of a submitted enquiry's candidates for new importance weights.
+    Pareto layers and crowding do not depend on the weights, so this is one sort over
+    the cached session; reasons already generated are kept, new entries get template reasons.
+    Nothing is stored: paging (next_cursor) still follows the submitted ranking.
+    '''
+    session = ranking_sessions.get(eid)
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No ranking session for enquiry {eid}, please resubmit the form."
+        )
+
+    reweighted = session.enquiry.model_copy(update=weights.model_dump())
+    with stage("rerank"):
+        # copies: the session's properties are shared with later re-rank calls
+        ranked = [prop.model_copy() for prop in session.rank(weights=weights, top_k=top_k)]
+    existing = {prop.property_id: prop.recommand_reason for prop in ranked if prop.recommand_reason}
+    top_k_with_explanations = await llm_service.generate_explanation_for_top_properties(
+        enquiry=reweighted,
+        ranked_properties=ranked,
+        client=None,
+        k=top_k,
+        mode="template",
+        precomputed=existing
+    )
+    return RecommendationResponse(properties=top_k_with_explanations, eid=eid)
+
+
+async def recommendation_page_handler(
+    *,
+    db: AsyncSession,
+    eid: int,
+    cursor: Optional[str] = None,
+    limit: int = 10
+) -> RecommendationPage:
+    '''
+    Page through a stored ranking. Redis (ranking:{eid}) holds every ranked property;
+    on a miss the compact ranking in ext_info is used and only the page's properties
+    are looked up again, with their original scores restored.
+    No retrieval, ranking or LLM call is repeated.
+    '''
+    offset = _decode_cursor(cursor, eid) if cursor else 0
+
+    ranking = await db_service.get_cached_ranking(eid=eid)
+    if ranking is not None:
+        total = len(ranking)
+        page = [Property.model_validate(item) for item in ranking[offset:offset + limit]]
+    else:
+        total, page = await _ranking_page_from_db(db=db, eid=eid, offset=offset, limit=limit)
+
+    next_offset = offset + limit
+    return RecommendationPage(
+        eid=eid,
+        properties=page,
+        total_count=total,
+        next_cursor=_encode_cursor(eid, next_offset) if next_offset < total else None
+    )
+
+
+async def _ranking_page_from_db(*, db: AsyncSession, eid: int, offset: int, limit: int):
+    recommendation = await db_service.get_recommendation(db=db, eid=eid)
+    if recommendation is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No recommendation for enquiry {eid}.")
+
+    # explained top-k are stored in full; rows saved before ext_info existed only have these
+    stored = {item["property_id"]: item for item in (recommendation.recommandation_result or [])}
+    ranked = (recommendation.ext_info or {}).get("ranked") or [
+        [item["property_id"], item.get("costScore"), item.get("commuteScore"), item.get("neighborhoodScore")]
+        for item in (recommendation.recommandation_result or [])
+    ]
+    entries = ranked[offset:offset + limit]
+
+    missing_ids = [property_id for property_id, *_ in entries if property_id not in stored]
+    fetched = {}
+    if missing_ids:
+        enquiry = await db_service.get_enquiry(db=db, eid=eid)
+        if enquiry is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No enquiry {eid}.")
+        fetched = {prop.property_id: prop for prop in await rec_service.fetchPropertiesByIds(enquiry, missing_ids)}
+
+    page = []
+    for property_id, cost, commute, neighborhood in entries:
+        if property_id in stored:
+            page.append(Property.model_validate(stored[property_id]))
+        elif property_id in fetched:
+            prop = fetched[property_id]
+            prop.costScore, prop.commuteScore, prop.neighborhoodScore = cost, commute, neighborhood
+            page.append(prop)
+        # listings deleted since the ranking was stored are skipped
+
+    return len(ranked), page
+
+
+def _encode_cursor(eid: int, offset: int) -> str:
+    raw = json.dumps({"eid": eid, "offset": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _decode_cursor(cursor: str, eid: int) -> int:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = int(data["offset"])
+        valid = data["eid"] == eid and offset >= 0
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    return offset
 
 
 def _getMissingField(extracted_dict: dict) -> list:
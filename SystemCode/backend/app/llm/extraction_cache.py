@@ -0,0 +1,98 @@
+import os
+import re
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app import metrics
+
+
+EXTRACTION_CACHE_TTL_SECONDS = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(60 * 60)))  # 1h
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "1024"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_description(description: str) -> str:
+    '''Cache key: case-folded, whitespace-collapsed description'''
+    return _WHITESPACE.sub(" ", description).strip().casefold()
+
+
+class ExtractionCache:
+    '''
+    In-process TTL cache for natural-language extraction results.
+    Stores the post-filtered dict (without device_id) and coalesces concurrent
+    lookups of the same key into a single loader call, run as a task of its own.
+    '''
+
+    def __init__(self, ttl_seconds: int = EXTRACTION_CACHE_TTL_SECONDS, max_entries: int = EXTRACTION_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[dict]]) -> dict:
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            metrics.record_cache("extraction", "hit")
+            return dict(cached)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            metrics.record_cache("extraction", "coalesced")
+            return dict(await asyncio.shield(inflight))
+
+        self.misses += 1
+        metrics.record_cache("extraction", "miss")
+        # the load runs as its own task: a caller that goes away (client disconnect)
+        # cancels only its own wait, never the load the coalesced callers share
+        task = asyncio.ensure_future(self._load(key, loader))
+        # mark the result retrieved so a load nobody waits for any more does not log a warning
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return dict(await asyncio.shield(task))
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[dict]]) -> dict:
+        try:
+            value = await loader()
+            if value:
+                self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+extraction_cache = ExtractionCache()
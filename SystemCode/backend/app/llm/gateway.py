@@ -0,0 +1,262 @@
+import time
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import httpx
+import openai
+
+from app import metrics
+from app.log import get_logger
+
+logger = get_logger("llm.gateway")
+
+
+# Errors that indicate the upstream is slow/unhealthy (count towards the breaker)
+_UPSTREAM_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class CircuitOpenError(openai.OpenAIError):
+    '''Raised without calling upstream while the breaker is open'''
+
+
+class CircuitBreaker:
+    '''closed -> open after N consecutive failures -> half-open after reset_timeout'''
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probe_in_flight:
+            # let a single probe through
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def release(self) -> None:
+        '''Call abandoned (e.g. cancelled) without an outcome'''
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LatencyWindow:
+    '''Rolling window of recent call latencies'''
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _call_name(kwargs: dict) -> str:
+    '''Forced tool name (EnquiryExtractionTool, ExplanationBatchTool), or "text"'''
+    tool_choice = kwargs.get("tool_choice")
+    if isinstance(tool_choice, dict):
+        return tool_choice.get("function", {}).get("name", "tool")
+    return "text"
+
+
+class _Completions:
+    def __init__(self, gateway: "LLMGateway"):
+        self._gateway = gateway
+
+    async def create(self, **kwargs: Any) -> Any:
+        return await self._gateway.create_chat_completion(**kwargs)
+
+
+class _Chat:
+    def __init__(self, gateway: "LLMGateway"):
+        self.completions = _Completions(gateway)
+
+
+class LLMGateway:
+    '''
+    Sits between llm/service.py and AsyncOpenAI. Exposes the same
+    `chat.completions.create(...)` call so service code is unchanged, and adds
+    a circuit breaker and hedged requests on top of the client's deadlines.
+    '''
+
+    def __init__(
+        self,
+        client: openai.AsyncOpenAI,
+        *,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_quantile: float = 0.95,
+        min_hedge_delay: float = 0.5,
+        hedging_enabled: bool = True
+    ):
+        self.client = client
+        self.breaker = breaker or CircuitBreaker()
+        # one window per (model, call type): extraction, batched explanation and
+        # per-property calls have very different latency profiles
+        self.latencies: Dict[Tuple[str, str], LatencyWindow] = {}
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.hedging_enabled = hedging_enabled
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.short_circuited = 0
+        self.chat = _Chat(self)
+
+    def _window(self, key: Tuple[str, str]) -> LatencyWindow:
+        window = self.latencies.get(key)
+        if window is None:
+            window = self.latencies[key] = LatencyWindow()
+        return window
+
+    def _hedge_delay(self, key: Tuple[str, str]) -> Optional[float]:
+        if not self.hedging_enabled or self.breaker.state != "closed":
+            return None
+        threshold = self._window(key).quantile(self.hedge_quantile)
+        if threshold is None:
+            return None
+        return max(threshold, self.min_hedge_delay)
+
+    async def create_chat_completion(self, **kwargs: Any) -> Any:
+        model, call = kwargs.get("model", ""), _call_name(kwargs)
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            metrics.record_llm_call(model, call, latency=0.0, outcome="short_circuited")
+            raise CircuitOpenError("LLM circuit breaker is open")
+
+        start_time = time.perf_counter()
+        try:
+            completion = await self._hedged_call(kwargs, (model, call))
+        except _UPSTREAM_ERRORS as e:
+            self.breaker.record_failure()
+            metrics.record_llm_call(model, call, latency=time.perf_counter() - start_time, outcome=type(e).__name__)
+            raise
+        except openai.OpenAIError as e:
+            # 4xx etc.: upstream answered, so it is healthy
+            self.breaker.record_success()
+            metrics.record_llm_call(model, call, latency=time.perf_counter() - start_time, outcome=type(e).__name__)
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        self.breaker.record_success()
+        latency = time.perf_counter() - start_time
+        self._window((model, call)).add(latency)
+        metrics.record_llm_call(model, call, latency=latency, usage=getattr(completion, "usage", None))
+        return completion
+
+    async def _hedged_call(self, kwargs: dict, key: Tuple[str, str]) -> Any:
+        delay = self._hedge_delay(key)
+        if delay is None:
+            return await self.client.chat.completions.create(**kwargs)
+
+        primary = asyncio.ensure_future(self.client.chat.completions.create(**kwargs))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            # primary is slower than the recent p95 for this call: race a second identical request
+            self.hedges_sent += 1
+            secondary = asyncio.ensure_future(self.client.chat.completions.create(**kwargs))
+            pending = {primary, secondary}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary:
+                            self.hedges_won += 1
+                        return task.result()
+            # both failed: surface the primary's error
+            return primary.result()
+        finally:
+            # also runs when the caller is cancelled mid-wait: don't leave requests running
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "short_circuited": self.short_circuited,
+            "hedge_delay_seconds": {f"{model}:{call}": self._hedge_delay((model, call)) for model, call in self.latencies},
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+        }
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def build_llm_gateway(settings: Any) -> LLMGateway:
+    '''AsyncOpenAI on a tuned keep-alive httpx pool with explicit deadlines'''
+    timeout = httpx.Timeout(
+        connect=settings.LLM_CONNECT_TIMEOUT,
+        read=settings.LLM_READ_TIMEOUT,
+        write=settings.LLM_CONNECT_TIMEOUT,
+        pool=settings.LLM_CONNECT_TIMEOUT,
+    )
+    http_client = httpx.AsyncClient(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        ),
+    )
+    client = openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL or None,
+        http_client=http_client,
+        # openai passes its own per-request timeout, so set it here too
+        timeout=timeout,
+        max_retries=settings.LLM_MAX_RETRIES,
+    )
+    logger.info(
+        "LLM gateway ready (base_url=%s, read_timeout=%ss, hedging=%s)",
+        client.base_url, settings.LLM_READ_TIMEOUT, settings.LLM_HEDGING_ENABLED,
+    )
+    return LLMGateway(
+        client,
+        breaker=CircuitBreaker(
+            failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.LLM_BREAKER_RESET_SECONDS,
+        ),
+        hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+        hedging_enabled=settings.LLM_HEDGING_ENABLED,
+    )
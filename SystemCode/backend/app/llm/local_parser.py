@@ -0,0 +1,312 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .knowledge_base import SCHOOL_MAPPING, DISTRICT_MAPPING, FLAT_TYPE_MAPPING
+
+
+# Same conventions as EnquiryExtractionTool / EXTRACTION_PROMPT
+AROUND_RENT_MARGIN = 300
+NEAR_MRT_DISTANCE = 500
+
+# Typical walking pace, for "N min walk to MRT"
+WALK_METERS_PER_MINUTE = 80
+
+# Same as property_handler._getMissingField
+REQUIRED_FIELDS = ("min_monthly_rent", "max_monthly_rent", "school_id")
+
+# Plausible monthly rent range (S$); anything outside is not treated as rent
+MIN_RENT_VALUE = 100
+MAX_RENT_VALUE = 50000
+
+# Lower-case acronyms that are also ordinary English words ("sit", "ec")
+# only count when written in upper case.
+_CASE_SENSITIVE_ALIASES = {"sit", "ec"}
+
+# Wording that drives importance_* scoring; left to the LLM
+_IMPORTANCE_CUES = re.compile(
+    r"\b(must|definitely|most important|important|priority|prioritize|prioritise|"
+    r"value|matter|matters|care|compromise|essential|crucial|strict|strictly|really|"
+    r"prefer|preferably|ideally)\b|n't",
+    re.IGNORECASE,
+)
+
+# Negation / exclusion ("no HDB", "anything but condo", "not near MRT"): the rules would
+# read the excluded value as a preference, so these go to the LLM
+_NEGATION_CUES = re.compile(
+    r"\b(?:no|not|never|without|except|excluding|exclude|but|avoid|avoiding|hate|dislike|"
+    r"other than|rather than|instead of)\b|n't|\bdont\b",
+    re.IGNORECASE,
+)
+
+# Counts the extraction schema has no field for ("3 room", "2 bedrooms", "700 sqft");
+# dropping them silently would change the request, so the parse is ambiguous
+_QUANTITY = re.compile(
+    r"\b\d+(?:\.\d+)?\s*-?\s*(?:rooms?|bed(?:room)?s?|br|bhk|bath(?:room)?s?|"
+    r"sq\s?ft|sqft|square\s+(?:feet|foot|metres?|meters?)|sqm|storeys?|floors?|"
+    r"people|persons?|pax|roommates?|tenants?)\b",
+    re.IGNORECASE,
+)
+
+_TOKEN = re.compile(r"[A-Za-z0-9]+(?:-[A-Za-z0-9]+)*")
+
+_AMOUNT = r"(\$?\s?\d[\d,]*(?:\.\d+)?\s?(?:k\b)?)"
+_RANGE = re.compile(
+    rf"(?:between\s+)?{_AMOUNT}\s*(?:-|–|~|to|and)\s*{_AMOUNT}", re.IGNORECASE
+)
+_UPPER_BOUND = re.compile(
+    rf"\b(?:under|below|less than|not more than|no more than|not exceeding|"
+    rf"max(?:imum)?|at most|up to|within)\s*(?:of\s+)?{_AMOUNT}",
+    re.IGNORECASE,
+)
+_LOWER_BOUND = re.compile(
+    rf"\b(?:above|over|more than|at least|min(?:imum)?|from|starting)\s*(?:of\s+)?{_AMOUNT}",
+    re.IGNORECASE,
+)
+_APPROX = re.compile(
+    rf"\b(?:around|about|approximately|approx\.?|roughly|budget(?:\s+(?:is|of))?)\s*{_AMOUNT}",
+    re.IGNORECASE,
+)
+_SINGLE = re.compile(_AMOUNT)
+# Rent caps phrased with "no"/"not" are bounds, not negations
+_RENT_BOUND_NEGATIONS = re.compile(
+    rf"\b(?:not more than|no more than|not exceeding|not over|no higher than)\s*(?:of\s+)?{_AMOUNT}",
+    re.IGNORECASE,
+)
+
+_COMMUTE = re.compile(
+    r"(\d+)\s*-?\s*(?:min|mins|minute|minutes)\b", re.IGNORECASE
+)
+_DISTANCE = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(km|kilometers?|kilometres?|m|meters?|metres?)\b", re.IGNORECASE
+)
+_MRT = re.compile(r"\bmrt\b", re.IGNORECASE)
+_WALK = re.compile(r"\bwalk(?:ing)?\b", re.IGNORECASE)
+# Wording that ties a number of minutes to the school commute
+_SCHOOL_WORDS = re.compile(
+    r"\b(?:school|campus|uni|university|college|class|classes|lectures?|commute|commuting)\b", re.IGNORECASE
+)
+# Minutes are read in their own clause only ("NUS, 1000-1500, 5 min walk to MRT")
+_CLAUSE_BREAK = re.compile(r"[,.;!?\n]")
+_CONTEXT_CHARS = 30
+_NEAR_MRT = re.compile(
+    r"\b(?:near|close to|next to|beside|walking distance (?:to|from)|nearby)\s+(?:an?\s+|the\s+)?mrt\b"
+    r"|\bmrt\s+nearby\b",
+    re.IGNORECASE,
+)
+
+
+class AliasTrie:
+    '''Token-level trie over knowledge-base aliases with longest-match scanning'''
+
+    def __init__(self):
+        self._root: dict = {}
+
+    def add(self, alias: str, value: Tuple[str, str]) -> None:
+        node = self._root
+        for token in _tokenize(alias.lower()):
+            node = node.setdefault(token, {})
+        node.setdefault(None, set()).add(value)
+
+    def scan(self, tokens: List[str], raw_tokens: List[str]) -> List[Tuple[str, str]]:
+        matches = []
+        i = 0
+        while i < len(tokens):
+            node = self._root
+            best: Optional[Tuple[int, set]] = None
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if None in node:
+                    best = (j, node[None])
+
+            if best is None:
+                i += 1
+                continue
+
+            end, values = best
+            if end - i == 1 and tokens[i] in _CASE_SENSITIVE_ALIASES and not raw_tokens[i].isupper():
+                i += 1
+                continue
+
+            matches.extend(values)
+            i = end
+        return matches
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text)
+
+
+def _build_trie() -> AliasTrie:
+    trie = AliasTrie()
+    for school_id, entry in SCHOOL_MAPPING.items():
+        for alias in entry["aliases"]:
+            trie.add(alias, ("school", school_id))
+    for district_id, entry in DISTRICT_MAPPING.items():
+        for alias in entry["aliases"]:
+            trie.add(alias, ("district", district_id))
+    for entry in FLAT_TYPE_MAPPING.values():
+        for alias in entry["aliases"]:
+            trie.add(alias, ("flat", entry["name"]))
+    return trie
+
+
+_ALIAS_TRIE = _build_trie()
+
+
+def _parse_amount(raw: str) -> Optional[int]:
+    text = raw.replace("$", "").replace(",", "").replace(" ", "").lower()
+    multiplier = 1
+    if text.endswith("k"):
+        multiplier = 1000
+        text = text[:-1]
+    try:
+        value = int(float(text) * multiplier)
+    except ValueError:
+        return None
+    if not (MIN_RENT_VALUE <= value <= MAX_RENT_VALUE):
+        return None
+    return value
+
+
+def _extract_rent(text: str) -> Tuple[Optional[int], Optional[int], bool]:
+    '''Returns (min_rent, max_rent, ambiguous)'''
+    for match in _RANGE.finditer(text):
+        low, high = _parse_amount(match.group(1)), _parse_amount(match.group(2))
+        if low is not None and high is not None and low <= high:
+            return low, high, False
+
+    upper = [v for v in (_parse_amount(m.group(1)) for m in _UPPER_BOUND.finditer(text)) if v is not None]
+    # "no more than 2000" must not also count as the lower bound "more than 2000"
+    lower_text = _UPPER_BOUND.sub(" ", text)
+    lower = [v for v in (_parse_amount(m.group(1)) for m in _LOWER_BOUND.finditer(lower_text)) if v is not None]
+    if upper or lower:
+        if len(set(upper)) > 1 or len(set(lower)) > 1:
+            return None, None, True
+        min_rent = lower[0] if lower else None
+        max_rent = upper[0] if upper else None
+        if min_rent is not None and max_rent is not None and min_rent > max_rent:
+            return None, None, True
+        return min_rent, max_rent, False
+
+    approx = [v for v in (_parse_amount(m.group(1)) for m in _APPROX.finditer(text)) if v is not None]
+    if not approx:
+        approx = [v for v in (_parse_amount(m.group(1)) for m in _SINGLE.finditer(text)) if v is not None]
+    if len(set(approx)) == 1:
+        centre = approx[0]
+        return max(centre - AROUND_RENT_MARGIN, 0), centre + AROUND_RENT_MARGIN, False
+    if approx:
+        return None, None, True
+    return None, None, False
+
+
+def _extract_mrt_distance(text: str) -> Optional[int]:
+    for match in _DISTANCE.finditer(text):
+        window = text[match.end():match.end() + 25]
+        if _MRT.search(window) or _MRT.search(text[max(match.start() - 25, 0):match.start()]):
+            value = float(match.group(1))
+            if match.group(2).lower().startswith("k"):
+                value *= 1000
+            return int(value)
+    if _NEAR_MRT.search(text):
+        return NEAR_MRT_DISTANCE
+    return None
+
+
+def _mentions_school(text: str) -> bool:
+    raw_tokens = _tokenize(text)
+    matches = _ALIAS_TRIE.scan([t.lower() for t in raw_tokens], raw_tokens)
+    return any(kind == "school" for kind, _ in matches) or _SCHOOL_WORDS.search(text) is not None
+
+
+def _classify_minutes(text: str, match: re.Match) -> str:
+    '''What "N min" refers to: "school", "mrt_walk" or "unclear" (left to the LLM)'''
+    after = _CLAUSE_BREAK.split(text[match.end():match.end() + _CONTEXT_CHARS], maxsplit=1)[0]
+    before = _CLAUSE_BREAK.split(text[max(match.start() - _CONTEXT_CHARS, 0):match.start()])[-1]
+    clause = f"{before} {after}"
+
+    if _MRT.search(clause):
+        # "5 min walk to MRT"; "20 min to Clementi MRT" could be a ride or a walk
+        return "mrt_walk" if _WALK.search(clause) else "unclear"
+    if _WALK.search(clause):
+        return "unclear"
+    if _mentions_school(after) or _mentions_school(before):
+        return "school"
+    return "unclear"
+
+
+def parse_description(description: str) -> Tuple[Dict, bool]:
+    '''
+    Best-effort extraction of every field the rules can see.
+    Returns (fields, ambiguous); ambiguous fields are left out.
+    '''
+    text = description.strip()
+    extracted: Dict = {}
+
+    raw_tokens = _tokenize(text)
+    tokens = [t.lower() for t in raw_tokens]
+    matches = _ALIAS_TRIE.scan(tokens, raw_tokens)
+
+    school_ids = {v for kind, v in matches if kind == "school"}
+    district_ids = {v for kind, v in matches if kind == "district"}
+    flat_types = list(dict.fromkeys(v for kind, v in matches if kind == "flat"))
+
+    # Strip commute/distance/count figures so they are not mistaken for rent
+    rent_text = _QUANTITY.sub(" ", _DISTANCE.sub(" ", _COMMUTE.sub(" ", text)))
+    min_rent, max_rent, rent_ambiguous = _extract_rent(rent_text)
+
+    commute, mrt_distances, unclear_minutes = set(), set(), False
+    for match in _COMMUTE.finditer(text):
+        kind = _classify_minutes(text, match)
+        if kind == "school":
+            commute.add(int(match.group(1)))
+        elif kind == "mrt_walk":
+            mrt_distances.add(int(match.group(1)) * WALK_METERS_PER_MINUTE)
+        else:
+            unclear_minutes = True
+
+    stated_mrt_distance = _extract_mrt_distance(text)
+    if stated_mrt_distance is not None:
+        mrt_distances.add(stated_mrt_distance)
+    max_mrt_distance = next(iter(mrt_distances)) if len(mrt_distances) == 1 else None
+
+    if min_rent is not None:
+        extracted["min_monthly_rent"] = min_rent
+    if max_rent is not None:
+        extracted["max_monthly_rent"] = max_rent
+    if len(school_ids) == 1:
+        extracted["school_id"] = int(next(iter(school_ids)))
+    if len(district_ids) == 1:
+        extracted["target_district_id"] = int(next(iter(district_ids)))
+    if len(commute) == 1:
+        extracted["max_school_limit"] = next(iter(commute))
+    if flat_types:
+        extracted["flat_type_preference"] = flat_types
+    if max_mrt_distance is not None:
+        extracted["max_mrt_distance"] = max_mrt_distance
+
+    ambiguous = (
+        rent_ambiguous or unclear_minutes or _QUANTITY.search(text) is not None or len(school_ids) > 1 or len(district_ids) > 1
+        or len(commute) > 1 or len(mrt_distances) > 1
+    )
+    return extracted, ambiguous
+
+
+def try_extract(description: Optional[str]) -> Optional[Dict]:
+    '''
+    Rule-based counterpart of the EnquiryExtractionTool call.
+    Returns the filtered extraction dict when every required field is found
+    unambiguously, otherwise None so the caller can fall back to the LLM.
+    '''
+    if not description or not description.strip():
+        return None
+    if _IMPORTANCE_CUES.search(description):
+        return None
+    if _NEGATION_CUES.search(_RENT_BOUND_NEGATIONS.sub(" ", description)):
+        return None
+
+    extracted, ambiguous = parse_description(description)
+    if ambiguous or any(field not in extracted for field in REQUIRED_FIELDS):
+        return None
+    return extracted
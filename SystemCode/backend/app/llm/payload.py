@@ -0,0 +1,130 @@
+from typing import Dict, List, Optional
+
+from app.models import EnquiryForm, Property
+from .knowledge_base import SCHOOL_SHORT_NAMES, DISTRICT_NAMES
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.encoding_for_model("gpt-4-turbo")
+except Exception:  # optional dependency
+    _ENCODING = None
+
+
+PROPERTY_TABLE_COLUMNS = [
+    "id", "name", "type", "district", "price", "bed/bath", "sqft",
+    "commute_min", "mrt_m", "cost", "commute", "neighbourhood", "facilities",
+]
+
+
+def estimate_tokens(text: str) -> int:
+    '''Exact count with tiktoken when installed, otherwise the ~4 chars/token heuristic'''
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _facilities(prop: Property, limit: int = 4) -> str:
+    items = [
+        (name, distance)
+        for facility in (prop.public_facilities or [])
+        for name, distance in facility.items()
+    ]
+    return ",".join(f"{name} {distance}m" for name, distance in items[:limit])
+
+
+def _score(value: Optional[float]) -> str:
+    return "" if value is None else f"{value:.2f}"
+
+
+def build_user_query_payload(enquiry: EnquiryForm, *, include_budget: bool = True) -> str:
+    '''
+    Decision-relevant enquiry fields in a dense, stable key=value form.
+    include_budget=False leaves the budget out (precomputed reasons are shared by a whole budget band)
+    '''
+    parts = [f"budget=${enquiry.min_monthly_rent}-{enquiry.max_monthly_rent}"] if include_budget else []
+    parts.append(f"school={SCHOOL_SHORT_NAMES.get(enquiry.school_id, enquiry.school_id)}")
+    if enquiry.max_school_limit is not None:
+        parts.append(f"max_commute={enquiry.max_school_limit}min")
+    if enquiry.max_mrt_distance is not None:
+        parts.append(f"max_mrt={enquiry.max_mrt_distance}m")
+    if enquiry.flat_type_preference:
+        parts.append(f"types={','.join(enquiry.flat_type_preference)}")
+    # a bare id means nothing to the model; unknown ids are left out
+    if enquiry.target_district_id in DISTRICT_NAMES:
+        parts.append(f"district={DISTRICT_NAMES[enquiry.target_district_id]}")
+    parts.append(
+        f"importance_rent={enquiry.importance_rent};"
+        f"importance_location={enquiry.importance_location};"
+        f"importance_facility={enquiry.importance_facility}"
+    )
+    return ";".join(parts)
+
+
+def _property_row(prop: Property) -> List[str]:
+    return [
+        str(prop.property_id),
+        prop.name or "",
+        prop.facility_type or "",
+        prop.district or "",
+        f"${prop.price}" if prop.price else "",
+        f"{prop.beds or '?'}/{prop.baths or '?'}",
+        "" if prop.area is None else str(prop.area),
+        "" if prop.time_to_school is None else str(prop.time_to_school),
+        "" if prop.distance_to_mrt is None else str(prop.distance_to_mrt),
+        _score(prop.costScore),
+        _score(prop.commuteScore),
+        _score(prop.neighborhoodScore),
+        _facilities(prop),
+    ]
+
+
+def build_property_payload(prop: Property) -> str:
+    '''Single property as key=value pairs (scores are 0-1, higher is better)'''
+    return ";".join(
+        f"{column}={value}" for column, value in zip(PROPERTY_TABLE_COLUMNS, _property_row(prop)) if value
+    )
+
+
+def build_property_table(properties: List[Property]) -> str:
+    '''Pipe-separated table, one row per property (scores are 0-1, higher is better)'''
+    rows = ["|".join(PROPERTY_TABLE_COLUMNS)]
+    rows.extend("|".join(_property_row(prop)) for prop in properties)
+    return "\n".join(rows)
+
+
+def prompt_size_report(prompts: Dict[str, str]) -> Dict[str, Dict[str, int]]:
+    return {name: {"chars": len(text), "tokens": estimate_tokens(text)} for name, text in prompts.items()}
+
+
+if __name__ == "__main__":
+    # Compare legacy (indent=2 model dumps) and compact payload sizes for a sample request
+    import json
+    from .prompt import EXTRACTION_PROMPT, EXPLANATION_PROMPT, BATCH_EXPLANATION_PROMPT, EXPLANATION_GUIDE
+
+    enquiry = EnquiryForm(
+        device_id="sample-device", min_monthly_rent=1000, max_monthly_rent=3000, school_id=3,
+        max_school_limit=60, flat_type_preference=["HDB", "Condo", "Apartment"], max_mrt_distance=1000,
+        importance_rent=5, importance_location=4, importance_facility=3,
+    )
+    prop = Property(
+        property_id=1024, latitude=1.3521, longitude=103.8198,
+        img_src="https://storage.googleapis.com/irrs-images/housing_1024.jpg",
+        name="Blk 123 Clementi Ave 3", district="Clementi", price="2400", beds=2, baths=1, area=700,
+        build_time="1998", location="123 Clementi Ave 3", time_to_school=35, distance_to_mrt=420,
+        public_facilities=[{"Clementi Park": "310"}, {"Clementi Hawker Centre": "180"}, {"FairPrice Clementi": "250"}],
+        facility_type="HDB", costScore=0.62, commuteScore=0.71, neighborhoodScore=0.55,
+    )
+
+    guide_tokens = estimate_tokens(EXPLANATION_GUIDE)
+    report = prompt_size_report({
+        "extraction": EXTRACTION_PROMPT,
+        "explanation_legacy": EXPLANATION_PROMPT.format(
+            user_query=enquiry.model_dump_json(indent=2), property_data=prop.model_dump_json(indent=2)),
+        "explanation_compact": EXPLANATION_PROMPT.format(
+            user_query=build_user_query_payload(enquiry), property_data=build_property_payload(prop)),
+        "explanation_batch_k3": BATCH_EXPLANATION_PROMPT.format(
+            user_query=build_user_query_payload(enquiry), property_table=build_property_table([prop] * 3)),
+    })
+    for name, sizes in report.items():
+        sizes["payload_tokens"] = sizes["tokens"] - (0 if name == "extraction" else guide_tokens)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,171 @@
+# app/llm/precompute.py
+# Offline job: pre-generate recommand_reason for the most frequent enquiry profiles.
+# Run:  python -m app.llm.precompute --top 50 --days 30 --k 5 --rps 2
+#
+# Profiles are (school, importance weights, band of the max rent). Reasons are written
+# from a budget-free user query, so one reason holds for every enquiry in the band;
+# the request path only serves it for properties within that enquiry's own limits
+# (anything else, e.g. a budget or commute miss, is explained live).
+#
+#   PRECOMPUTED_EXPLANATIONS_ENABLED   look up precomputed reasons on the request path (default true)
+import os
+import time
+import asyncio
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlmodel import select
+
+from app.models import EnquiryForm, EnquiryEntity, Property
+
+
+PRECOMPUTED_EXPLANATIONS_ENABLED = os.getenv("PRECOMPUTED_EXPLANATIONS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+BUDGET_BAND_STEP = 500
+
+# (school_id, weight_profile, budget_band)
+Profile = Tuple[int, str, str]
+
+
+def explanation_profile(enquiry: EnquiryForm) -> Profile:
+    '''Lookup key shared by the batch job and the request path'''
+    low = enquiry.max_monthly_rent // BUDGET_BAND_STEP * BUDGET_BAND_STEP
+    weights = f"{enquiry.importance_rent}-{enquiry.importance_location}-{enquiry.importance_facility}"
+    return enquiry.school_id, weights, f"{low}-{low + BUDGET_BAND_STEP}"
+
+
+def representative_enquiry(profile: Profile) -> EnquiryForm:
+    '''The enquiry the batch job ranks for: the whole band, no other limits'''
+    school_id, weights, band = profile
+    rent, location, facility = (int(w) for w in weights.split("-"))
+    low, high = (int(b) for b in band.split("-"))
+    return EnquiryForm(
+        min_monthly_rent=low,
+        max_monthly_rent=high,
+        school_id=school_id,
+        importance_rent=rent,
+        importance_location=location,
+        importance_facility=facility,
+    )
+
+
+def _price(prop: Property) -> Optional[float]:
+    try:
+        return float(str(prop.price).replace("$", "").replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def fits_enquiry(enquiry: EnquiryForm, prop: Property) -> bool:
+    '''
+    A precomputed reason never mentions the budget or limits, so it is only served when
+    the property meets them; otherwise the miss is the point and is explained live
+    '''
+    price = _price(prop)
+    if price is None or not enquiry.min_monthly_rent <= price <= enquiry.max_monthly_rent:
+        return False
+    if enquiry.max_school_limit is not None and (prop.time_to_school is None or prop.time_to_school > enquiry.max_school_limit):
+        return False
+    if enquiry.max_mrt_distance is not None and (prop.distance_to_mrt is None or prop.distance_to_mrt > enquiry.max_mrt_distance):
+        return False
+    return True
+
+
+class RateLimiter:
+    '''Spaces calls at least 1/rate seconds apart; pass `wait` as the explanation throttle'''
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_slot > now:
+                await asyncio.sleep(self._next_slot - now)
+            self._next_slot = max(now, self._next_slot) + self.interval
+
+
+async def mine_frequent_profiles(*, db, days: int, top: int) -> List[Tuple[Profile, int]]:
+    since = datetime.utcnow() - timedelta(days=days)
+    result = await db.exec(select(EnquiryEntity).where(EnquiryEntity.create_time >= since))
+    counts = Counter(explanation_profile(entity) for entity in result.all())
+    return counts.most_common(top)
+
+
+async def precompute_profile(*, db, client, profile: Profile, k: int, limiter: RateLimiter, refresh: bool = False) -> int:
+    from app.database import crud as db_service
+    from app.services import recommendation_service as rec_service
+    from app.llm import service as llm_service
+    from app.llm.payload import build_user_query_payload
+
+    enquiry = representative_enquiry(profile)
+    properties = await rec_service.fetchRecommendProperties(enquiry)
+    top_k = rec_service.multi_objective_optimization_ranking(enquiry=enquiry, propertyList=properties, top_k=k)
+    if not top_k:
+        return 0
+
+    existing = {} if refresh else await db_service.get_precomputed_explanations(
+        db=db, profile=profile, property_ids=[p.property_id for p in top_k]
+    )
+    # refresh: regenerate every row, the upsert overwrites the old reason
+    missing = [p for p in top_k if p.property_id not in existing]
+    if not missing:
+        return 0
+
+    # throttled per LLM call (batched call and any per-property follow-ups); only LLM-written
+    # reasons come back, so an outage leaves rows missing instead of storing templates
+    reasons = await llm_service.refine_explanations(
+        enquiry=enquiry,
+        properties=missing,
+        client=client,
+        user_query=build_user_query_payload(enquiry, include_budget=False),
+        throttle=limiter.wait
+    )
+    return await db_service.save_precomputed_explanations(db=db, profile=profile, reasons=reasons)
+
+
+async def run(*, top: int, days: int, k: int, rps: float, refresh: bool = False) -> None:
+    from app.config import get_settings
+    from app.dependencies import async_session_maker
+    from app.database.config import create_db_and_tables
+    from app.llm.gateway import build_llm_gateway
+
+    settings = get_settings()
+    if not settings.OPENAI_API_KEY:
+        print("OPENAI_API_KEY is not set; nothing to precompute.")
+        return
+
+    await create_db_and_tables()
+    client = build_llm_gateway(settings)
+    limiter = RateLimiter(rps)
+    try:
+        async with async_session_maker() as db:
+            profiles = await mine_frequent_profiles(db=db, days=days, top=top)
+            print(f"Found {len(profiles)} frequent profiles in the last {days} days.")
+
+            for profile, count in profiles:
+                saved = await precompute_profile(
+                    db=db, client=client, profile=profile, k=k, limiter=limiter, refresh=refresh
+                )
+                print(f"{profile} (seen {count}x): saved {saved} explanations")
+    finally:
+        await client.close()
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-generate explanations for frequent enquiry profiles.")
+    parser.add_argument("--top", type=int, default=50, help="number of most frequent profiles")
+    parser.add_argument("--days", type=int, default=30, help="enquiry history window")
+    parser.add_argument("--k", type=int, default=5, help="top properties per profile")
+    parser.add_argument("--rps", type=float, default=1.0, help="max LLM calls per second")
+    parser.add_argument("--refresh", action="store_true", help="regenerate existing explanations")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    asyncio.run(run(top=args.top, days=args.days, k=args.k, rps=args.rps, refresh=args.refresh))
@@ -1,4 +1,10 @@
-from .knowledge_base import SCHOOL_MAPPING_CONTEXT, DISTRICT_MAPPING_CONTEXT, FLAT_TYPE_CONTEXT
+from .knowledge_base import SCHOOL_MAPPING, DISTRICT_MAPPING, FLAT_TYPE_MAPPING, compact_mapping_context
+
+
+# "id=name (aliases)" lines instead of indented JSON to keep the system prompt small
+SCHOOL_MAPPING_COMPACT = compact_mapping_context(SCHOOL_MAPPING)
+DISTRICT_MAPPING_COMPACT = compact_mapping_context(DISTRICT_MAPPING)
+FLAT_TYPE_COMPACT = compact_mapping_context(FLAT_TYPE_MAPPING)
 
 
 # For intent identification
@@ -7,16 +13,16 @@ EXTRACTION_PROMPT = f"""
     Your task is to accurately extract user rental preferences from their natural language description.
     You must use the provided "EnquiryExtractionTool" tool to format your output.
     
-    Please use the following "Knowledge Base" (in JSON format) to map user inputs:
+    Please use the following "Knowledge Base" (one "id=name (aliases)" per line, case-insensitive) to map user inputs:
 
-    --- School Mappings ---
-    {SCHOOL_MAPPING_CONTEXT}
+--- School Mappings ---
+{SCHOOL_MAPPING_COMPACT}
 
-    --- District Mappings ---
-    {DISTRICT_MAPPING_CONTEXT}
+--- District Mappings ---
+{DISTRICT_MAPPING_COMPACT}
 
-    --- Flat Type Mappings ---
-    {FLAT_TYPE_CONTEXT}
+--- Flat Type Mappings (fill in the name, not the id) ---
+{FLAT_TYPE_COMPACT}
     
     Important Rules:
     1.  **Accurate ID Mapping**: When a user mentions a school or district (e.g., "NUS" or "Clementi"), you must fill in the corresponding *ID* in the `school_id` or `target_district_id` field.
@@ -37,8 +43,8 @@ EXTRACTION_PROMPT = f"""
     """
 
 
-# For exlanation generation
-EXPLANATION_PROMPT = """
+# Shared by single and batched explanation generation
+EXPLANATION_GUIDE = """
 ---
 ### 1. Your Persona
 You are a friendly, enthusiastic, and savvy Singaporean local rental expert. Your goal is to write a *brief, personalized, and honest* summary.
@@ -76,7 +82,11 @@ You will receive `user_query` and `property_data`. Your mission is to:
 
 3.  **BE DIVERSE:**
     * Do not start every recommendation with the same phrase.
+"""
+
 
+# For exlanation generation
+EXPLANATION_PROMPT = EXPLANATION_GUIDE + """
 ---
 ### 5. Your Inputs
 
@@ -89,3 +99,23 @@ You will receive `user_query` and `property_data`. Your mission is to:
 
 Generate the natural language explanation now:
 """
+
+
+# For batched explanation generation (one call for all top-k properties)
+BATCH_EXPLANATION_PROMPT = EXPLANATION_GUIDE + """
+---
+### 5. Your Inputs
+
+You will receive the `user_query` once, followed by a `property_table` with one row per property.
+Apply the rules above to **each row independently** and write one explanation per property.
+You must use the provided "ExplanationBatchTool" tool and return exactly one entry for every `property_id` in the table.
+
+**User Query:**
+{user_query}
+
+**Property Table:**
+{property_table}
+---
+
+Generate the natural language explanations now:
+"""
@@ -1,12 +1,32 @@
-from typing import List
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 import json
 import asyncio
 from fastapi import HTTPException, status
 import openai
+from pydantic import ValidationError
 
 from app.models import EnquiryForm, EnquiryNL, Property
-from .tools import EnquiryExtractionTool
-from .prompt import EXTRACTION_PROMPT, EXPLANATION_PROMPT
+from .tools import EnquiryExtractionTool, ExplanationBatchTool
+from . import local_parser
+from .extraction_cache import extraction_cache, normalize_description
+from .usage import usage_recorder
+from .template_explanation import generate_template_explanation
+from .payload import build_user_query_payload, build_property_payload, build_property_table
+from .prompt import EXTRACTION_PROMPT, EXPLANATION_PROMPT, BATCH_EXPLANATION_PROMPT
+from app.log import get_logger
+
+
+logger = get_logger("llm.service")
+
+
+# "batch": one tool call for all top-k properties; "per_property": one call each;
+# "template": deterministic local reasons only, no LLM call
+EXPLANATION_MODE = os.getenv("EXPLANATION_MODE", "batch")
+
+# awaited before every explanation call (e.g. a rate limiter)
+Throttle = Optional[Callable[[], Awaitable[None]]]
 
 
 async def convert_natural_language_to_form(
@@ -15,6 +35,31 @@ async def convert_natural_language_to_form(
         client: openai.AsyncOpenAI
 ) -> dict:
     
+    # Fast path: simple descriptions are resolved locally without an LLM round-trip
+    local_data = local_parser.try_extract(enquiry.requirement_description)
+    if local_data is not None:
+        if enquiry.device_id:
+            local_data['device_id'] = enquiry.device_id
+        return local_data
+
+    # Cached / coalesced LLM extraction, keyed on the normalized description
+    cache_key = normalize_description(enquiry.requirement_description or "")
+    filtered_data = await extraction_cache.get_or_load(
+        cache_key,
+        lambda: _extract_with_llm(description=enquiry.requirement_description, client=client)
+    )
+    if filtered_data and enquiry.device_id:
+        # name must same as EnquiryForm.device_id
+        filtered_data['device_id'] = enquiry.device_id
+    return filtered_data
+
+
+async def _extract_with_llm(
+        *,
+        description: str,
+        client: openai.AsyncOpenAI
+) -> dict:
+
     system_prompt = EXTRACTION_PROMPT
 
     try:
@@ -22,7 +67,7 @@ async def convert_natural_language_to_form(
             model="gpt-4-turbo",
             messages=[
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": enquiry.requirement_description}
+                {"role": "user", "content": description}
             ],
             tools=[
                 {
@@ -43,17 +88,13 @@ async def convert_natural_language_to_form(
         tool_call = completion.choices[0].message.tool_calls[0]
         if tool_call.function.name == "EnquiryExtractionTool":
             extracted_data = json.loads(tool_call.function.arguments)
-            filtered_data = {k: v for k, v in extracted_data.items() if v is not None}
-            if enquiry.device_id:
-                # name must same as EnquiryForm.device_id
-                filtered_data['device_id'] = enquiry.device_id
-            return filtered_data
+            return {k: v for k, v in extracted_data.items() if v is not None}
         else:
             return {}
 
     # API Exception
     except openai.OpenAIError as e:
-        print(f"OpenAI API error: {e}")
+        logger.error("OpenAI API error during extraction: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
             detail="Error communicating with AI model."
@@ -62,7 +103,7 @@ async def convert_natural_language_to_form(
     
     # Parse Exception
     except (json.JSONDecodeError, IndexError, AttributeError) as e:
-        print(f"LLM parsing error: {e}")
+        logger.warning("LLM extraction parsing error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Could not understand or parse the requirement description. Please try rephrasing your request."
@@ -73,16 +114,19 @@ async def _generate_explanation_for_property(
     *,
     enquiry: EnquiryForm,
     prop: Property,
-    client: openai.AsyncOpenAI
-) -> str:
-    user_query_json = enquiry.model_dump_json(indent=2)
-    property_data_json = prop.model_dump_json(indent=2)
-    
+    client: openai.AsyncOpenAI,
+    user_query: str,
+    throttle: Throttle = None
+) -> Optional[str]:
+    '''None when the API call fails'''
+    if throttle is not None:
+        await throttle()
     system_prompt = EXPLANATION_PROMPT.format(
-        user_query=user_query_json,
-        property_data=property_data_json
+        user_query=user_query,
+        property_data=build_property_payload(prop)
     )
     
+    start_time = time.perf_counter()
     try:
         completion = await client.chat.completions.create(
             model="gpt-4-turbo",
@@ -92,13 +136,119 @@ async def _generate_explanation_for_property(
             temperature=0.7,
             max_tokens=60
         )
+        usage_recorder.record("explanation_per_property", latency=time.perf_counter() - start_time, usage=completion.usage)
         explanation = completion.choices[0].message.content
         return explanation.strip()
 
     except openai.OpenAIError as e:
-        print(f"OpenAI API error during explanation: {e}")
-        fallback_name = prop.name or f"Property ID {prop.property_id}"
-        return f"This property ({fallback_name}) is highly recommended based on its strong match to your overall preferences."
+        usage_recorder.record("explanation_per_property", latency=time.perf_counter() - start_time, error=True)
+        logger.warning("OpenAI API error during explanation: %s", e, extra={"property_id": prop.property_id})
+        return None
+
+
+async def _generate_explanations_batched(
+    *,
+    enquiry: EnquiryForm,
+    properties: List[Property],
+    client: openai.AsyncOpenAI,
+    user_query: str,
+    throttle: Throttle = None
+) -> Optional[Dict[int, str]]:
+    '''One tool call for all properties; returns None when the output cannot be parsed, raises API errors'''
+    if throttle is not None:
+        await throttle()
+    system_prompt = BATCH_EXPLANATION_PROMPT.format(
+        user_query=user_query,
+        property_table=build_property_table(properties)
+    )
+
+    start_time = time.perf_counter()
+    try:
+        completion = await client.chat.completions.create(
+            model="gpt-4-turbo",
+            messages=[
+                {"role": "system", "content": system_prompt}
+            ],
+            tools=[
+                {
+                    "type": "function",
+                    "function": {
+                        "name": "ExplanationBatchTool",
+                        "description": "Return one recommendation reason per property_id.",
+                        "parameters": ExplanationBatchTool.model_json_schema()
+                    }
+                }
+            ],
+            tool_choice={
+                "type": "function",
+                "function": {"name": "ExplanationBatchTool"}
+            },
+            temperature=0.7,
+            max_tokens=80 * len(properties)
+        )
+        usage_recorder.record("explanation_batch", latency=time.perf_counter() - start_time, usage=completion.usage)
+
+        tool_call = completion.choices[0].message.tool_calls[0]
+        batch = ExplanationBatchTool.model_validate_json(tool_call.function.arguments)
+        return {item.property_id: item.reason.strip() for item in batch.explanations if item.reason.strip()}
+
+    except openai.OpenAIError as e:
+        usage_recorder.record("explanation_batch", latency=time.perf_counter() - start_time, error=True)
+        logger.warning("OpenAI API error during batched explanation: %s", e)
+        raise
+
+    except (ValidationError, IndexError, AttributeError, TypeError) as e:
+        logger.warning("batched explanation parsing error, falling back to per-property calls: %s", e)
+        return None
+
+
+async def _generate_llm_explanations(
+    *,
+    enquiry: EnquiryForm,
+    properties: List[Property],
+    client: openai.AsyncOpenAI,
+    mode: str,
+    user_query: Optional[str] = None,
+    throttle: Throttle = None
+) -> Tuple[Dict[int, str], List[Property]]:
+    '''Returns (LLM-written reasons by property_id, properties the LLM could not answer)'''
+    user_query = user_query or build_user_query_payload(enquiry)
+    explanations: Dict[int, str] = {}
+    if mode == "batch":
+        try:
+            explanations = await _generate_explanations_batched(
+                enquiry=enquiry,
+                properties=properties,
+                client=client,
+                user_query=user_query,
+                throttle=throttle
+            ) or {}
+        except openai.OpenAIError:
+            # upstream is failing (or the breaker is open): no per-property follow-up calls
+            return {}, list(properties)
+
+    # per-property mode, and fallback for rows the batched call did not return
+    remaining = [prop for prop in properties if prop.property_id not in explanations]
+    explanation_tasks = []
+    for prop in remaining:
+        task = _generate_explanation_for_property(
+            enquiry=enquiry,
+            prop=prop,
+            client=client,
+            user_query=user_query,
+            throttle=throttle
+        )
+        explanation_tasks.append(task)
+
+    generate_explanations = await asyncio.gather(*explanation_tasks)
+    failed = []
+    for prop, explanation in zip(remaining, generate_explanations):
+        if explanation is None:
+            failed.append(prop)
+        else:
+            explanations[prop.property_id] = explanation
+
+    return explanations, failed
 
 
 async def generate_explanation_for_top_properties(
@@ -106,28 +256,70 @@ async def generate_explanation_for_top_properties(
     enquiry: EnquiryForm,
     ranked_properties: List[Property],
     client: openai.AsyncOpenAI,
-    k: int = 10
+    k: int = 10,
+    mode: Optional[str] = None,
+    precomputed: Optional[Dict[int, str]] = None
 ) -> List[Property]:
     k = min(k, len(ranked_properties))
     top_k_properties = ranked_properties[:k]
 
     if not top_k_properties:
         return []
-    
-    explanation_tasks = []
-    for prop in top_k_properties:
-        task = _generate_explanation_for_property(
+
+    mode = mode or EXPLANATION_MODE
+    if client is None:
+        mode = "template"
+
+    start_time = time.perf_counter()
+    # offline pre-generated reasons (see llm/precompute.py) need no call at all
+    explanations = {pid: reason for pid, reason in (precomputed or {}).items()}
+    remaining = [prop for prop in top_k_properties if prop.property_id not in explanations]
+
+    if mode == "template":
+        explanations.update({prop.property_id: generate_template_explanation(enquiry, prop) for prop in remaining})
+    elif remaining:
+        generated, failed = await _generate_llm_explanations(
             enquiry=enquiry,
-            prop=prop,
-            client=client
+            properties=remaining,
+            client=client,
+            mode=mode
         )
-        explanation_tasks.append(task)
+        explanations.update(generated)
+        explanations.update({prop.property_id: generate_template_explanation(enquiry, prop) for prop in failed})
+    usage_recorder.record(f"top_k_request:{mode}", latency=time.perf_counter() - start_time)
 
-    generate_explanations = await asyncio.gather(*explanation_tasks)
-
-    for i, prop in enumerate(top_k_properties):
-        print("generation success!")
-        prop.recommand_reason = generate_explanations[i]
-        print(prop.model_dump_json(indent=2))
+    for prop in top_k_properties:
+        prop.recommand_reason = explanations[prop.property_id]
+    logger.debug("generated explanations", extra={"count": len(top_k_properties), "mode": mode})
 
     return top_k_properties
+
+
+async def refine_explanations(
+    *,
+    enquiry: EnquiryForm,
+    properties: List[Property],
+    client: openai.AsyncOpenAI,
+    user_query: Optional[str] = None,
+    throttle: Throttle = None
+) -> Dict[int, str]:
+    '''
+    LLM upgrade of template reasons (llm_refine, precompute job).
+    Only reasons the LLM actually wrote are returned; rows it could not answer are left out.
+    user_query overrides the prompt's enquiry payload (default: build_user_query_payload(enquiry)).
+    '''
+    if client is None or not properties:
+        return {}
+
+    mode = EXPLANATION_MODE if EXPLANATION_MODE != "template" else "batch"
+    explanations, failed = await _generate_llm_explanations(
+        enquiry=enquiry,
+        properties=properties,
+        client=client,
+        mode=mode,
+        user_query=user_query,
+        throttle=throttle
+    )
+    if failed:
+        logger.warning("LLM explanations unavailable for some properties, left out", extra={"count": len(failed)})
+    return explanations
@@ -0,0 +1,115 @@
+from typing import List, Optional, Tuple
+
+from app.models import EnquiryForm, Property
+from .knowledge_base import SCHOOL_SHORT_NAMES
+
+
+# (importance, strength, is_win, phrase)
+Factor = Tuple[int, float, bool, str]
+
+_WIN_OPENERS = ["", "Great pick: ", "Worth a look: ", "Strong match: "]
+_MISS_OPENERS = ["Heads up: ", "Worth knowing: ", "One trade-off: "]
+
+def _parse_price(price: Optional[str]) -> Optional[float]:
+    if price is None:
+        return None
+    try:
+        return float(str(price).replace("$", "").replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _rent_factor(enquiry: EnquiryForm, prop: Property) -> Optional[Factor]:
+    price = _parse_price(prop.price)
+    if price is None:
+        return None
+
+    importance = enquiry.importance_rent
+    if price > enquiry.max_monthly_rent:
+        over = (price - enquiry.max_monthly_rent) / max(enquiry.max_monthly_rent, 1)
+        return (importance, 0.5 + over, False,
+                f"at ${price:,.0f} it is above your ${enquiry.max_monthly_rent:,} budget")
+    if price < enquiry.min_monthly_rent:
+        return (importance, 0.3, True,
+                f"at ${price:,.0f} it comes in below your ${enquiry.min_monthly_rent:,} minimum")
+
+    cost_score = prop.costScore or 0.0
+    if cost_score >= 0.7:
+        phrase = f"at ${price:,.0f} it is one of the cheapest options within your ${enquiry.max_monthly_rent:,} budget"
+    else:
+        phrase = f"at ${price:,.0f} it fits your ${enquiry.min_monthly_rent:,}-${enquiry.max_monthly_rent:,} budget"
+    return (importance, 0.2 + cost_score, True, phrase)
+
+
+def _location_factor(enquiry: EnquiryForm, prop: Property) -> Optional[Factor]:
+    minutes = prop.time_to_school
+    if minutes is None or minutes >= 9999:
+        return None
+
+    importance = enquiry.importance_location
+    school = SCHOOL_SHORT_NAMES.get(enquiry.school_id, "your school")
+    mrt = ""
+    if prop.distance_to_mrt is not None and (enquiry.max_mrt_distance is None or prop.distance_to_mrt <= enquiry.max_mrt_distance):
+        mrt = f" and {prop.distance_to_mrt}m from the MRT"
+
+    if enquiry.max_school_limit is not None and minutes > enquiry.max_school_limit:
+        over = (minutes - enquiry.max_school_limit) / max(enquiry.max_school_limit, 1)
+        return (importance, 0.5 + over, False,
+                f"the {minutes}-minute commute to {school} exceeds your {enquiry.max_school_limit}-minute limit")
+
+    commute_score = prop.commuteScore or 0.0
+    if commute_score < 0.3:
+        return (importance, 0.6 - commute_score, False,
+                f"the {minutes}-minute commute to {school} is on the longer side")
+    return (importance, 0.2 + commute_score, True, f"it is just {minutes} minutes from {school}{mrt}")
+
+
+def _facility_factor(enquiry: EnquiryForm, prop: Property) -> Optional[Factor]:
+    facilities = prop.public_facilities or []
+    importance = enquiry.importance_facility
+    neighborhood_score = prop.neighborhoodScore or 0.0
+
+    if not facilities:
+        return (importance, 0.6 - neighborhood_score, False, "there are few amenities within walking distance")
+
+    nearest_name, nearest_distance = min(
+        ((name, distance) for facility in facilities for name, distance in facility.items()),
+        key=lambda item: _parse_price(item[1]) or float("inf")
+    )
+    if neighborhood_score < 0.3:
+        return (importance, 0.6 - neighborhood_score, False,
+                "the neighbourhood scores lower on amenities and safety than the alternatives")
+    amenities = "amenity" if len(facilities) == 1 else "amenities"
+    return (importance, 0.2 + neighborhood_score, True,
+            f"it has {len(facilities)} {amenities} nearby, including {nearest_name} at {nearest_distance}m")
+
+
+def generate_template_explanation(enquiry: EnquiryForm, prop: Property) -> str:
+    '''
+    Deterministic one-sentence reason following EXPLANATION_PROMPT's rule:
+    lead with the win or miss on the highest-importance factor.
+    '''
+    factors: List[Factor] = [
+        f for f in (_rent_factor(enquiry, prop), _location_factor(enquiry, prop), _facility_factor(enquiry, prop))
+        if f is not None
+    ]
+    name = prop.name or f"Property {prop.property_id}"
+    if not factors:
+        return f"{name} is a balanced match for your overall preferences."
+
+    factors.sort(key=lambda f: (f[0], f[1]), reverse=True)
+    lead = factors[0]
+    seed = prop.property_id or 0
+
+    openers = _WIN_OPENERS if lead[2] else _MISS_OPENERS
+    opener = openers[seed % len(openers)]
+    sentence = f"{opener}{lead[3]}"
+
+    # back the lead point with the strongest remaining win, if any
+    second = next((f for f in factors[1:] if f[2]), None)
+    if second:
+        sentence += f", and {second[3]}" if lead[2] else f", though {second[3]}"
+
+    if not opener:
+        sentence = sentence[0].upper() + sentence[1:]
+    return sentence + "."
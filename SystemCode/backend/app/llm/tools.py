@@ -51,4 +51,15 @@ class EnquiryExtractionTool(BaseModel):
         description="User's importance level for 'surrounding facilities/safety' (1=not important, 3=moderate, 5=very important)."
     )
 
-    
\ No newline at end of file
+    
+
+
+class PropertyExplanation(BaseModel):
+    property_id: int = Field(description="The property_id of the row being explained.")
+    reason: str = Field(description="A single complete sentence (under 45 words) explaining the recommendation.")
+
+
+class ExplanationBatchTool(BaseModel):
+    explanations: List[PropertyExplanation] = Field(
+        description="Exactly one explanation per property_id in the property table."
+    )
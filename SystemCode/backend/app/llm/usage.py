@@ -0,0 +1,41 @@
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+
+class LLMUsageRecorder:
+    '''Accumulates token usage and latency per explanation/extraction mode'''
+
+    def __init__(self):
+        self._modes: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+            "calls": 0,
+            "errors": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency_seconds_total": 0.0,
+            "latency_seconds_max": 0.0,
+        })
+
+    def record(self, mode: str, *, latency: float, usage: Optional[Any] = None, error: bool = False) -> None:
+        stats = self._modes[mode]
+        stats["calls"] += 1
+        stats["latency_seconds_total"] += latency
+        stats["latency_seconds_max"] = max(stats["latency_seconds_max"], latency)
+        if error:
+            stats["errors"] += 1
+        if usage is not None:
+            stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            stats["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def stats(self) -> dict:
+        report = {}
+        for mode, stats in self._modes.items():
+            calls = stats["calls"] or 1
+            report[mode] = {
+                **stats,
+                "latency_seconds_avg": round(stats["latency_seconds_total"] / calls, 4),
+                "prompt_tokens_avg": round(stats["prompt_tokens"] / calls, 1),
+            }
+        return report
+
+
+usage_recorder = LLMUsageRecorder()
@@ -0,0 +1,110 @@
+# app/log.py
+# Non-blocking structured logging: loggers under "irrs" enqueue records, and a
+# QueueListener thread formats and writes them, so request handlers never block on stdout.
+#
+#   LOG_LEVEL                 DEBUG | INFO | WARNING ... (default INFO)
+#   LOG_FORMAT                json (one object per line, Cloud Logging "severity") | text
+#   LOG_PAYLOAD_SAMPLE_RATE   share of DEBUG payload dumps actually emitted (default 0.01)
+import os
+import sys
+import json
+import copy
+import queue
+import random
+import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Optional
+
+
+ROOT_LOGGER = "irrs"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    '''Logger under the "irrs" tree, e.g. get_logger("handlers.property")'''
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # merge args in the caller (they may change later) but leave formatting to the listener;
+        # tracebacks are rendered here because exc_info does not survive the queue
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging() -> None:
+    '''Attach the queue handler and start the writer thread (idempotent)'''
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_QueueHandler(log_queue))
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    '''Flush queued records and stop the writer thread'''
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Callable[[], Any], **fields: Any) -> None:
+    '''
+    Sampled DEBUG dump of a large payload. `payload` is only called (serialised)
+    when the record is actually emitted.
+    '''
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    logger.debug(message, extra={**fields, "payload": payload()})
@@ -0,0 +1,127 @@
+# app/loop_monitor.py
+# Event-loop health: a ticker task measures how late the loop wakes it up (scheduling lag),
+# which is what every request pays when a callback blocks the loop (folium rendering,
+# CPU-heavy ranking, synchronous I/O). Lag goes to irrs_event_loop_lag_seconds and to
+# /stats/event-loop as recent percentiles.
+#
+# In debug mode a watchdog thread also checks the ticker's heartbeat, and when the loop has
+# been stuck for longer than the threshold it logs the stack of whatever is running.
+#
+#   LOOP_MONITOR_ENABLED        default true
+#   LOOP_MONITOR_INTERVAL_MS    ticker period (default 250)
+#   LOOP_MONITOR_DEBUG          enable the blocking-call watchdog (default false)
+#   LOOP_BLOCK_THRESHOLD_MS     watchdog threshold (default 100)
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+from typing import Deque, Optional
+
+from app import metrics
+from app.log import get_logger
+
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() in ("1", "true", "yes")
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "250"))
+LOOP_MONITOR_DEBUG = os.getenv("LOOP_MONITOR_DEBUG", "false").lower() in ("1", "true", "yes")
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+
+_WINDOW = 1200  # recent lag samples kept for percentiles (5 minutes at the default period)
+
+logger = get_logger("loop_monitor")
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class LoopMonitor:
+    def __init__(self, *, interval: float, debug: bool = False, block_threshold: float = 0.1):
+        self.interval = interval
+        self.debug = debug
+        self.block_threshold = block_threshold
+        self.lags: Deque[float] = deque(maxlen=_WINDOW)
+        self.blocked_count = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        '''Call from inside the running loop (e.g. app lifespan)'''
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        if self.debug:
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="irrs-loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self.lags.append(lag)
+            metrics.observe_loop_lag(lag)
+
+    def _watch(self) -> None:
+        # poll several times per threshold; report each stall once
+        poll = min(self.block_threshold / 4, 0.05)
+        reported_beat = None
+        while not self._stop.wait(poll):
+            beat = self._heartbeat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.block_threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            self.blocked_count += 1
+            metrics.record_loop_blocked()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>"
+            logger.warning(
+                "event loop blocked for %.0f ms",
+                stalled * 1000,
+                extra={"blocked_ms": round(stalled * 1000, 1), "stack": stack},
+            )
+
+    def stats(self) -> dict:
+        ordered = sorted(self.lags)
+        report = {
+            "samples": len(ordered),
+            "interval_ms": self.interval * 1000,
+            "debug": self.debug,
+            "blocked_count": self.blocked_count,
+        }
+        if ordered:
+            report.update({
+                f"lag_ms_p{int(q * 100)}": round(_percentile(ordered, q) * 1000, 2) for q in (0.5, 0.9, 0.99)
+            })
+            report["lag_ms_max"] = round(ordered[-1] * 1000, 2)
+        return report
+
+
+loop_monitor = LoopMonitor(
+    interval=LOOP_MONITOR_INTERVAL_MS / 1000,
+    debug=LOOP_MONITOR_DEBUG,
+    block_threshold=LOOP_BLOCK_THRESHOLD_MS / 1000,
+)
@@ -0,0 +1,150 @@
+# app/metrics.py
+# Prometheus metrics, exposed on /metrics when METRICS_ENABLED=true and prometheus_client
+# is installed. Otherwise every helper below is a no-op and nothing is registered.
+import os
+import time
+from typing import Any, Optional
+
+try:
+    import prometheus_client
+except ImportError:  # optional dependency
+    prometheus_client = None
+
+
+ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes") and prometheus_client is not None
+
+# request stages: sub-millisecond ranking up to multi-second LLM calls
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+_SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+_LOOP_LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+if ENABLED:
+    STAGE_SECONDS = prometheus_client.Histogram(
+        "irrs_stage_seconds", "Duration of a request-path stage", ["endpoint", "stage"], buckets=_LATENCY_BUCKETS
+    )
+    POOL_CHECKOUT_SECONDS = prometheus_client.Histogram(
+        "irrs_db_pool_checkout_seconds", "Time waiting for a DB pool connection", ["pool"], buckets=_POOL_WAIT_BUCKETS
+    )
+    CACHE_REQUESTS = prometheus_client.Counter(
+        "irrs_cache_requests_total", "Cache lookups by outcome", ["cache", "result"]
+    )
+    REDIS_WRITES = prometheus_client.Counter(
+        "irrs_redis_writes_total", "Redis writes by outcome", ["key", "result"]
+    )
+    LLM_SECONDS = prometheus_client.Histogram(
+        "irrs_llm_request_seconds", "LLM call latency", ["model", "call", "outcome"], buckets=_LATENCY_BUCKETS
+    )
+    LLM_TOKENS = prometheus_client.Counter(
+        "irrs_llm_tokens_total", "LLM tokens used", ["model", "call", "kind"]
+    )
+    CANDIDATES = prometheus_client.Histogram(
+        "irrs_candidates", "Candidate-set size per request", ["stage"], buckets=_SIZE_BUCKETS
+    )
+    RELAXATION_LEVEL = prometheus_client.Counter(
+        "irrs_query_relaxation_total", "Candidate queries by the deepest relaxation level they needed", ["level"]
+    )
+    ADMISSION_WAIT_SECONDS = prometheus_client.Histogram(
+        "irrs_admission_wait_seconds", "Time queued for an admission slot", ["endpoint", "outcome"],
+        buckets=_LATENCY_BUCKETS
+    )
+    ADMISSION_SHED = prometheus_client.Counter(
+        "irrs_admission_shed_total", "Requests rejected with 503 by admission control", ["endpoint", "reason"]
+    )
+    LOOP_LAG_SECONDS = prometheus_client.Histogram(
+        "irrs_event_loop_lag_seconds", "Event-loop scheduling lag", buckets=_LOOP_LAG_BUCKETS
+    )
+    LOOP_BLOCKED = prometheus_client.Counter(
+        "irrs_event_loop_blocked_total", "Callbacks that blocked the event loop past the threshold"
+    )
+
+
+def observe_stage(endpoint: str, stage: str, seconds: float) -> None:
+    if ENABLED:
+        STAGE_SECONDS.labels(endpoint, stage).observe(seconds)
+
+
+def observe_pool_checkout(pool: str, seconds: float) -> None:
+    if ENABLED:
+        POOL_CHECKOUT_SECONDS.labels(pool).observe(seconds)
+
+
+def record_cache(cache: str, result: str) -> None:
+    '''result: "hit" | "miss" | "coalesced"'''
+    if ENABLED:
+        CACHE_REQUESTS.labels(cache, result).inc()
+
+
+def record_redis_write(key: str, ok: bool) -> None:
+    if ENABLED:
+        REDIS_WRITES.labels(key, "ok" if ok else "error").inc()
+
+
+def record_llm_call(model: str, call: str, *, latency: float, outcome: str = "ok", usage: Optional[Any] = None) -> None:
+    if not ENABLED:
+        return
+    LLM_SECONDS.labels(model, call, outcome).observe(latency)
+    if usage is not None:
+        LLM_TOKENS.labels(model, call, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        LLM_TOKENS.labels(model, call, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def observe_candidates(stage: str, count: int) -> None:
+    if ENABLED:
+        CANDIDATES.labels(stage).observe(count)
+
+
+def record_relaxation_level(level: int) -> None:
+    '''level: 0 = exact matches only, highest = school-only fallback'''
+    if ENABLED:
+        RELAXATION_LEVEL.labels(str(level)).inc()
+
+
+def observe_admission_wait(endpoint: str, outcome: str, seconds: float) -> None:
+    '''outcome: "admitted" | "shed"'''
+    if ENABLED:
+        ADMISSION_WAIT_SECONDS.labels(endpoint, outcome).observe(seconds)
+
+
+def record_admission_shed(endpoint: str, reason: str) -> None:
+    '''reason: "queue_full" | "timeout" | "evicted"'''
+    if ENABLED:
+        ADMISSION_SHED.labels(endpoint, reason).inc()
+
+
+def observe_loop_lag(seconds: float) -> None:
+    if ENABLED:
+        LOOP_LAG_SECONDS.observe(seconds)
+
+
+def record_loop_blocked() -> None:
+    if ENABLED:
+        LOOP_BLOCKED.inc()
+
+
+def timed_pool_class(base: type, pool_name: str) -> Optional[type]:
+    '''
+    Pool subclass that times connection checkout (queue wait + connect), or None when
+    metrics are off so engines keep their default pool untouched.
+    '''
+    if not ENABLED:
+        return None
+
+    class TimedPool(base):
+        def _do_get(self):
+            start_time = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                observe_pool_checkout(pool_name, time.perf_counter() - start_time)
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def render_latest() -> Optional[bytes]:
+    return prometheus_client.generate_latest() if ENABLED else None
+
+
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST if prometheus_client is not None else "text/plain"
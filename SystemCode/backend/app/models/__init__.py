@@ -1,16 +1,23 @@
-from .enquiry import EnquiryForm, EnquiryNL, EnquiryEntity, EnquiryRead
+from .enquiry import EnquiryForm, EnquiryNL, EnquiryEntity, EnquiryRead, EnquiryBatch, RankingWeights
 from .property import Property, PropertyLocation
-from .recommendation import Recommendation, RecommendationResponse
+from .recommendation import Recommendation, RecommendationResponse, RecommendationPage, BatchRecommendationItem
+from .explanation import PrecomputedExplanation
 
 
 __all__ = [
     "EnquiryForm",
     "EnquiryNL",
     "EnquiryEntity",
+    "EnquiryBatch",
+    "RankingWeights",
 
     "Property",
     "PropertyLocation",
 
     "Recommendation",
     "RecommendationResponse",
+    "RecommendationPage",
+    "BatchRecommendationItem",
+
+    "PrecomputedExplanation",
 ]
\ No newline at end of file
@@ -13,14 +13,26 @@ class EnquiryForm(SQLModel):
     device_id: Optional[str] = Field(default=None, max_length=100, index=True)
     min_monthly_rent: int
     max_monthly_rent: int
-    school_id: int
-    target_district_id: Optional[int] = Field(default=None)
+    school_id: int = Field(ge=1, le=6)
+    target_district_id: Optional[int] = Field(default=None, ge=1, le=36)
     max_school_limit: Optional[int] = Field(default=None)
     flat_type_preference: Optional[List[str]] = Field(default=None)
     max_mrt_distance: Optional[int] = Field(default=None)
-    importance_rent: int = Field(default=3)
-    importance_location: int = Field(default=3)
-    importance_facility: int = Field(default=3)
+    importance_rent: int = Field(default=3, ge=1, le=5)
+    importance_location: int = Field(default=3, ge=1, le=5)
+    importance_facility: int = Field(default=3, ge=1, le=5)
+
+
+# 对已提交问卷重新设置权重（重排序接口），不重新检索
+class RankingWeights(SQLModel):
+    importance_rent: int = Field(default=3, ge=1, le=5)
+    importance_location: int = Field(default=3, ge=1, le=5)
+    importance_facility: int = Field(default=3, ge=1, le=5)
+
+
+# 批量问卷（如学校住房办公室一次提交多名学生的需求）
+class EnquiryBatch(SQLModel):
+    enquiries: List[EnquiryForm]
 
 
 # 前端请求自然语言段落模型，处理时要先转换成 EnquiryForm
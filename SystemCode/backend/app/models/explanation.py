@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, UniqueConstraint, func
+from sqlmodel import Field, SQLModel
+
+
+# 离线预生成的推荐理由，按 (学校, 权重组合, 预算区间, 房源) 查找
+# 生成时不把预算和各项限制交给模型，理由不引用具体数字；请求阶段只对满足用户自身条件的房源使用
+class PrecomputedExplanation(SQLModel, table=True):
+    __tablename__ = "precomputed_explanations"
+    __table_args__ = (
+        UniqueConstraint("school_id", "weight_profile", "budget_band", "property_id", name="_explanation_profile_uc"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    school_id: int = Field(index=True)
+    weight_profile: str = Field(max_length=20)   # "rent-location-facility", e.g. "5-3-3"
+    budget_band: str = Field(max_length=20)      # band of max_monthly_rent, e.g. "1500-2000"
+    property_id: int
+    recommand_reason: str
+
+    create_time: datetime = Field(
+        default_factory=datetime.utcnow,
+        sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    )
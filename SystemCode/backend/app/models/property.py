@@ -32,4 +32,7 @@ class Property(PropertyLocation):
     commuteScore: Optional[float] = Field(default=0.5) 
     neighborhoodScore: Optional[float] = Field(default=0.5)  
 
+    # 0：完全符合条件；>0：候选不足时被第几级放宽条件选中
+    relaxation_level: Optional[int] = Field(default=None)
+
     recommand_reason: Optional[str] = Field(default=None)
@@ -32,8 +32,26 @@ class Recommendation(SQLModel, table=True):
 # 返回给前端的推荐结果模型
 class RecommendationResponse(SQLModel):
     properties: List[Property]
+    # 用于翻页：GET /recommendations/{eid}?cursor=next_cursor
+    eid: Optional[int] = None
+    next_cursor: Optional[str] = None
 
     @computed_field
     @property
     def total_count(self) -> int:
         return len(self.properties)
+
+
+# 已存推荐结果的分页模型，total_count 为完整排序的房源数
+class RecommendationPage(SQLModel):
+    eid: int
+    properties: List[Property]
+    total_count: int
+    next_cursor: Optional[str] = None
+
+
+# 批量接口 NDJSON 中的一行，index 对应请求中 enquiries 的下标
+class BatchRecommendationItem(RecommendationResponse):
+    index: int
+    device_id: Optional[str] = None
+    error: Optional[str] = None
@@ -0,0 +1,181 @@
+# app/profiling.py
+# Opt-in per-request profiling for /submit-form. A sampled request is run under a
+# statistical stack sampler (and tracemalloc), and the profile is written to PROFILE_DIR as
+#   <time>-<enquiry hash>.speedscope.json   open in https://www.speedscope.app
+#   <time>-<enquiry hash>.folded            flamegraph.pl / speedscope "collapsed stacks"
+#   <time>-<enquiry hash>.alloc.txt         top allocation sites (tracemalloc)
+#
+#   PROFILE_ADMIN_TOKEN   profile requests sent with "X-Profile: <token>"
+#   PROFILE_SAMPLE_RATE   share of requests profiled without the header (default 0)
+#   PROFILE_DIR           output directory (default /tmp/irrs-profiles)
+#   PROFILE_INTERVAL_MS   sampling interval (default 5)
+#   PROFILE_TRACEMALLOC   also trace allocations (default true)
+#
+# With neither a token nor a sample rate set, profile_request() is a bare yield.
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import asyncio
+import datetime
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.log import get_logger
+
+
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN") or None
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/irrs-profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "true").lower() in ("1", "true", "yes")
+
+PROFILE_HEADER = "x-profile"
+ENABLED = PROFILE_ADMIN_TOKEN is not None or PROFILE_SAMPLE_RATE > 0
+
+_TOP_ALLOCATIONS = 30
+
+# tracemalloc and the sampler are process-wide: one profile at a time, others run unprofiled
+_active = threading.Lock()
+
+logger = get_logger("profiling")
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+
+
+def enquiry_hash(enquiry: BaseModel) -> str:
+    '''Stable hash of the query fields (RequestInfo shape; device_id excluded)'''
+    fields = enquiry.model_dump(mode="json", exclude={"device_id"})
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def should_profile(header_value: Optional[str]) -> bool:
+    if PROFILE_ADMIN_TOKEN is not None and header_value == PROFILE_ADMIN_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class StackSampler:
+    '''
+    Samples one thread's Python stack from a background thread. The event loop is shared,
+    so under concurrency the samples include other requests' work as well as idle time in
+    the selector (waiting on the DB / LLM).
+    '''
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="irrs-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[Frame] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+
+def _frame_label(frame: Frame) -> str:
+    name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def render_folded(samples: Counter) -> str:
+    return "".join(
+        f"{';'.join(_frame_label(f) for f in stack)} {count}\n" for stack, count in samples.most_common()
+    )
+
+
+def render_speedscope(samples: Counter, *, name: str, interval: float) -> dict:
+    frame_index: Dict[Frame, int] = {}
+    stacks, weights = [], []
+    for stack, count in samples.items():
+        stacks.append([frame_index.setdefault(f, len(frame_index)) for f in stack])
+        weights.append(count * interval)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "shared": {"frames": [
+            {"name": f[0], "file": f[1], "line": f[2]} for f in sorted(frame_index, key=frame_index.get)
+        ]},
+        "profiles": [{
+            "type": "sampled", "name": name, "unit": "seconds",
+            "startValue": 0, "endValue": sum(weights), "samples": stacks, "weights": weights,
+        }],
+    }
+
+
+def render_allocations(snapshot: tracemalloc.Snapshot, peak: int) -> str:
+    lines = [f"peak traced memory: {peak / 1024:.1f} KiB", ""]
+    # leave out the sampler's own bookkeeping
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)])
+    for stat in snapshot.statistics("lineno")[:_TOP_ALLOCATIONS]:
+        lines.append(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {stat.traceback}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_profile(base: str, samples: Counter, name: str, interval: float, allocations: Optional[str]) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(f"{base}.speedscope.json", "w") as f:
+        json.dump(render_speedscope(samples, name=name, interval=interval), f)
+    with open(f"{base}.folded", "w") as f:
+        f.write(render_folded(samples))
+    if allocations is not None:
+        with open(f"{base}.alloc.txt", "w") as f:
+            f.write(allocations)
+
+
+@asynccontextmanager
+async def profile_request(*, header_value: Optional[str], enquiry: BaseModel, endpoint: str) -> AsyncIterator[None]:
+    '''Profile the enclosed block if this request is selected; files are tagged with enquiry_hash()'''
+    if not ENABLED or not should_profile(header_value) or not _active.acquire(blocking=False):
+        yield
+        return
+
+    tag = enquiry_hash(enquiry)
+    interval = PROFILE_INTERVAL_MS / 1000
+    sampler = StackSampler(threading.get_ident(), interval)
+    trace_memory = PROFILE_TRACEMALLOC and not tracemalloc.is_tracing()
+    start_time = time.perf_counter()
+    try:
+        if trace_memory:
+            tracemalloc.start()
+        sampler.start()
+        yield
+    finally:
+        sampler.stop()
+        allocations = None
+        if trace_memory:
+            allocations = render_allocations(tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        _active.release()
+
+        elapsed = time.perf_counter() - start_time
+        stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+        base = os.path.join(PROFILE_DIR, f"{stamp}-{tag}")
+        name = f"{endpoint} {tag} ({elapsed * 1000:.0f} ms)"
+        try:
+            await asyncio.to_thread(_write_profile, base, sampler.samples, name, interval, allocations)
+            logger.info("request profile written", extra={"path": base, "tag": tag, "seconds": round(elapsed, 3)})
+        except OSError as e:
+            logger.warning("failed to write request profile: %s", e, extra={"tag": tag})
@@ -1,48 +1,141 @@
-from fastapi import APIRouter, Depends, status
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, Response, status
 from fastapi.responses import HTMLResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
 import openai
 
 from app.dependencies import get_async_session, get_async_openai_client
 from app.dependencies import get_async_openai_client
-from app.models import EnquiryForm, EnquiryNL, PropertyLocation, RecommendationResponse
+from app.models import EnquiryForm, EnquiryNL, EnquiryBatch, RankingWeights, PropertyLocation, RecommendationResponse, RecommendationPage
 from app.handlers import property_handler
+from app.responses import FastJSONResponse
+from app import profiling
+from app.admission import admit, admitted_stream
+from app.llm.extraction_cache import extraction_cache, normalize_description
 
 
 router = APIRouter(prefix="/api/v1/properties", tags=["properties"])
 
 
+def _fast_response(result, status_code: int) -> Response:
+    # handlers may already return a Response (e.g. 422 for missing fields)
+    if isinstance(result, Response):
+        return result
+    return FastJSONResponse(content=result, status_code=status_code)
+
+
 # Submit the questionnaire form
-@router.post("/submit-form", response_model=RecommendationResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/submit-form", response_model=RecommendationResponse, response_class=FastJSONResponse, status_code=status.HTTP_201_CREATED)
 async def submit_form(
     *,
+    request: Request,
     db: AsyncSession = Depends(get_async_session),
     client: openai.AsyncOpenAI = Depends(get_async_openai_client),
-    enquiry: EnquiryForm
+    background_tasks: BackgroundTasks,
+    enquiry: EnquiryForm,
+    llm_refine: bool = False
 ):
 
-    return await property_handler.submit_form_handler(db=db, client=client, enquiry=enquiry)
+    # llm_refine answers with template reasons, no LLM call on the request path
+    async with admit(request, "submit-form", cheap=llm_refine):
+        handling = property_handler.submit_form_handler(
+            db=db,
+            client=client,
+            enquiry=enquiry,
+            background_tasks=background_tasks,
+            llm_refine=llm_refine
+        )
+        if profiling.ENABLED:
+            async with profiling.profile_request(
+                header_value=request.headers.get(profiling.PROFILE_HEADER),
+                enquiry=enquiry,
+                endpoint="submit-form"
+            ):
+                result = await handling
+        else:
+            result = await handling
+    return _fast_response(result, status.HTTP_201_CREATED)
+
+
+# Submit many questionnaire forms at once, streamed back as NDJSON (one BatchRecommendationItem per line)
+@router.post("/submit-form/batch", status_code=status.HTTP_200_OK)
+async def submit_form_batch(
+    *,
+    request: Request,
+    batch: EnquiryBatch
+):
+    # 400/413 for a bad batch are raised before a slot is taken
+    response = await property_handler.submit_form_batch_handler(enquiries=batch.enquiries)
+    # the batch runs while the response streams, so the slot is held until the last line is sent
+    response.body_iterator = await admitted_stream(request, "submit-form-batch", response.body_iterator)
+    return response
 
 
 # Submit natural language description
-@router.post("/submit-description", response_model=RecommendationResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/submit-description", response_model=RecommendationResponse, response_class=FastJSONResponse, status_code=status.HTTP_201_CREATED)
 async def submit_description(
     *,
+    request: Request,
     db: AsyncSession = Depends(get_async_session),
     client: openai.AsyncOpenAI = Depends(get_async_openai_client),
-    enquiry: EnquiryNL
+    background_tasks: BackgroundTasks,
+    enquiry: EnquiryNL,
+    llm_refine: bool = False
 ):
 
-    return await property_handler.submit_description_handler(db=db, client=client, enquiry=enquiry)
+    # a cached extraction skips the extraction call
+    cached = extraction_cache.get(normalize_description(enquiry.requirement_description or "")) is not None
+    async with admit(request, "submit-description", cheap=cached):
+        result = await property_handler.submit_description_handler(
+            db=db,
+            client=client,
+            enquiry=enquiry,
+            background_tasks=background_tasks,
+            llm_refine=llm_refine
+        )
+    return _fast_response(result, status.HTTP_201_CREATED)
 
 
-# Get a list of recommended properties
-@router.get("/recommendation-no-submit", response_model=RecommendationResponse, status_code=status.HTTP_200_OK)
+# Get a list of recommended properties (first page of a stored ranking when eid is given)
+@router.get("/recommendation-no-submit", response_model=RecommendationResponse, response_class=FastJSONResponse, status_code=status.HTTP_200_OK)
 async def recommendation_no_submit(
     *,
-    db: AsyncSession = Depends(get_async_session)
+    db: AsyncSession = Depends(get_async_session),
+    eid: Optional[int] = None,
+    limit: int = Query(default=10, ge=1, le=50)
+):
+    if eid is None:
+        return _fast_response(RecommendationResponse(properties=[]), status.HTTP_200_OK)
+
+    page = await property_handler.recommendation_page_handler(db=db, eid=eid, limit=limit)
+    result = RecommendationResponse(properties=page.properties, eid=eid, next_cursor=page.next_cursor)
+    return _fast_response(result, status.HTTP_200_OK)
+
+
+# Page through the stored ranking of an enquiry (cursor: next_cursor of the previous page)
+@router.get("/recommendations/{eid}", response_model=RecommendationPage, response_class=FastJSONResponse, status_code=status.HTTP_200_OK)
+async def recommendation_page(
+    *,
+    db: AsyncSession = Depends(get_async_session),
+    eid: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=10, ge=1, le=50)
+):
+    result = await property_handler.recommendation_page_handler(db=db, eid=eid, cursor=cursor, limit=limit)
+    return _fast_response(result, status.HTTP_200_OK)
+
+
+# Re-order a submitted enquiry's candidates for new importance weights (no retrieval or re-scoring)
+@router.post("/recommendations/{eid}/rerank", response_model=RecommendationResponse, response_class=FastJSONResponse, status_code=status.HTTP_200_OK)
+async def rerank_recommendation(
+    *,
+    eid: int,
+    weights: RankingWeights,
+    top_k: int = Query(default=property_handler.TOP_K, ge=1, le=50)
 ):
-    return RecommendationResponse(properties=[])
+    result = await property_handler.rerank_handler(eid=eid, weights=weights, top_k=top_k)
+    return _fast_response(result, status.HTTP_200_OK)
 
 
 # Get the map location of a property
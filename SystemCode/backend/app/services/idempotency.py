@@ -0,0 +1,66 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models import EnquiryForm, Recommendation
+from app.database import crud as db_service
+from app.database.cache import redis_client
+from app import metrics
+
+
+# a resubmission of the same form from the same device within this window reuses the earlier result
+IDEMPOTENCY_WINDOW_SECONDS = int(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", str(10 * 60)))
+
+
+def form_fingerprint(enquiry: EnquiryForm) -> str:
+    '''device_id + normalized form (flat types order/case-insensitive, empty list == None)'''
+    fields = enquiry.model_dump(exclude={"device_id"})
+    flat_types = sorted({t.strip().casefold() for t in fields.get("flat_type_preference") or []})
+    fields["flat_type_preference"] = flat_types or None
+    raw = json.dumps([enquiry.device_id, fields], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+async def find_previous_recommendation(*, db: AsyncSession, enquiry: EnquiryForm) -> Optional[Recommendation]:
+    '''
+    Stored recommendation of an identical earlier submission within the window:
+    Redis (submission:{fingerprint} -> eid, then recommendation:{eid}), or the db without Redis
+    '''
+    if not enquiry.device_id or IDEMPOTENCY_WINDOW_SECONDS <= 0:
+        return None
+
+    fingerprint = form_fingerprint(enquiry)
+    eid = await db_service.get_submission_eid(fingerprint=fingerprint)
+    if eid is not None:
+        recommendation = await db_service.get_cached_recommendation(eid=eid)
+        if recommendation is None:
+            recommendation = await db_service.get_recommendation(db=db, eid=eid)
+        if recommendation is not None:
+            metrics.record_cache("idempotency", "hit")
+            return recommendation
+
+    # every submission is remembered in Redis, so a miss there is final; without Redis,
+    # compare against the device's few recent enquiries instead
+    if redis_client is not None:
+        metrics.record_cache("idempotency", "miss")
+        return None
+
+    since = datetime.now(timezone.utc) - timedelta(seconds=IDEMPOTENCY_WINDOW_SECONDS)
+    for previous in await db_service.get_recent_enquiries(db=db, device_id=enquiry.device_id, since=since):
+        if form_fingerprint(EnquiryForm.model_validate(previous)) == fingerprint and previous.recommendation:
+            metrics.record_cache("idempotency", "hit")
+            return previous.recommendation
+
+    metrics.record_cache("idempotency", "miss")
+    return None
+
+
+async def remember_submission(*, enquiry: EnquiryForm, eid: int) -> None:
+    if enquiry.device_id and eid and IDEMPOTENCY_WINDOW_SECONDS > 0:
+        await db_service.save_submission_eid(
+            fingerprint=form_fingerprint(enquiry), eid=eid, ttl_seconds=IDEMPOTENCY_WINDOW_SECONDS
+        )
@@ -0,0 +1,60 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app import metrics
+from app.services.recommendation_service import RankingSession
+
+
+RANKING_SESSION_TTL_SECONDS = int(os.getenv("RANKING_SESSION_TTL_SECONDS", str(30 * 60)))  # 30min
+RANKING_SESSION_MAX_ENTRIES = int(os.getenv("RANKING_SESSION_MAX_ENTRIES", "1024"))
+
+
+class RankingSessionCache:
+    '''
+    In-process TTL/LRU cache of RankingSession by eid, so re-weighting a submitted
+    enquiry is a sort over its cached candidates: no retrieval, scoring or db access.
+    Sessions live in the instance that ranked the enquiry; elsewhere they simply miss.
+    '''
+
+    def __init__(self, ttl_seconds: int = RANKING_SESSION_TTL_SECONDS, max_entries: int = RANKING_SESSION_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[float, RankingSession]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, eid: int) -> Optional[RankingSession]:
+        entry = self._entries.get(eid)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[eid]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            metrics.record_cache("ranking_session", "miss")
+            return None
+        self.hits += 1
+        metrics.record_cache("ranking_session", "hit")
+        self._entries.move_to_end(eid)
+        return entry[1]
+
+    def set(self, eid: int, session: RankingSession) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[eid] = (time.monotonic() + self.ttl_seconds, session)
+        self._entries.move_to_end(eid)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+ranking_sessions = RankingSessionCache()
@@ -1,85 +1,146 @@
-from typing import List
+from decimal import Decimal
+from typing import AsyncIterator, List, Optional, Tuple, Union
 
-from pydantic import ValidationError
+from app import metrics
 from app.models import EnquiryForm, Property
 
-from app.dataservice.sql_api.api_model import RequestInfo as reqinfo, ResultInfo as resinfo
-from app.dataservice.sql_api.api import fetchRecommendProperties_async
+from app.dataservice.sql_api.api import (
+    fetchRecommendProperties_async, fetchPropertiesByIds_async, fetchRecommendPropertiesBatch_async
+)
+from app.dataservice.sql_api.func import GLOBAL_SCORES
 
 
-# Get recommended property list (unsorted)
-async def fetchRecommendProperties(params: EnquiryForm) -> List[Property]:
-    try:
-        req = reqinfo.model_validate(params.model_dump(), strict=False)
-    except ValidationError as e:
-        print(f"fail to convert EnquiryForm into reqinfo: {e}")
-        return []
+def _to_decimal(value: Optional[float]) -> Optional[Decimal]:
+    return None if value is None else Decimal(str(value))
 
-    filtered_properties = await fetchRecommendProperties_async(req)
 
-    try:
-        results = [Property.model_validate(p.model_dump(), strict=False) for p in filtered_properties]
-    except ValidationError as e:
-        print(f"fail to convert resinfo into Property: {e}")
-        return []
-    
-    return results
+def _property_from_row(**fields) -> Property:
+    '''
+    Result factory for the dataservice: every field is computed by our own
+    scoring code, so build the Property without re-validating it
+    '''
+    fields["latitude"] = _to_decimal(fields.get("latitude"))
+    fields["longitude"] = _to_decimal(fields.get("longitude"))
+    return Property.model_construct(**fields)
+
+
+# Get recommended property list (unsorted)
+async def fetchRecommendProperties(params: EnquiryForm) -> List[Property]:
+    # EnquiryForm is validated at the API boundary and read by attribute only
+    return await fetchRecommendProperties_async(params, result_factory=_property_from_row)
+
+
+# Get properties by id, in the given order (paging through a stored ranking)
+async def fetchPropertiesByIds(params: EnquiryForm, property_ids: List[int]) -> List[Property]:
+    return await fetchPropertiesByIds_async(property_ids, params, result_factory=_property_from_row)
+
+
+# Get recommended property lists for many enquiries, one school_id group at a time
+async def fetchRecommendPropertiesBatch(
+    enquiries: List[EnquiryForm]
+) -> AsyncIterator[Tuple[List[int], Union[List[List[Property]], Exception]]]:
+    async for indices, results in fetchRecommendPropertiesBatch_async(enquiries, result_factory=_property_from_row):
+        yield indices, results
+
+
+class Candidate:
+    '''Ranking-stage record: the row index into propertyList and the three objectives'''
+    __slots__ = ("index", "cost", "commute", "neighborhood", "layer", "crowding")
+
+    def __init__(self, index: int, cost: float, commute: float, neighborhood: float):
+        self.index = index
+        self.cost = cost
+        self.commute = commute
+        self.neighborhood = neighborhood
+        self.layer = 0
+        self.crowding = 0.0
+
+
+_OBJECTIVES = ("cost", "commute", "neighborhood")
+
+
+class RankingSession:
+    '''
+    The weight-independent part of a ranking: candidates with their normalized objectives,
+    Pareto layer and crowding distance. Only the final weighted tie-break depends on the
+    importance_* weights, so re-ranking for new weights is a single sort.
+    '''
+    __slots__ = ("enquiry", "properties", "candidates")
+
+    def __init__(self, enquiry: EnquiryForm, properties: List[Property], candidates: List[Candidate]):
+        self.enquiry = enquiry
+        self.properties = properties
+        self.candidates = candidates
+
+    def rank(self, *, weights=None, top_k: Optional[int] = None) -> List[Property]:
+        '''weights: anything with importance_rent/location/facility, defaults to the enquiry'''
+        ranked = _final_ranking(self.candidates, weights or self.enquiry)
+        if top_k is not None:
+            ranked = ranked[:top_k]
+
+        # join back to the display objects
+        results = []
+        for cand in ranked:
+            prop = self.properties[cand.index]
+            prop.costScore = cand.cost
+            prop.commuteScore = cand.commute
+            prop.neighborhoodScore = cand.neighborhood
+            results.append(prop)
+        return results
+
+
+def build_ranking_session(*, enquiry: EnquiryForm, propertyList: List[Property]) -> RankingSession:
+    candidates = _validate_and_filter(propertyList)
+    metrics.observe_candidates("rankable", len(candidates))
+    if candidates:
+        # globally precomputed scores are kept as they are: layers and crowding are unaffected
+        # by per-objective rescaling, and the scores stay comparable across requests
+        if not GLOBAL_SCORES:
+            _normalize_scores(candidates)
+        pareto_layers = _pareto_front_layering(candidates)
+        candidates = _calculate_crowding_distance(pareto_layers)
+    return RankingSession(enquiry, propertyList, candidates)
 
 
 # Sort recommended property list
 def multi_objective_optimization_ranking(
         *,
         enquiry: EnquiryForm,
-        propertyList: List[Property]
+        propertyList: List[Property],
+        top_k: Optional[int] = None
 ) -> List[Property]:
-
+    '''
+    Ranks on compact Candidate records; only the returned Property objects
+    (the first top_k, or all when None) get their normalized scores written back
+    '''
     if not propertyList:
         return []
 
-    valid_properties = _validate_and_filter(propertyList)
-    if not valid_properties:
-        return []
-
-    normalized_properties = _normalize_scores(valid_properties)
-
-    pareto_layers = _pareto_front_layering(normalized_properties)
-
-    properties_with_crowding = _calculate_crowding_distance(pareto_layers)
-
-    ranked_properties = _final_ranking(properties_with_crowding, enquiry)
+    return build_ranking_session(enquiry=enquiry, propertyList=propertyList).rank(top_k=top_k)
 
-    return ranked_properties
 
+def _validate_and_filter(propertyList: List[Property]) -> List[Candidate]:
+    candidates = []
 
-def _validate_and_filter(propertyList: List[Property]) -> List[Property]:
-    valid_properties = []
-
-    for prop in propertyList:
-        if (hasattr(prop, 'costScore') and hasattr(prop, 'commuteScore') and hasattr(prop, 'neighborhoodScore')):
-            if (0 < prop.costScore <= 1 and 0 < prop.commuteScore <= 1 and 0 < prop.neighborhoodScore <= 1):
-                valid_properties.append(prop)
-
-    return valid_properties
-
-
-def _normalize_scores(properties: List[Property]) -> List[Property]:
-    if len(properties) == 1:
-        return properties
+    for index, prop in enumerate(propertyList):
+        cost, commute, neighborhood = prop.costScore, prop.commuteScore, prop.neighborhoodScore
+        if cost is None or commute is None or neighborhood is None:
+            continue
+        if 0 < cost <= 1 and 0 < commute <= 1 and 0 < neighborhood <= 1:
+            candidates.append(Candidate(index, cost, commute, neighborhood))
 
-    cost_scores = [p.costScore for p in properties]
-    commute_scores = [p.commuteScore for p in properties]
-    neighborhood_scores = [p.neighborhoodScore for p in properties]
+    return candidates
 
-    cost_min, cost_max = min(cost_scores), max(cost_scores)
-    commute_min, commute_max = min(commute_scores), max(commute_scores)
-    neighborhood_min, neighborhood_max = min(neighborhood_scores), max(neighborhood_scores)
 
-    for prop in properties:
-        prop.costScore = _safe_normalize(prop.costScore, cost_min, cost_max)
-        prop.commuteScore = _safe_normalize(prop.commuteScore, commute_min, commute_max)
-        prop.neighborhoodScore = _safe_normalize(prop.neighborhoodScore, neighborhood_min, neighborhood_max)
+def _normalize_scores(candidates: List[Candidate]) -> None:
+    if len(candidates) == 1:
+        return
 
-    return properties
+    for objective in _OBJECTIVES:
+        values = [getattr(c, objective) for c in candidates]
+        min_val, max_val = min(values), max(values)
+        for cand in candidates:
+            setattr(cand, objective, _safe_normalize(getattr(cand, objective), min_val, max_val))
 
 
 def _safe_normalize(value: float, min_val: float, max_val: float) -> float:
@@ -88,34 +149,34 @@ def _safe_normalize(value: float, min_val: float, max_val: float) -> float:
     return (value - min_val) / (max_val - min_val)
 
 
-def _pareto_front_layering(properties: List[Property]) -> List[List[Property]]:
+def _pareto_front_layering(candidates: List[Candidate]) -> List[List[Candidate]]:
     layers = []
-    remaining = properties.copy()
+    remaining = candidates.copy()
 
     while remaining:
         current_layer = []
         dominated = []
 
-        for prop in remaining:
+        for cand in remaining:
             is_dominated = False
 
-            for layer_prop in current_layer:
-                if _dominates(layer_prop, prop):
+            for layer_cand in current_layer:
+                if _dominates(layer_cand, cand):
                     is_dominated = True
                     break
 
             if not is_dominated:
                 new_layer = []
-                for layer_prop in current_layer:
-                    if not _dominates(prop, layer_prop):
-                        new_layer.append(layer_prop)
+                for layer_cand in current_layer:
+                    if not _dominates(cand, layer_cand):
+                        new_layer.append(layer_cand)
                     else:
-                        dominated.append(layer_prop)
+                        dominated.append(layer_cand)
 
-                new_layer.append(prop)
+                new_layer.append(cand)
                 current_layer = new_layer
             else:
-                dominated.append(prop)
+                dominated.append(cand)
 
         layers.append(current_layer)
         remaining = dominated
@@ -123,78 +184,55 @@ def _pareto_front_layering(properties: List[Property]) -> List[List[Property]]:
     return layers
 
 
-def _dominates(prop_a: Property, prop_b: Property) -> bool:
-    not_worse = (
-        prop_a.costScore >= prop_b.costScore and
-        prop_a.commuteScore >= prop_b.commuteScore and
-        prop_a.neighborhoodScore >= prop_b.neighborhoodScore
-    )
-
-    strictly_better = (
-        prop_a.costScore > prop_b.costScore or
-        prop_a.commuteScore > prop_b.commuteScore or
-        prop_a.neighborhoodScore > prop_b.neighborhoodScore
+def _dominates(a: Candidate, b: Candidate) -> bool:
+    return (
+        a.cost >= b.cost and a.commute >= b.commute and a.neighborhood >= b.neighborhood
+        and (a.cost > b.cost or a.commute > b.commute or a.neighborhood > b.neighborhood)
     )
 
-    return not_worse and strictly_better
 
-
-def _calculate_crowding_distance(layers: List[List[Property]]) -> List[tuple]:
-    properties_with_crowding = []
+def _calculate_crowding_distance(layers: List[List[Candidate]]) -> List[Candidate]:
+    candidates_with_crowding = []
 
     for layer_idx, layer in enumerate(layers):
+        for cand in layer:
+            cand.layer = layer_idx
+            cand.crowding = float('inf') if len(layer) <= 2 else 0.0
+
         if len(layer) <= 2:
-            for prop in layer:
-                properties_with_crowding.append((prop, layer_idx, float('inf')))
+            candidates_with_crowding.extend(layer)
             continue
 
-        crowding_distances = {id(prop): 0.0 for prop in layer}
-
-        for objective in ['costScore', 'commuteScore', 'neighborhoodScore']:
-            sorted_layer = sorted(layer, key=lambda p: getattr(p, objective), reverse=True)
+        for objective in _OBJECTIVES:
+            sorted_layer = sorted(layer, key=lambda c: getattr(c, objective), reverse=True)
 
-            crowding_distances[id(sorted_layer[0])] = float('inf')
-            crowding_distances[id(sorted_layer[-1])] = float('inf')
+            sorted_layer[0].crowding = float('inf')
+            sorted_layer[-1].crowding = float('inf')
 
-            obj_range = (getattr(sorted_layer[0], objective) - getattr(sorted_layer[-1], objective))
+            obj_range = getattr(sorted_layer[0], objective) - getattr(sorted_layer[-1], objective)
 
             if obj_range < 1e-6:
                 continue
 
             for i in range(1, len(sorted_layer) - 1):
-                if crowding_distances[id(sorted_layer[i])] != float('inf'):
+                if sorted_layer[i].crowding != float('inf'):
                     distance = (getattr(sorted_layer[i - 1], objective) - getattr(sorted_layer[i + 1], objective)) / obj_range
-                    crowding_distances[id(sorted_layer[i])] += distance
+                    sorted_layer[i].crowding += distance
 
-        for prop in layer:
-            properties_with_crowding.append((prop, layer_idx, crowding_distances[id(prop)]))
+        candidates_with_crowding.extend(layer)
 
-    return properties_with_crowding
+    return candidates_with_crowding
 
 
-def _final_ranking(properties_with_crowding: List[tuple], enquiry: EnquiryForm) -> List[Property]:
+def _final_ranking(candidates: List[Candidate], weights) -> List[Candidate]:
+    w_rent, w_location, w_facility = weights.importance_rent, weights.importance_location, weights.importance_facility
 
-    ranked_data = []
-    for prop, layer_idx, crowding_dist in properties_with_crowding:
-        weighted_score = (
-            enquiry.importance_rent * prop.costScore +
-            enquiry.importance_location * prop.commuteScore +
-            enquiry.importance_facility * prop.neighborhoodScore
+    def sort_key(c: Candidate):
+        weighted_score = w_rent * c.cost + w_location * c.commute + w_facility * c.neighborhood
+        return (
+            c.layer,
+            -c.crowding if c.crowding != float('inf') else float('-inf'),
+            -weighted_score
         )
 
-        ranked_data.append({
-            'property': prop,
-            'layer': layer_idx,
-            'crowding': crowding_dist,
-            'weighted_score': weighted_score
-        })
-
-    ranked_data.sort(
-        key=lambda x: (
-            x['layer'],
-            -x['crowding'] if x['crowding'] != float('inf') else float('-inf'),
-            -x['weighted_score']
-        )
-    )
-
-    return [item['property'] for item in ranked_data]
+    return sorted(candidates, key=sort_key)
@@ -0,0 +1,60 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from app import metrics
+
+
+# stage name -> seconds, for the request being handled (None outside a request)
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+# ASGI scope of the request; the router adds the matched route to it after the middleware ran
+_request_scope: ContextVar[Optional[dict]] = ContextVar("timing_request_scope", default=None)
+
+UNMATCHED_ENDPOINT = "unmatched"
+
+
+def begin_request(scope: Optional[dict] = None) -> Dict[str, float]:
+    '''Start collecting stage timings; the returned dict is filled in place'''
+    timings: Dict[str, float] = {}
+    _stage_timings.set(timings)
+    _request_scope.set(scope)
+    return timings
+
+
+def current_endpoint() -> str:
+    '''
+    Metrics label for the current request: the route template ("/recommendations/{eid}"),
+    never the raw path, so ids in paths do not create new series; "" outside a request
+    '''
+    scope = _request_scope.get()
+    if scope is None:
+        return ""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ENDPOINT
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    '''Time a block of the request path, e.g. `with stage("rank"): ...`'''
+    timings = _stage_timings.get()
+    if timings is None and not metrics.ENABLED:
+        yield
+        return
+
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+        metrics.observe_stage(current_endpoint(), name, elapsed)
+
+
+def server_timing_header(timings: Dict[str, float], total: Optional[float] = None) -> str:
+    '''Server-Timing header value, durations in milliseconds'''
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,67 @@
+# benchmarks/bench_response.py
+# Response serialization: FastAPI's default response_model path vs FastJSONResponse.
+# Run:  python -m benchmarks.bench_response [--sizes 1,10,50,200] [--requests 200]
+import time
+import asyncio
+import argparse
+import statistics
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+
+from app.models import RecommendationResponse
+from app.responses import FastJSONResponse
+from benchmarks.synthetic import make_properties
+
+
+def build_app(payload: RecommendationResponse) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default", response_model=RecommendationResponse)
+    async def default():
+        return payload
+
+    @app.get("/fast", response_model=RecommendationResponse, response_class=FastJSONResponse)
+    async def fast():
+        return FastJSONResponse(content=payload)
+
+    return app
+
+
+async def time_requests(client: httpx.AsyncClient, path: str, number: int) -> List[float]:
+    await client.get(path)  # warm-up
+    latencies = []
+    for _ in range(number):
+        start = time.perf_counter()
+        response = await client.get(path)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return latencies
+
+
+async def main(sizes: List[int], requests: int) -> None:
+    print(f"{'props':>6} {'bytes':>8} | {'default p50':>12} {'fast p50':>10} {'speedup':>8}")
+    for size in sizes:
+        payload = RecommendationResponse(properties=make_properties(size))
+        app = build_app(payload)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            default = await time_requests(client, "/default", requests)
+            fast = await time_requests(client, "/fast", requests)
+            body_default = (await client.get("/default")).content
+            body_fast = (await client.get("/fast")).content
+        assert body_default == body_fast, "fast path must produce byte-identical JSON"
+
+        p50_default, p50_fast = statistics.median(default), statistics.median(fast)
+        print(
+            f"{size:>6} {len(body_fast):>8} | {p50_default * 1000:>10.2f}ms {p50_fast * 1000:>8.2f}ms "
+            f"{p50_default / p50_fast:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare response serialization paths.")
+    parser.add_argument("--sizes", default="1,10,50,200", help="comma-separated property counts")
+    parser.add_argument("--requests", type=int, default=200, help="requests per size and path")
+    args = parser.parse_args()
+    asyncio.run(main([int(s) for s in args.sizes.split(",")], args.requests))
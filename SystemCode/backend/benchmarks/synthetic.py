@@ -0,0 +1,160 @@
+# benchmarks/synthetic.py
+# Seeded synthetic catalogue shaped like cleaned_housing_data_topostgre.csv plus the
+# commute_times / housing_facility_distances / districts rows the hot path joins in.
+import random
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from app.dataservice.sql_api.model import HousingData
+from app.models import EnquiryForm, Property
+
+
+FLAT_TYPES = ["HDB", "Condo", "Apartment", "Executive Condo", "Landed"]
+STREETS = ["Clementi Ave", "Dover Rd", "Jurong West St", "Bukit Batok St", "Toa Payoh Lor", "Bedok North St"]
+FACILITY_KINDS = ["Park", "Hawker Centre", "Supermarket", "Library"]
+NUM_DISTRICTS = 28
+NUM_SCHOOLS = 6
+DUPLICATE_RATE = 0.02
+
+
+@dataclass
+class SyntheticCatalogue:
+    housings: List[HousingData]
+    # housing_id -> commute minutes, per school_id
+    commute: Dict[int, Dict[int, int]]
+    # housing_id -> [{facility_name: "distance_m"}], nearest per facility type within 2km
+    facilities: Dict[int, List[Dict[str, str]]]
+    # district_id -> (district_name, safety_score)
+    districts: Dict[int, tuple] = field(default_factory=dict)
+
+    def raw_data(self, school_id: int = 1) -> List[dict]:
+        '''Rows in the shape filter_housing_async builds before scoring'''
+        commute = self.commute[school_id]
+        rows = []
+        for housing in self.housings:
+            district_name, safety = self.districts.get(housing.district_id, ("", 0.0))
+            nearest_facilities = self.facilities.get(housing.id, [])
+            rows.append({
+                "housing": housing,
+                "img": f"https://storage.googleapis.com/irrs-images/housing_{housing.id}.jpg",
+                "price": housing.price or 0,
+                "commute": commute.get(housing.id) or 9999,
+                "facility": len(nearest_facilities),
+                "safety": safety or 0,
+                "district": district_name,
+                "public_facilities": nearest_facilities,
+            })
+        return rows
+
+
+def _housing(rng: random.Random, housing_id: int) -> HousingData:
+    flat_type = rng.choices(FLAT_TYPES, weights=[45, 25, 20, 6, 4])[0]
+    beds = rng.randint(1, 5)
+    block = rng.randint(1, 999)
+    street = f"{rng.choice(STREETS)} {rng.randint(1, 9)}"
+    return HousingData(
+        id=housing_id,
+        name=f"Blk {block} {street}",
+        price=int(rng.lognormvariate(8.0, 0.35)) // 50 * 50,
+        area_sqft=rng.randint(250, 2500),
+        build_time=rng.choice([None, rng.randint(1975, 2024)]),
+        type=flat_type,
+        location=f"{block} {street}, Singapore {rng.randint(100000, 829999)}",
+        distance_to_mrt=rng.randint(50, 3000),
+        availability="Ready to move",
+        beds_num=beds,
+        baths_num=max(1, beds - rng.randint(0, 2)),
+        is_room=rng.random() < 0.3,
+        district_id=rng.randint(1, NUM_DISTRICTS),
+        longitude=round(rng.uniform(103.62, 104.0), 6),
+        latitude=round(rng.uniform(1.24, 1.46), 6),
+    )
+
+
+def _duplicate(source: HousingData, housing_id: int) -> HousingData:
+    # same listing scraped twice: identical dedup key, new id
+    return HousingData(
+        id=housing_id, name=source.name, price=source.price, area_sqft=source.area_sqft,
+        build_time=source.build_time, type=source.type, location=source.location,
+        distance_to_mrt=source.distance_to_mrt, availability=source.availability,
+        beds_num=source.beds_num, baths_num=source.baths_num, is_room=source.is_room,
+        district_id=source.district_id, longitude=source.longitude, latitude=source.latitude,
+    )
+
+
+def generate_catalogue(size: int, seed: int = 42) -> SyntheticCatalogue:
+    rng = random.Random(seed)
+    housings: List[HousingData] = []
+    for housing_id in range(1, size + 1):
+        if housings and rng.random() < DUPLICATE_RATE:
+            housings.append(_duplicate(rng.choice(housings), housing_id))
+        else:
+            housings.append(_housing(rng, housing_id))
+
+    commute = {
+        school_id: {h.id: rng.randint(5, 120) for h in housings if rng.random() > 0.01}
+        for school_id in range(1, NUM_SCHOOLS + 1)
+    }
+    facilities = {}
+    for h in housings:
+        kinds = rng.sample(FACILITY_KINDS, rng.randint(0, len(FACILITY_KINDS)))
+        facilities[h.id] = [{f"{kind} {h.district_id}-{rng.randint(1, 40)}": str(rng.randint(80, 2000))} for kind in kinds]
+    districts = {
+        district_id: (f"District {district_id}", round(rng.uniform(0.2, 1.0), 3))
+        for district_id in range(1, NUM_DISTRICTS + 1)
+    }
+    return SyntheticCatalogue(housings=housings, commute=commute, facilities=facilities, districts=districts)
+
+
+def sample_enquiry(seed: int = 42, school_id: Optional[int] = None) -> EnquiryForm:
+    rng = random.Random(seed)
+    return EnquiryForm(
+        min_monthly_rent=1000,
+        max_monthly_rent=rng.choice([2500, 3000, 4000]),
+        school_id=school_id or rng.randint(1, NUM_SCHOOLS),
+        importance_rent=rng.randint(1, 5),
+        importance_location=rng.randint(1, 5),
+        importance_facility=rng.randint(1, 5),
+    )
+
+
+def scored_properties(catalogue: SyntheticCatalogue, enquiry: EnquiryForm) -> List[Property]:
+    '''Property list as fetchRecommendProperties returns it, scored by the dataservice'''
+    from app.dataservice.sql_api.func import score_housing_data
+
+    raw_data = catalogue.raw_data(enquiry.school_id)
+    scores = score_housing_data(raw_data, enquiry)
+    return [
+        Property.model_construct(
+            property_id=data["housing"].id,
+            latitude=Decimal(str(data["housing"].latitude)),
+            longitude=Decimal(str(data["housing"].longitude)),
+            img_src=data["img"],
+            name=data["housing"].name,
+            district=data["district"],
+            price=str(data["housing"].price),
+            time_to_school=int(data["commute"]),
+            public_facilities=data["public_facilities"],
+            facility_type=data["housing"].type,
+            costScore=cost, commuteScore=commute, neighborhoodScore=neighbour,
+        )
+        for data, (cost, commute, neighbour, _) in zip(raw_data, scores)
+    ]
+
+
+def make_properties(n: int, seed: int = 42) -> List[Property]:
+    '''Fully populated display objects (the response / persistence payload)'''
+    rng = random.Random(seed)
+    catalogue = generate_catalogue(n, seed)
+    properties = scored_properties(catalogue, sample_enquiry(seed, school_id=1))
+    for prop, housing in zip(properties, catalogue.housings):
+        prop.beds, prop.baths, prop.area = housing.beds_num, housing.baths_num, housing.area_sqft
+        prop.build_time = str(housing.build_time) if housing.build_time else ""
+        prop.location = housing.location
+        prop.distance_to_mrt = housing.distance_to_mrt
+        prop.recommand_reason = (
+            f"Strong match: at ${housing.price:,} it fits your budget, and it is just "
+            f"{prop.time_to_school} minutes from NUS and {housing.distance_to_mrt}m from the MRT. "
+        ) * rng.randint(1, 3)
+    return properties
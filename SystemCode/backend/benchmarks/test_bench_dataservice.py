@@ -0,0 +1,18 @@
+import pytest
+
+from app.dataservice.sql_api.func import remove_duplicate_housings, score_housing_data
+
+
+@pytest.mark.benchmark(group="dedup")
+def test_remove_duplicate_housings(benchmark, catalogue):
+    unique, removed = benchmark(remove_duplicate_housings, catalogue.housings)
+    assert removed > 0
+    assert len(unique) + removed == len(catalogue.housings)
+
+
+@pytest.mark.benchmark(group="score")
+def test_score_housing_data(benchmark, catalogue, enquiry):
+    raw_data = catalogue.raw_data(enquiry.school_id)
+    scores = benchmark(score_housing_data, raw_data, enquiry)
+    assert len(scores) == len(raw_data)
+    assert all(0 <= cost <= 1 and 0 <= commute <= 1 and 0 <= neighbour <= 1 for cost, commute, neighbour, _ in scores)
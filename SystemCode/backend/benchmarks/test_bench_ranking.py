@@ -0,0 +1,41 @@
+import pytest
+
+from app.services import recommendation_service as rec_service
+
+
+def _candidates(properties):
+    candidates = rec_service._validate_and_filter(properties)
+    rec_service._normalize_scores(candidates)
+    return candidates
+
+
+@pytest.mark.benchmark(group="normalize")
+def test_normalize_scores(benchmark, ranking_properties):
+    # normalisation mutates the candidates, so start every round from fresh ones
+    benchmark.pedantic(
+        rec_service._normalize_scores,
+        setup=lambda: ((rec_service._validate_and_filter(ranking_properties),), {}),
+        rounds=20,
+    )
+
+
+@pytest.mark.benchmark(group="pareto")
+def test_pareto_front_layering(benchmark, ranking_properties):
+    candidates = _candidates(ranking_properties)
+    layers = benchmark.pedantic(rec_service._pareto_front_layering, args=(candidates,), rounds=3, iterations=1)
+    assert sum(len(layer) for layer in layers) == len(candidates)
+
+
+@pytest.mark.benchmark(group="crowding")
+def test_calculate_crowding_distance(benchmark, ranking_properties):
+    layers = rec_service._pareto_front_layering(_candidates(ranking_properties))
+    result = benchmark(rec_service._calculate_crowding_distance, layers)
+    assert len(result) == sum(len(layer) for layer in layers)
+
+
+@pytest.mark.benchmark(group="final_ranking")
+def test_final_ranking(benchmark, ranking_properties, enquiry):
+    layers = rec_service._pareto_front_layering(_candidates(ranking_properties))
+    candidates = rec_service._calculate_crowding_distance(layers)
+    ranked = benchmark(rec_service._final_ranking, candidates, enquiry)
+    assert [c.layer for c in ranked] == sorted(c.layer for c in ranked)
@@ -0,0 +1,217 @@
+# devtools/fake_openai.py
+# Local stand-in for the OpenAI chat-completions API used by app/llm/service.py.
+# Run:  uvicorn devtools.fake_openai:app --port 8001
+# Then: OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake uvicorn main:app
+import os
+import re
+import copy
+import json
+import time
+import random
+import asyncio
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.llm import local_parser
+from app.llm.payload import estimate_tokens
+
+
+class FakeLLMConfig:
+    '''
+    latency: "fixed:0.4" | "uniform:0.2,1.5" | "lognormal:-1.0,0.6" (seconds, mu/sigma of ln)
+    rate_limit_rate / server_error_rate: probability of a 429 / 5xx per request
+    '''
+
+    def __init__(self):
+        self.latency = os.getenv("FAKE_LLM_LATENCY", "lognormal:-1.2,0.5")
+        self.rate_limit_rate = float(os.getenv("FAKE_LLM_429_RATE", "0"))
+        self.server_error_rate = float(os.getenv("FAKE_LLM_5XX_RATE", "0"))
+        self.seed = os.getenv("FAKE_LLM_SEED")
+        self.rng = random.Random(int(self.seed) if self.seed else None)
+
+    def sample_latency(self) -> float:
+        kind, _, params = self.latency.partition(":")
+        values = [float(v) for v in params.split(",") if v]
+        if kind == "fixed":
+            return values[0]
+        if kind == "uniform":
+            return self.rng.uniform(values[0], values[1])
+        if kind == "lognormal":
+            return self.rng.lognormvariate(values[0], values[1])
+        raise ValueError(f"Unknown latency distribution: {self.latency}")
+
+    def as_dict(self) -> dict:
+        return {
+            "latency": self.latency,
+            "rate_limit_rate": self.rate_limit_rate,
+            "server_error_rate": self.server_error_rate,
+        }
+
+
+config = FakeLLMConfig()
+stats: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+app = FastAPI(title="Fake OpenAI", version="0.1.0")
+
+
+def _prompt_text(body: dict) -> str:
+    parts = [str(m.get("content") or "") for m in body.get("messages", [])]
+    if body.get("tools"):
+        parts.append(json.dumps(body["tools"]))
+    return "\n".join(parts)
+
+
+def _forced_tool(body: dict) -> Optional[str]:
+    tool_choice = body.get("tool_choice")
+    if isinstance(tool_choice, dict):
+        return tool_choice.get("function", {}).get("name")
+    return None
+
+
+def _extract_enquiry(description: str) -> dict:
+    '''Rule-generated EnquiryExtractionTool arguments (partial results allowed, like the real model)'''
+    extracted, _ = local_parser.parse_description(description or "")
+    if re.search(r"\b(must|most important|definitely)\b", description, re.IGNORECASE):
+        if re.search(r"budget|rent|\$|price", description, re.IGNORECASE):
+            extracted["importance_rent"] = 5
+        elif re.search(r"commute|minutes|close to|near", description, re.IGNORECASE):
+            extracted["importance_location"] = 5
+    return extracted
+
+
+def _table_rows(prompt: str) -> List[Dict[str, str]]:
+    '''Rows of the pipe table built by app.llm.payload.build_property_table'''
+    lines = prompt.splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith("id|"):
+            header = line.split("|")
+            rows = []
+            for row in lines[i + 1:]:
+                cells = row.split("|")
+                if len(cells) != len(header):
+                    break
+                rows.append(dict(zip(header, cells)))
+            return rows
+    return []
+
+
+def _canned_reason(row: Dict[str, str]) -> str:
+    name = row.get("name") or f"Property {row.get('id')}"
+    commute = row.get("commute_min")
+    price = row.get("price")
+    if price and commute:
+        return f"{name} balances your budget at {price} with a {commute}-minute commute to school."
+    return f"{name} is a solid all-round match for your preferences."
+
+
+def _completion(body: dict, *, content: Optional[str] = None, tool_name: Optional[str] = None,
+                arguments: Optional[dict] = None) -> dict:
+    prompt_tokens = estimate_tokens(_prompt_text(body))
+    message: Dict[str, Any] = {"role": "assistant", "content": content}
+    finish_reason = "stop"
+    output = content or ""
+    if tool_name is not None:
+        output = json.dumps(arguments)
+        message["tool_calls"] = [{
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": tool_name, "arguments": output},
+        }]
+        finish_reason = "tool_calls"
+    completion_tokens = estimate_tokens(output)
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake-model"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _error(status_code: int, message: str, error_type: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": error_type, "param": None, "code": None}},
+    )
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    tool = _forced_tool(body) or "text"
+    bucket = stats[tool]
+    bucket["requests"] += 1
+
+    latency = float(request.headers.get("x-fake-latency") or config.sample_latency())
+    await asyncio.sleep(latency)
+    bucket["latency_seconds_total"] += latency
+
+    roll = config.rng.random()
+    if roll < config.rate_limit_rate:
+        bucket["rate_limited"] += 1
+        return _error(429, "Rate limit reached (injected)", "rate_limit_error")
+    if roll < config.rate_limit_rate + config.server_error_rate:
+        bucket["server_errors"] += 1
+        return _error(500, "Internal server error (injected)", "server_error")
+
+    if tool == "EnquiryExtractionTool":
+        user_messages = [m.get("content") or "" for m in body.get("messages", []) if m.get("role") == "user"]
+        result = _completion(body, tool_name=tool, arguments=_extract_enquiry(user_messages[-1] if user_messages else ""))
+    elif tool == "ExplanationBatchTool":
+        rows = _table_rows(_prompt_text(body))
+        result = _completion(body, tool_name=tool, arguments={
+            "explanations": [{"property_id": int(row["id"]), "reason": _canned_reason(row)} for row in rows]
+        })
+    else:
+        match = re.search(r"name=([^;\n]+)", _prompt_text(body))
+        result = _completion(body, content=_canned_reason({"name": match.group(1) if match else ""}))
+
+    bucket["prompt_tokens"] += result["usage"]["prompt_tokens"]
+    bucket["completion_tokens"] += result["usage"]["completion_tokens"]
+    return result
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "gpt-4-turbo", "object": "model", "owned_by": "fake"}]}
+
+
+@app.get("/v1/_stats")
+async def get_stats():
+    return {"config": config.as_dict(), "per_tool": stats}
+
+
+@app.post("/v1/_stats/reset")
+async def reset_stats():
+    stats.clear()
+    return {"ok": True}
+
+
+@app.post("/v1/_config")
+async def update_config(update: dict):
+    '''Change latency / error injection at runtime, e.g. {"latency": "fixed:2", "server_error_rate": 0.2}'''
+    # validate on a copy (with its own rng) so a bad payload leaves the live config untouched
+    candidate = copy.copy(config)
+    candidate.rng = random.Random(0)
+    try:
+        for key in ("latency", "rate_limit_rate", "server_error_rate"):
+            if key in update:
+                setattr(candidate, key, str(update[key]) if key == "latency" else float(update[key]))
+        candidate.sample_latency()
+    except (TypeError, ValueError, IndexError) as e:
+        return _error(400, f"Invalid config: {e}", "invalid_request_error")
+
+    config.latency = candidate.latency
+    config.rate_limit_rate = candidate.rate_limit_rate
+    config.server_error_rate = candidate.server_error_rate
+    return config.as_dict()
@@ -0,0 +1,212 @@
+# devtools/loadgen.py
+# Closed-loop load generator for /submit-form and /submit-description.
+# Steps through increasing concurrency, reports throughput, latency percentiles
+# (overall and per stage from the Server-Timing header) and the saturation point.
+# Run:  python -m devtools.loadgen --base-url http://localhost:8080 --concurrency 1,2,4,8,16,32 --duration 30
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+
+FORM_PATH = "/api/v1/properties/submit-form"
+DESCRIPTION_PATH = "/api/v1/properties/submit-description"
+
+# the RequestInfo sample shapes from app/dataservice/sql_api/api_sample.py
+FORM_SHAPES = [
+    dict(min_monthly_rent=1000, max_monthly_rent=3000, school_id=3, max_school_limit=60,
+         flat_type_preference=["HDB", "Condo", "Apartment"], max_mrt_distance=1000,
+         importance_rent=5, importance_location=4, importance_facility=3),
+    dict(min_monthly_rent=900, max_monthly_rent=2000, school_id=1, target_district_id=3, max_school_limit=50,
+         flat_type_preference=["HDB"], max_mrt_distance=1500,
+         importance_rent=3, importance_location=1, importance_facility=3),
+    dict(min_monthly_rent=500, max_monthly_rent=3000, school_id=4, target_district_id=7, max_school_limit=30,
+         flat_type_preference=["Apartment", "Executive Condo"]),
+]
+
+SCHOOL_NAMES = {1: "NUS", 2: "NTU", 3: "SMU", 4: "SUTD", 5: "SIT", 6: "SUSS"}
+
+_SERVER_TIMING = re.compile(r"([\w-]+);dur=([\d.]+)")
+
+
+def make_form(rng: random.Random) -> dict:
+    '''A sample shape with its budget and weights jittered, so caches see a realistic spread'''
+    form = dict(rng.choice(FORM_SHAPES))
+    form["max_monthly_rent"] = max(form["min_monthly_rent"] + 300, form["max_monthly_rent"] + rng.choice([-500, -250, 0, 250, 500]))
+    if rng.random() < 0.5:
+        form["school_id"] = rng.randint(1, 6)
+    for key in ("importance_rent", "importance_location", "importance_facility"):
+        if key in form and rng.random() < 0.3:
+            form[key] = rng.randint(1, 5)
+    return form
+
+
+def make_description(rng: random.Random) -> str:
+    form = make_form(rng)
+    parts = [
+        f"I'm studying at {SCHOOL_NAMES[form['school_id']]} and my budget is "
+        f"${form['min_monthly_rent']} to ${form['max_monthly_rent']} a month."
+    ]
+    if form.get("flat_type_preference"):
+        parts.append(f"I'd like an {' or '.join(form['flat_type_preference'])}.")
+    if form.get("max_school_limit"):
+        parts.append(f"Commute should be under {form['max_school_limit']} minutes.")
+    if form.get("max_mrt_distance") and rng.random() < 0.5:
+        parts.append("Ideally near an MRT.")
+    return " ".join(parts)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class StepResult:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.stages: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, int] = defaultdict(int)
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def record(self, kind: str, status: int, latency: float, server_timing: str) -> None:
+        self.statuses[str(status)] += 1
+        if status >= 500 or status == 0:
+            self.errors += 1
+            return
+        self.latencies[kind].append(latency)
+        self.latencies["all"].append(latency)
+        for name, duration in _SERVER_TIMING.findall(server_timing or ""):
+            self.stages[name].append(float(duration) / 1000)
+
+    def summary(self) -> dict:
+        ok = len(self.latencies["all"])
+        total = ok + self.errors
+
+        def quantiles(values: List[float]) -> dict:
+            return {f"p{int(q * 100)}": round(percentile(values, q) * 1000, 1) for q in (0.5, 0.9, 0.99)} if values else {}
+
+        return {
+            "concurrency": self.concurrency,
+            "requests": total,
+            "throughput_rps": round(ok / self.elapsed, 2) if self.elapsed else 0.0,
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "statuses": dict(self.statuses),
+            "latency_ms": {kind: quantiles(values) for kind, values in self.latencies.items()},
+            "stage_ms": {name: quantiles(values) for name, values in self.stages.items()},
+        }
+
+
+async def _worker(
+    client: httpx.AsyncClient, result: StepResult, deadline: float, rng: random.Random,
+    description_ratio: float, llm_refine: bool
+) -> None:
+    device_id = f"loadgen-{uuid.uuid4().hex[:12]}"
+    params = {"llm_refine": "true"} if llm_refine else None
+    while time.monotonic() < deadline:
+        if rng.random() < description_ratio:
+            kind, path = "description", DESCRIPTION_PATH
+            body = {"device_id": device_id, "requirement_description": make_description(rng)}
+        else:
+            kind, path = "form", FORM_PATH
+            body = {"device_id": device_id, **make_form(rng)}
+
+        start_time = time.perf_counter()
+        try:
+            response = await client.post(path, json=body, params=params)
+            status, server_timing = response.status_code, response.headers.get("server-timing", "")
+        except httpx.HTTPError:
+            status, server_timing = 0, ""
+        result.record(kind, status, time.perf_counter() - start_time, server_timing)
+
+
+async def run_step(
+    base_url: str, concurrency: int, duration: float, *, seed: int, description_ratio: float,
+    llm_refine: bool, timeout: float
+) -> StepResult:
+    result = StepResult(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start_time = time.monotonic()
+        deadline = start_time + duration
+        await asyncio.gather(*(
+            _worker(client, result, deadline, random.Random(seed * 1000 + i), description_ratio, llm_refine)
+            for i in range(concurrency)
+        ))
+        result.elapsed = time.monotonic() - start_time
+    return result
+
+
+def find_saturation(steps: List[dict], p99_slo_ms: Optional[float]) -> Tuple[Optional[int], str]:
+    '''
+    First step where p99 breaks the SLO, errors appear, or throughput stops growing
+    while p99 climbs. Returns (last sustainable concurrency, reason).
+    '''
+    previous = None
+    for step in steps:
+        p99 = step["latency_ms"].get("all", {}).get("p99")
+        last_ok = previous["concurrency"] if previous else None
+        if step["error_rate"] > 0.01:
+            return last_ok, f"error rate {step['error_rate']:.1%} at concurrency {step['concurrency']}"
+        if p99_slo_ms is not None and p99 is not None and p99 > p99_slo_ms:
+            return last_ok, f"p99 {p99}ms > SLO {p99_slo_ms}ms at concurrency {step['concurrency']}"
+        if previous:
+            prev_p99 = previous["latency_ms"].get("all", {}).get("p99")
+            gain = step["throughput_rps"] / previous["throughput_rps"] if previous["throughput_rps"] else 0
+            if gain < 1.05 and p99 and prev_p99 and p99 > prev_p99 * 1.5:
+                return last_ok, (f"throughput flat ({gain:.2f}x) while p99 rose {prev_p99}ms -> {p99}ms "
+                                 f"at concurrency {step['concurrency']}")
+        previous = step
+    return (previous["concurrency"] if previous else None), "not saturated within the tested range"
+
+
+def print_step(step: dict) -> None:
+    overall = step["latency_ms"].get("all", {})
+    print(
+        f"c={step['concurrency']:>4}  rps={step['throughput_rps']:>8.2f}  err={step['error_rate']:>6.2%}  "
+        f"p50={overall.get('p50', '-')}ms  p90={overall.get('p90', '-')}ms  p99={overall.get('p99', '-')}ms"
+    )
+    for name, q in sorted(step["stage_ms"].items()):
+        print(f"         {name:<20} p50={q.get('p50')}ms  p99={q.get('p99')}ms")
+
+
+async def main(args: argparse.Namespace) -> None:
+    steps = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        result = await run_step(
+            args.base_url, concurrency, args.duration, seed=args.seed,
+            description_ratio=args.description_ratio, llm_refine=args.llm_refine, timeout=args.timeout,
+        )
+        step = result.summary()
+        steps.append(step)
+        print_step(step)
+
+    sustainable, reason = find_saturation(steps, args.p99_slo_ms)
+    print(f"\nmax sustainable concurrency: {sustainable} ({reason})")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"steps": steps, "max_sustainable_concurrency": sustainable, "reason": reason}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step-load /submit-form and /submit-description.")
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32,64", help="comma-separated steps")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per step")
+    parser.add_argument("--description-ratio", type=float, default=0.3, help="share of /submit-description")
+    parser.add_argument("--llm-refine", action="store_true", help="send llm_refine=true")
+    parser.add_argument("--p99-slo-ms", type=float, default=None)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here")
+    asyncio.run(main(parser.parse_args()))
@@ -1,12 +1,13 @@
 # main.py
 import os
-import logging
 import asyncio
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-log = logging.getLogger("uvicorn.error")
+from app.log import get_logger
+
+logger = get_logger("main")
 
 
 async def _init_db_with_timeout():
@@ -15,16 +16,20 @@ async def _init_db_with_timeout():
         from app.database.config import create_db_and_tables
         # 给 DB 初始化加硬超时（建议 3~10 秒）
         await asyncio.wait_for(create_db_and_tables(), timeout=3)
-        log.info("DB init done")
+        logger.info("DB init done")
     except asyncio.TimeoutError:
-        log.warning("DB init timeout; skipping at startup (will init lazily on first use)")
+        logger.warning("DB init timeout; skipping at startup (will init lazily on first use)")
     except Exception as e:
-        log.exception("DB init failed (continuing startup): %s", e)
+        logger.exception("DB init failed (continuing startup): %s", e)
 
 
 def create_app() -> FastAPI:
     # 把一切“可能出事的东西”都放到函数体内
     from contextlib import asynccontextmanager
+    from app.log import setup_logging, shutdown_logging
+
+    # 业务日志经队列由后台线程输出，请求路径上不做同步 I/O
+    setup_logging()
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
@@ -32,22 +37,31 @@ def create_app() -> FastAPI:
         db_task = asyncio.create_task(_init_db_with_timeout())
 
         # 2) OpenAI 客户端（仅创建对象，不应发网络请求）
+        #    通过 LLM gateway 包装：超时/熔断/对冲请求，接口与 AsyncOpenAI 一致
         try:
             from app.config import get_settings
-            from openai import AsyncOpenAI
+            from app.llm.gateway import build_llm_gateway
             s = get_settings()
             if getattr(s, "OPENAI_API_KEY", None):
-                app.state.async_openai_client = AsyncOpenAI(api_key=s.OPENAI_API_KEY)
+                app.state.async_openai_client = build_llm_gateway(s)
             else:
                 app.state.async_openai_client = None
-                log.warning("OPENAI_API_KEY not set; OpenAI features disabled")
+                logger.warning("OPENAI_API_KEY not set; OpenAI features disabled")
         except Exception as e:
-            log.exception("OpenAI client init failed (continuing startup): %s", e)
+            logger.exception("OpenAI client init failed (continuing startup): %s", e)
             app.state.async_openai_client = None
 
+        # 3) 事件循环健康监控（调度延迟；调试模式下抓取阻塞调用栈）
+        from app.loop_monitor import loop_monitor, LOOP_MONITOR_ENABLED
+        if LOOP_MONITOR_ENABLED:
+            loop_monitor.start()
+
         # ✅ 让 uvicorn 尽快开始监听端口
         yield
 
+        if LOOP_MONITOR_ENABLED:
+            await loop_monitor.stop()
+
         # 优雅关闭
         if getattr(app.state, "async_openai_client", None):
             try:
@@ -58,6 +72,9 @@ def create_app() -> FastAPI:
         if not db_task.done():
             db_task.cancel()
 
+        # 刷出队列中剩余的日志
+        shutdown_logging()
+
     app = FastAPI(title="IRRS API", version="0.1.0", lifespan=lifespan)
 
     # ------------------ CORS ------------------
@@ -73,6 +90,39 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # ------------------ 阶段耗时 ------------------
+    # Server-Timing 响应头（压测时打开 SERVER_TIMING_ENABLED）+ Prometheus 阶段直方图（METRICS_ENABLED）
+    # 两者都关闭时不挂中间件，stage() 直接跳过计时
+    from app import metrics
+    try:
+        from app.config import get_settings
+        server_timing_enabled = get_settings().SERVER_TIMING_ENABLED
+    except Exception:
+        server_timing_enabled = False
+
+    if server_timing_enabled or metrics.ENABLED:
+        import time
+        from app.timing import begin_request, server_timing_header
+
+        @app.middleware("http")
+        async def stage_timing(request, call_next):
+            start_time = time.perf_counter()
+            timings = begin_request(request.scope)
+            response = await call_next(request)
+            if server_timing_enabled:
+                response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - start_time)
+            return response
+
+    # ------------------ 准入控制 ------------------
+    # 每个高开销接口限制并发，排队有上限和超时，超出直接 503 + Retry-After
+    try:
+        from app.config import get_settings
+        from app.admission import build_admission_controllers
+        app.state.admission = build_admission_controllers(get_settings())
+    except Exception as e:
+        logger.exception("Admission control init failed (continuing without it): %s", e)
+        app.state.admission = {}
+
     # ------------------ 路由注册 ------------------
     try:
         # ✅ 导入 property 路由模块
@@ -80,15 +130,53 @@ def create_app() -> FastAPI:
 
         # ✅ 挂载所有 /api/v1/properties/** 接口
         app.include_router(property_routes.router)
-        log.info("✅ Property routes mounted successfully.")
+        logger.info("✅ Property routes mounted successfully.")
     except Exception as e:
-        log.exception("❌ Router import failed (continuing startup): %s", e)
+        logger.exception("❌ Router import failed (continuing startup): %s", e)
 
     # ------------------ 基础探针 ------------------
     @app.get("/healthz")
     async def healthz():
         return {"ok": True}
 
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        from fastapi import Response
+        body = metrics.render_latest()
+        if body is None:
+            return Response("metrics disabled (set METRICS_ENABLED=true, needs prometheus_client)\n",
+                            status_code=404, media_type="text/plain")
+        return Response(body, headers={"Content-Type": metrics.CONTENT_TYPE})
+
+    @app.get("/stats/extraction-cache")
+    async def extraction_cache_stats():
+        from app.llm.extraction_cache import extraction_cache
+        return extraction_cache.stats()
+
+    @app.get("/stats/ranking-sessions")
+    async def ranking_session_stats():
+        from app.services.ranking_session import ranking_sessions
+        return ranking_sessions.stats()
+
+    @app.get("/stats/admission")
+    async def admission_stats():
+        return {name: controller.stats() for name, controller in app.state.admission.items()}
+
+    @app.get("/stats/event-loop")
+    async def event_loop_stats():
+        from app.loop_monitor import loop_monitor
+        return loop_monitor.stats()
+
+    @app.get("/stats/llm-usage")
+    async def llm_usage_stats():
+        from app.llm.usage import usage_recorder
+        return usage_recorder.stats()
+
+    @app.get("/stats/llm-gateway")
+    async def llm_gateway_stats():
+        gateway = getattr(app.state, "async_openai_client", None)
+        return gateway.stats() if gateway else {"enabled": False}
+
     @app.get("/")
     async def root():
         return {"message": "Welcome to IRRS"}
@@ -0,0 +1,79 @@
+import pytest
+
+from app.llm.local_parser import NEAR_MRT_DISTANCE, WALK_METERS_PER_MINUTE, parse_description, try_extract
+
+
+@pytest.mark.parametrize("description", [
+    "NUS, 1000-1500, no HDB",
+    "NUS, 1000-1500, without HDB",
+    "NUS, 1000-1500, I do not want HDB",
+    "NUS, 1000-1500, anything but condo",
+    "NUS, 1000-1500, not near MRT",
+    "NUS, 1000-1500, don't want a condo",
+])
+def test_negation_falls_back_to_llm(description):
+    assert try_extract(description) is None
+
+
+@pytest.mark.parametrize("description", [
+    "NUS, 1000-1500, 3 room HDB",
+    "NUS, 1000-1500, 2 bedrooms",
+    "NUS, 1000-1500, condo with 2 baths",
+    "SMU, 2k-3k, 700 sqft",
+])
+def test_unsupported_quantities_are_ambiguous(description):
+    _, ambiguous = parse_description(description)
+    assert ambiguous
+    assert try_extract(description) is None
+
+
+def test_school_and_rent_range():
+    assert try_extract("NUS, 1000-1500, condo near MRT") == {
+        "min_monthly_rent": 1000,
+        "max_monthly_rent": 1500,
+        "school_id": 1,
+        "flat_type_preference": ["Condo"],
+        "max_mrt_distance": NEAR_MRT_DISTANCE,
+    }
+
+
+def test_rent_around_and_bounds():
+    around = try_extract("NTU, budget 1500")
+    assert (around["min_monthly_rent"], around["max_monthly_rent"]) == (1200, 1800)
+
+    bounded = try_extract("SMU, at least 1000 and under 2k")
+    assert (bounded["min_monthly_rent"], bounded["max_monthly_rent"]) == (1000, 2000)
+
+
+def test_rent_cap_phrased_with_no_is_not_a_lower_bound():
+    extracted, _ = parse_description("NUS, no more than 2000, condo")
+    assert extracted["max_monthly_rent"] == 2000
+    assert "min_monthly_rent" not in extracted
+
+
+def test_minutes_to_school():
+    extracted = try_extract("NTU, 1000-1500, 30 min to campus")
+    assert extracted["max_school_limit"] == 30
+    assert "max_mrt_distance" not in extracted
+
+
+def test_minutes_walk_to_mrt():
+    extracted = try_extract("NUS, 1000-1500, 5 min walk to MRT")
+    assert extracted["max_mrt_distance"] == 5 * WALK_METERS_PER_MINUTE
+    assert "max_school_limit" not in extracted
+
+
+@pytest.mark.parametrize("description", [
+    "NUS, 1000-1500, 20 min",
+    "NUS, 1000-1500, 20 min to Clementi MRT",
+    "NUS, 1000-1500, 10 min walk",
+])
+def test_unclear_minutes_fall_back_to_llm(description):
+    _, ambiguous = parse_description(description)
+    assert ambiguous
+    assert try_extract(description) is None
+
+
+def test_missing_required_field():
+    assert try_extract("condo near MRT, 1000-1500") is None
+    assert try_extract("") is None
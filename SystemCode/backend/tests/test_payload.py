@@ -0,0 +1,72 @@
+import pytest
+
+from app.llm.knowledge_base import DISTRICT_MAPPING, FLAT_TYPE_MAPPING, SCHOOL_MAPPING
+from app.llm.payload import (
+    PROPERTY_TABLE_COLUMNS, build_property_payload, build_property_table, build_user_query_payload,
+)
+from app.llm.prompt import BATCH_EXPLANATION_PROMPT, EXPLANATION_PROMPT, EXTRACTION_PROMPT
+from app.models import EnquiryForm, Property
+
+
+@pytest.fixture
+def enquiry():
+    return EnquiryForm(
+        device_id="test-device", min_monthly_rent=1000, max_monthly_rent=3000, school_id=1,
+        target_district_id=5, max_school_limit=60, max_mrt_distance=1000, flat_type_preference=["HDB", "Condo"],
+        importance_rent=5, importance_location=4, importance_facility=3,
+    )
+
+
+@pytest.fixture
+def prop():
+    return Property(
+        property_id=1024, latitude=1.3521, longitude=103.8198,
+        name="Blk 123 Clementi Ave 3", district="Clementi", price="2400", beds=2, baths=1, area=700,
+        location="123 Clementi Ave 3", time_to_school=35, distance_to_mrt=420,
+        public_facilities=[{"Clementi Park": "310"}, {"FairPrice Clementi": "250"}],
+        facility_type="HDB", costScore=0.62, commuteScore=0.71, neighborhoodScore=0.55,
+    )
+
+
+def test_user_query_payload_fields(enquiry):
+    payload = build_user_query_payload(enquiry)
+    for key in (
+        "budget=$1000-3000", "school=NUS", "district=Clementi", "max_commute=60min", "max_mrt=1000m",
+        "types=HDB,Condo", "importance_rent=5", "importance_location=4", "importance_facility=3",
+    ):
+        assert key in payload
+    assert "district_id=" not in payload
+
+
+def test_user_query_payload_without_budget(enquiry):
+    payload = build_user_query_payload(enquiry, include_budget=False)
+    assert "budget=" not in payload
+    assert "importance_rent=5" in payload
+
+
+def test_property_payload_fields(prop):
+    payload = build_property_payload(prop)
+    for key in (
+        "id=1024", "district=Clementi", "price=$2400", "commute_min=35", "mrt_m=420",
+        "cost=0.62", "commute=0.71", "neighbourhood=0.55", "facilities=Clementi Park 310m",
+    ):
+        assert key in payload
+
+
+def test_explanation_prompts_include_payloads(enquiry, prop):
+    user_query = build_user_query_payload(enquiry)
+    single = EXPLANATION_PROMPT.format(user_query=user_query, property_data=build_property_payload(prop))
+    assert user_query in single and "price=$2400" in single
+
+    table = build_property_table([prop, prop])
+    header, *rows = table.split("\n")
+    assert header.split("|") == PROPERTY_TABLE_COLUMNS
+    assert len(rows) == 2 and all(row.startswith("1024|") for row in rows)
+    batch = BATCH_EXPLANATION_PROMPT.format(user_query=user_query, property_table=table)
+    assert user_query in batch and table in batch
+
+
+def test_extraction_prompt_lists_every_mapping():
+    for mapping in (SCHOOL_MAPPING, DISTRICT_MAPPING, FLAT_TYPE_MAPPING):
+        for key, entry in mapping.items():
+            assert f"{key}={entry['name']}" in EXTRACTION_PROMPT